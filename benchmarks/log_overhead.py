@@ -0,0 +1,87 @@
+# BENCHMARK: cost of a log call for the thread that logs, same two sinks
+# (stage text log + JSON app log) in both cases
+#   sync      FileHandlers on the root logger, format + write in the caller
+#   queue     log_setup.configure_logging: the caller only builds the record and
+#             puts it on the queue, the listener thread formats and writes
+# plus the cost of an expensive payload (null counts of the pobmun staging
+# frame) logged eagerly vs through lazy() with INFO disabled.
+# On a single core the listener competes with the caller for the CPU, so the
+# queue number there includes part of the listener's work.
+#
+# usage: python benchmarks/log_overhead.py [--calls 20000]   (needs the pobmun staging file)
+
+from __future__ import annotations
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+import log_setup  # noqa: E402
+from log_setup import lazy  # noqa: E402
+
+
+def per_call_us(logger: logging.Logger, calls: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(calls):
+        logger.info("[%s] loaded %d rows in %d batches", "dw.fact_population_municipality", i, i // 100)
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+    logger = logging.getLogger("bench")
+    root = logging.getLogger()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        text = logging.FileHandler(tmp / "sync.log")
+        text.setFormatter(logging.Formatter(log_setup.TEXT_FORMAT))
+        app = logging.FileHandler(tmp / "sync_app.log")
+        app.setFormatter(log_setup.JsonFormatter())
+        context = log_setup.ContextFilter(log_setup.new_run_id(), "bench")
+        for h in (text, app):
+            h.addFilter(context)
+            root.addHandler(h)
+        root.setLevel(logging.INFO)
+        sync = per_call_us(logger, args.calls)
+        for h in (text, app):
+            root.removeHandler(h)
+            h.close()
+
+        os.environ["LOG_FILE"] = str(tmp / "app.log")
+        log_setup.configure_logging("bench", log_dir=tmp)
+        queued = per_call_us(logger, args.calls)
+        t0 = time.perf_counter()
+        log_setup.stop_logging()
+        drain = time.perf_counter() - t0
+
+    print(f"{'handler':<10}{'us/call (caller)':>18}")
+    print(f"{'sync':<10}{sync:>18.1f}")
+    print(f"{'queue':<10}{queued:>18.1f}   (+{drain:.2f}s draining at exit, off the caller)")
+
+    from schemas import STAGED, read_csv
+    df = read_csv(STAGED["pobmun"])
+    root.setLevel(logging.WARNING)
+    t0 = time.perf_counter()
+    for _ in range(20):
+        logger.info("Missing values by column: %s", df.isnull().sum().to_dict())
+    eager = (time.perf_counter() - t0) / 20 * 1e3
+    t0 = time.perf_counter()
+    for _ in range(20):
+        logger.info("Missing values by column: %s", lazy(lambda: df.isnull().sum().to_dict()))
+    deferred = (time.perf_counter() - t0) / 20 * 1e3
+    print(f"payload with INFO disabled: eager {eager:.2f} ms/call, lazy {deferred:.4f} ms/call")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
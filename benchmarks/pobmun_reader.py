@@ -0,0 +1,79 @@
+# BENCHMARK: the 17 raw pobmun files read into typed columns
+#   before   read_csv(RAW["pobmun"]) (every column as text) + clean_int_like
+#            on the 5 number columns, as clean_pobmun_file did
+#   after    pobmun_reader.read_pobmun (memory-mapped NumPy tokenizer)
+# Best wall time of --repeat runs, peak of the memory allocated while reading
+# (tracemalloc), and a check that both give the same frame for every file.
+#
+# usage: python benchmarks/pobmun_reader.py [--repeat 5]
+
+from __future__ import annotations
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from pobmun_reader import NUMBER_COLS, NAMES, read_pobmun  # noqa: E402
+from schemas import RAW, read_csv  # noqa: E402
+from transformation import clean_int_like  # noqa: E402
+
+FILES = sorted((PROJECT_ROOT / "data" / "raw").glob("pobmun*.csv"))
+
+
+def before(f: Path) -> pd.DataFrame:
+    df = read_csv(RAW["pobmun"], f)
+    for i, dtype in NUMBER_COLS.items():
+        df[NAMES[i]] = clean_int_like(df[NAMES[i]], dtype)
+    return df
+
+
+def after(f: Path) -> pd.DataFrame:
+    return read_pobmun(f)[0]
+
+
+def measure(reader, repeat: int) -> tuple[float, float]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for f in FILES:
+            reader(f)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    for f in FILES:
+        reader(f)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 2**20
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    different = []
+    for f in FILES:
+        try:
+            pd.testing.assert_frame_equal(before(f), after(f))
+        except AssertionError:
+            different.append(f.name)
+
+    print(f"{len(FILES)} files")
+    print(f"{'reader':<34}{'seconds':>10}{'peak MB':>10}")
+    results = {}
+    for name, reader in (("read_csv + clean_int_like", before), ("read_pobmun", after)):
+        results[name] = measure(reader, args.repeat)
+        print(f"{name:<34}{results[name][0]:>10.3f}{results[name][1]:>10.1f}")
+    (t_before, _), (t_after, _) = results.values()
+    print(f"speedup x{t_before / t_after:.1f}, result: {'identical' if not different else 'DIFFERENT ' + ', '.join(different)}")
+    return 1 if different else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+# BENCHMARK: warehouse pre-warming against a paused serverless tier
+# The pipeline (transform, aggregates, load) runs on a throw-away copy of the
+# project with a SQLite warehouse behind the PausedStandIn of
+# warehouse_backend.py: the first connect waits --resume seconds, the way a
+# paused Azure SQL serverless database resumes. Every run starts paused.
+#   DW_PREWARM=0   each load step connects after reading its staging files
+#   DW_PREWARM=1   the orchestrator wakes the warehouse while the transforms
+#                  run, each load step connects while it reads its files
+# Prints the wall time of each mode and checks both warehouses got the same rows.
+#
+# usage: python benchmarks/prewarm.py [--resume 10]
+
+from __future__ import annotations
+import argparse
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+STEPS = ["--force", "--only", "transform", "aggregates", "load"]
+
+
+def make_workspace(root: Path) -> Path:
+    work = root / "project"
+    for d in ("src", "warehouse"):
+        shutil.copytree(PROJECT_ROOT / d, work / d, ignore=shutil.ignore_patterns("*.sqlite*", "*.json", "__pycache__"))
+    shutil.copytree(PROJECT_ROOT / "data" / "raw", work / "data" / "raw")
+    (work / "logs").mkdir()
+    shutil.copyfile(PROJECT_ROOT / "main.py", work / "main.py")
+    return work
+
+
+def run(work: Path, prewarm: bool, resume: float, db: Path) -> float:
+    env = {**os.environ, "DW_BACKEND": "sqlite", "DW_SQLITE_PATH": str(db), "DW_PREWARM": "1" if prewarm else "0",
+           "DW_STANDIN_RESUME_SECONDS": str(resume)}
+    env.pop("PIPELINE_SAMPLE", None)
+    shutil.rmtree(work / "data" / "state", ignore_errors=True)
+    (work / "warehouse" / "standin_state.json").unlink(missing_ok=True)  # paused
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", *STEPS], cwd=work, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def counts(db: Path) -> dict[str, int]:
+    cn = sqlite3.connect(db)
+    tables = [r[0] for r in cn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    result = {t: cn.execute(f"SELECT COUNT(*) FROM [{t}]").fetchone()[0] for t in tables}
+    cn.close()
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resume", type=float, default=10, help="seconds the paused warehouse takes to resume")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work = make_workspace(Path(tmp))
+        results = {}
+        for prewarm in (False, True):
+            db = Path(tmp) / f"dw_prewarm{int(prewarm)}.sqlite"
+            results[prewarm] = (run(work, prewarm, args.resume, db), counts(db))
+
+    print(f"resume {args.resume:g}s")
+    print(f"{'mode':<34}{'seconds':>10}")
+    for prewarm, (seconds, _) in results.items():
+        print(f"{'DW_PREWARM=' + str(int(prewarm)):<34}{seconds:>10.2f}")
+    same = results[False][1] == results[True][1]
+    print(f"saved {results[False][0] - results[True][0]:.2f}s, warehouses {'identical' if same else 'DIFFERENT'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,101 @@
+# BENCHMARK: inferred CSV reads + casts (how the readers worked before
+# schemas.py) vs typed reads with explicit dtype / usecols
+# For every reader: best wall time of --repeat runs and peak of the memory
+# allocated while reading (tracemalloc, numpy buffers included).
+#
+# usage: python benchmarks/schemas.py [--repeat 5]   (needs the staging files)
+
+from __future__ import annotations
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from schemas import INT_TYPES, RAW, STAGED, read_csv  # noqa: E402
+
+RAW_DIR = PROJECT_ROOT / "data" / "raw"
+POB_NUMBERS = ["CPRO", "MUN_NUMBER", "YEAR", "POBLATION", "MALE", "FEMALE"]
+
+
+def inferred_staging(name: str, usecols: list[str]) -> pd.DataFrame:
+    # before: read everything, let pandas guess, then cast column by column
+    # to the same dtypes the typed read returns
+    df = pd.read_csv(STAGED[name].path)
+    for c in usecols:
+        if STAGED[name].columns[c] in INT_TYPES:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype(STAGED[name].columns[c])
+        elif STAGED[name].columns[c] == "string":
+            df[c] = df[c].astype("string")
+    return df[usecols]
+
+
+def typed_staging(name: str, usecols: list[str]) -> pd.DataFrame:
+    return read_csv(STAGED[name], usecols=usecols)
+
+
+def inferred_raw_pobmun() -> list[pd.DataFrame]:
+    # before: guessed dtypes, then every int column back to text for clean_int_like
+    out = []
+    for f in sorted(RAW_DIR.glob("pobmun*.csv")):
+        df = pd.read_csv(f, skiprows=1, sep=",")
+        for c in df.columns[[0, 2, 4, 5, 6]]:
+            df[c] = df[c].astype("string")
+        out.append(df)
+    return out
+
+
+STAGING_CASES = {
+    # reader: (staging schema, columns it uses)
+    "load_dw read_staging pobmun": ("pobmun", POB_NUMBERS + ["MUN_NAME"]),
+    "aggregates read_inputs pobmun": ("pobmun", POB_NUMBERS),
+    "load_dw read_staging deaths": ("deaths", ["CPRO", "YEAR", "TOTAL", "SEX", "DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME"]),
+    "load_dw read_staging sector": ("sector", ["CPRO", "YEAR", "TOTAL", "ECONOMIC_SECTOR"]),
+}
+
+
+def cases():
+    # reader -> (before, after)
+    yield "transformation pobmun (17 raw files)", (
+        inferred_raw_pobmun,
+        lambda: [read_csv(RAW["pobmun"], f) for f in sorted(RAW_DIR.glob("pobmun*.csv"))],
+    )
+    for reader, (name, cols) in STAGING_CASES.items():
+        yield reader, (lambda n=name, c=cols: inferred_staging(n, c), lambda n=name, c=cols: typed_staging(n, c))
+
+
+def measure(fn, repeat: int) -> tuple[float, float]:
+    best = min(timed(fn) for _ in range(repeat))
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 2**20
+
+
+def timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'reader':<40}{'before s':>10}{'after s':>10}{'before MB':>11}{'after MB':>10}")
+    for name, (before, after) in cases():
+        t_before, m_before = measure(before, args.repeat)
+        t_after, m_after = measure(after, args.repeat)
+        print(f"{name:<40}{t_before:>10.3f}{t_after:>10.3f}{m_before:>11.1f}{m_after:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,110 @@
+# BENCHMARK: single-process transform + load vs sharded.py with N shards
+# Every run works on a throw-away copy of the project (src, warehouse, data)
+# and loads its own SQLite warehouse. The sharded warehouses are compared
+# table by table with the single-process one (same rows, any order) and the
+# combined pobmun staging file is compared as a multiset of lines.
+# --scale k adds k-1 copies of every yearly pobmun file (as earlier years) to
+# get a bigger population fact.
+#
+# usage: python benchmarks/sharded.py [--shards 1 2 4] [--scale 1]
+
+from __future__ import annotations
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+TABLES = [
+    "dim_autonomy", "dim_province", "dim_time", "dim_sex", "dim_death_cause", "dim_economic_sector",
+    "dim_municipality", "fact_deaths", "fact_economic_sector", "fact_population_municipality",
+    "agg_population_province_year", "agg_population_autonomy_year",
+    "agg_economic_sector_autonomy_year", "agg_deaths_autonomy_year",
+]
+SINGLE = [
+    ["src/transformation.py"],
+    ["src/aggregates.py", "--full"],
+    ["src/load_dw.py", "--restart"],
+]
+
+
+def make_workspace(root: Path, scale: int) -> Path:
+    work = root / "project"
+    for d in ("src", "warehouse"):
+        shutil.copytree(PROJECT_ROOT / d, work / d, ignore=shutil.ignore_patterns("*.sqlite*", "__pycache__"))
+    shutil.copytree(PROJECT_ROOT / "data" / "raw", work / "data" / "raw")
+    (work / "data" / "staging").mkdir(parents=True)
+    (work / "logs").mkdir()
+
+    raw = work / "data" / "raw"
+    for f in sorted(raw.glob("pobmun*.csv")):
+        year = int(re.search(r"\d{4}", f.stem).group())
+        for i in range(1, scale):
+            shutil.copyfile(f, raw / f"pobmun{year - 100 * i}.csv")
+    return work
+
+
+def run(work: Path, commands: list[list[str]], db: Path) -> float:
+    env = {**os.environ, "DW_BACKEND": "sqlite", "DW_SQLITE_PATH": str(db)}
+    shutil.rmtree(work / "data" / "state", ignore_errors=True)
+    t0 = time.perf_counter()
+    for cmd in commands:
+        subprocess.run([sys.executable, *cmd], cwd=work, env=env, check=True)
+    return time.perf_counter() - t0
+
+
+def table_rows(db: Path) -> dict[str, list[tuple]]:
+    cn = sqlite3.connect(db)
+    out = {t: sorted(cn.execute(f"SELECT * FROM {t}").fetchall(), key=repr) for t in TABLES}
+    cn.close()
+    return out
+
+
+def staging_lines(work: Path) -> list[str]:
+    lines = (work / "data" / "staging" / "pobmun_combined_transformed.csv").read_text(encoding="utf-8").splitlines()
+    return [lines[0]] + sorted(lines[1:])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        work = make_workspace(tmp, args.scale)
+
+        base_db = tmp / "single.sqlite"
+        base_time = run(work, SINGLE, base_db)
+        base_rows = table_rows(base_db)
+        base_staging = staging_lines(work)
+        pop = len(base_rows["fact_population_municipality"])
+        print(f"cores: {os.cpu_count()}  scale: x{args.scale}  population rows: {pop}")
+        print(f"{'mode':<12}{'seconds':>10}{'rows/s':>12}{'speedup':>10}  result")
+        print(f"{'single':<12}{base_time:>10.2f}{pop / base_time:>12.0f}{1:>10.2f}  reference")
+
+        ok = True
+        for n in args.shards:
+            db = tmp / f"shards{n}.sqlite"
+            seconds = run(work, [["src/sharded.py", "--shards", str(n)]], db)
+            rows = table_rows(db)
+            diff = [t for t in TABLES if rows[t] != base_rows[t]]
+            if staging_lines(work) != base_staging:
+                diff.append("pobmun staging")
+            ok &= not diff
+            result = "identical" if not diff else f"DIFFERENT: {', '.join(diff)}"
+            print(f"{f'shards={n}':<12}{seconds:>10.2f}{pop / seconds:>12.0f}{base_time / seconds:>10.2f}  {result}")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,121 @@
+# BENCHMARK: string keys vs integer surrogate keys in fact_deaths / fact_economic_sector
+# Loads both layouts into throw-away SQLite files at x1 and a synthetic x100
+# (rows replicated with shifted CPRO) and reports file size, load time and an
+# estimate of the SQL Server wire/storage payload (NVARCHAR = 2 bytes per char + 2).
+#
+# usage: python benchmarks/surrogate_keys.py [scale ...]   (default: 1 100)
+
+from __future__ import annotations
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from surrogate_keys import assign_keys  # noqa: E402
+
+STAGING = PROJECT_ROOT / "data" / "staging"
+
+STRING_SCHEMA = """
+CREATE TABLE fact_deaths (CPRO INTEGER, [YEAR] INTEGER, SEX TEXT, DEATH_CAUSE_CODE TEXT, TOTAL_DEATHS INTEGER,
+    PRIMARY KEY (CPRO, [YEAR], SEX, DEATH_CAUSE_CODE)) WITHOUT ROWID;
+CREATE TABLE fact_economic_sector (CPRO INTEGER, [YEAR] INTEGER, ECONOMIC_SECTOR TEXT, TOTAL_VALUE REAL,
+    PRIMARY KEY (CPRO, [YEAR], ECONOMIC_SECTOR)) WITHOUT ROWID;
+"""
+INT_SCHEMA = """
+CREATE TABLE fact_deaths (CPRO INTEGER, [YEAR] INTEGER, SEX_ID INTEGER, DEATH_CAUSE_ID INTEGER, TOTAL_DEATHS INTEGER,
+    PRIMARY KEY (CPRO, [YEAR], SEX_ID, DEATH_CAUSE_ID)) WITHOUT ROWID;
+CREATE TABLE fact_economic_sector (CPRO INTEGER, [YEAR] INTEGER, ECONOMIC_SECTOR_ID INTEGER, TOTAL_VALUE REAL,
+    PRIMARY KEY (CPRO, [YEAR], ECONOMIC_SECTOR_ID)) WITHOUT ROWID;
+"""
+
+# SQL Server bytes per value: INT 4, TINYINT 1, SMALLINT 2, FLOAT 8, NVARCHAR 2*len + 2
+def sqlserver_bytes(df: pd.DataFrame, sizes: dict[str, int]) -> int:
+    total = 0
+    for col in df.columns:
+        if col in sizes:
+            total += sizes[col] * len(df)
+        else:
+            total += int((df[col].astype(str).str.len() * 2 + 2).sum())
+    return total
+
+
+def read_facts() -> tuple[pd.DataFrame, pd.DataFrame]:
+    dea = pd.read_csv(STAGING / "death_causes_province_transformed.csv")
+    sec = pd.read_csv(STAGING / "economic_sector_province_transformed.csv")
+    dea = dea.dropna(subset=["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE", "TOTAL"])
+    sec = sec.dropna(subset=["CPRO", "YEAR", "ECONOMIC_SECTOR", "TOTAL"])
+    dea = dea[["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE", "TOTAL"]].astype(
+        {"CPRO": "int64", "YEAR": "int64", "TOTAL": "int64", "SEX": str, "DEATH_CAUSE_CODE": str})
+    sec = sec[["CPRO", "YEAR", "ECONOMIC_SECTOR", "TOTAL"]].astype(
+        {"CPRO": "int64", "YEAR": "int64", "TOTAL": "float64", "ECONOMIC_SECTOR": str})
+    return dea, sec
+
+
+def scale_up(df: pd.DataFrame, factor: int) -> pd.DataFrame:
+    # synthetic volume: same rows under shifted province codes
+    parts = []
+    for k in range(factor):
+        part = df.copy()
+        part["CPRO"] = part["CPRO"] + 100 * k
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def load(db: Path, schema: str, tables: dict[str, pd.DataFrame]) -> float:
+    cn = sqlite3.connect(db)
+    cn.execute("PRAGMA journal_mode = WAL")
+    cn.execute("PRAGMA synchronous = NORMAL")
+    cn.executescript(schema)
+    t0 = time.perf_counter()
+    for name, df in tables.items():
+        marks = ", ".join("?" * len(df.columns))
+        cn.executemany(f"INSERT INTO {name} VALUES ({marks})", df.itertuples(index=False, name=None))
+        cn.commit()
+    elapsed = time.perf_counter() - t0
+    cn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    cn.execute("VACUUM")
+    cn.close()
+    return elapsed
+
+
+def run(scale: int, dea: pd.DataFrame, sec: pd.DataFrame) -> None:
+    dea = scale_up(dea, scale)
+    sec = scale_up(sec, scale)
+
+    key_map: dict[str, dict[str, int]] = {}
+    dea_int = dea.assign(
+        SEX=assign_keys(key_map, "dim_sex", dea["SEX"]).astype("int64"),
+        DEATH_CAUSE_CODE=assign_keys(key_map, "dim_death_cause", dea["DEATH_CAUSE_CODE"]).astype("int64"),
+    ).rename(columns={"SEX": "SEX_ID", "DEATH_CAUSE_CODE": "DEATH_CAUSE_ID"})
+    sec_int = sec.assign(
+        ECONOMIC_SECTOR=assign_keys(key_map, "dim_economic_sector", sec["ECONOMIC_SECTOR"]).astype("int64"),
+    ).rename(columns={"ECONOMIC_SECTOR": "ECONOMIC_SECTOR_ID"})
+
+    ints = {"CPRO": 4, "YEAR": 4, "TOTAL": 4, "SEX_ID": 1, "DEATH_CAUSE_ID": 2, "ECONOMIC_SECTOR_ID": 2}
+    sql_str = sqlserver_bytes(dea, ints) + sqlserver_bytes(sec, {**ints, "TOTAL": 8})
+    sql_int = sqlserver_bytes(dea_int, ints) + sqlserver_bytes(sec_int, {**ints, "TOTAL": 8})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        str_db, int_db = Path(tmp) / "str.sqlite", Path(tmp) / "int.sqlite"
+        t_str = load(str_db, STRING_SCHEMA, {"fact_deaths": dea, "fact_economic_sector": sec})
+        t_int = load(int_db, INT_SCHEMA, {"fact_deaths": dea_int, "fact_economic_sector": sec_int})
+        size_str, size_int = str_db.stat().st_size, int_db.stat().st_size
+
+    rows = len(dea) + len(sec)
+    print(f"x{scale}: {rows:,} fact rows")
+    print(f"  sqlite file      : {size_str / 2**20:8.2f} MB -> {size_int / 2**20:8.2f} MB ({1 - size_int / size_str:.0%} smaller)")
+    print(f"  sqlite load time : {t_str:8.2f} s  -> {t_int:8.2f} s  ({1 - t_int / t_str:.0%} faster)")
+    print(f"  SQL Server bytes : {sql_str / 2**20:8.2f} MB -> {sql_int / 2**20:8.2f} MB ({1 - sql_int / sql_str:.0%} smaller, row data only)")
+
+
+if __name__ == "__main__":
+    scales = [int(a) for a in sys.argv[1:]] or [1, 100]
+    dea, sec = read_facts()
+    for s in scales:
+        run(s, dea, sec)
@@ -0,0 +1,159 @@
+# BENCHMARK: wide fact tables vs the star schema for import-mode BI
+# Compares what a Power BI import model reads and queries in each layout:
+#   refresh size   rows and CSV bytes a refresh pulls: every fact + every dim
+#                  (star) vs the wide tables (wide_export.py); full refresh and
+#                  an incremental refresh of the last year (the star still
+#                  re-reads every dim, the wide tables one file per table)
+#   query time     the reports of docs/powerbi_examples.md as SQL: joins through
+#                  dim_municipality / dim_province / dim_autonomy and the label
+#                  dims on the warehouse, group-bys on one table on a SQLite copy
+#                  of the wide tables. Median of --repeat runs, and both layouts
+#                  must return the same rows.
+# The star side is the SQLite warehouse of a finished load (DW_BACKEND=sqlite),
+# the wide side is built in memory from the same staging files.
+#
+# usage: python benchmarks/wide_export.py [--warehouse warehouse/dw_local.sqlite] [--repeat 5]
+
+from __future__ import annotations
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from wide_export import WIDE_TABLES, build, geography, read_inputs  # noqa: E402
+
+STAR_TABLES = {
+    "wide_deaths": ["fact_deaths", "dim_sex", "dim_death_cause"],
+    "wide_economic_sector": ["fact_economic_sector", "dim_economic_sector"],
+    "wide_population_municipality": ["fact_population_municipality", "dim_municipality"],
+}
+GEO_DIMS = ["dim_province", "dim_autonomy", "dim_time"]
+
+# report -> (star SQL, wide SQL)
+QUERIES = {
+    "deaths per autonomy, sex, cause": (
+        "SELECT a.CODAUTO_NAME, f.[YEAR], s.SEX, c.DEATH_CAUSE_NAME, SUM(f.TOTAL_DEATHS) "
+        "FROM fact_deaths f JOIN dim_province p ON p.CPRO = f.CPRO JOIN dim_autonomy a ON a.CODAUTO = p.CODAUTO "
+        "JOIN dim_sex s ON s.SEX_ID = f.SEX_ID JOIN dim_death_cause c ON c.DEATH_CAUSE_ID = f.DEATH_CAUSE_ID "
+        "GROUP BY a.CODAUTO_NAME, f.[YEAR], s.SEX, c.DEATH_CAUSE_NAME",
+        "SELECT CODAUTO_NAME, [YEAR], SEX, DEATH_CAUSE_NAME, SUM(TOTAL_DEATHS) FROM wide_deaths "
+        "GROUP BY CODAUTO_NAME, [YEAR], SEX, DEATH_CAUSE_NAME",
+    ),
+    "sector % per autonomy": (
+        "SELECT a.CODAUTO_NAME, f.[YEAR], e.ECONOMIC_SECTOR, ROUND(AVG(f.TOTAL_VALUE), 6) "
+        "FROM fact_economic_sector f JOIN dim_province p ON p.CPRO = f.CPRO "
+        "JOIN dim_autonomy a ON a.CODAUTO = p.CODAUTO "
+        "JOIN dim_economic_sector e ON e.ECONOMIC_SECTOR_ID = f.ECONOMIC_SECTOR_ID "
+        "GROUP BY a.CODAUTO_NAME, f.[YEAR], e.ECONOMIC_SECTOR",
+        "SELECT CODAUTO_NAME, [YEAR], ECONOMIC_SECTOR, ROUND(AVG(TOTAL_VALUE), 6) FROM wide_economic_sector "
+        "GROUP BY CODAUTO_NAME, [YEAR], ECONOMIC_SECTOR",
+    ),
+    "population by sex per autonomy": (
+        "SELECT a.CODAUTO_NAME, f.[YEAR], SUM(f.MALE_TOTAL), SUM(f.FEMALE_TOTAL) "
+        "FROM fact_population_municipality f JOIN dim_municipality m ON m.CPRO = f.CPRO AND m.MUN_NUMBER = f.MUN_NUMBER "
+        "JOIN dim_province p ON p.CPRO = m.CPRO JOIN dim_autonomy a ON a.CODAUTO = p.CODAUTO "
+        "GROUP BY a.CODAUTO_NAME, f.[YEAR]",
+        "SELECT CODAUTO_NAME, [YEAR], SUM(MALE_TOTAL), SUM(FEMALE_TOTAL) FROM wide_population_municipality "
+        "GROUP BY CODAUTO_NAME, [YEAR]",
+    ),
+    "municipalities of a province, last year": (
+        "SELECT p.CPRO_NAME, m.MUN_NAME, f.POPULATION_TOTAL "
+        "FROM fact_population_municipality f JOIN dim_municipality m ON m.CPRO = f.CPRO AND m.MUN_NUMBER = f.MUN_NUMBER "
+        "JOIN dim_province p ON p.CPRO = m.CPRO "
+        "WHERE p.CPRO_NAME = 'Madrid' AND f.[YEAR] = (SELECT MAX([YEAR]) FROM fact_population_municipality)",
+        "SELECT CPRO_NAME, MUN_NAME, POPULATION_TOTAL FROM wide_population_municipality "
+        "WHERE CPRO_NAME = 'Madrid' AND [YEAR] = (SELECT MAX([YEAR]) FROM wide_population_municipality)",
+    ),
+}
+
+
+def csv_bytes(df: pd.DataFrame) -> int:
+    return len(df.to_csv(index=False).encode("utf-8"))
+
+
+def refresh_sizes(star: sqlite3.Connection, wide: dict[str, pd.DataFrame]) -> list[tuple[str, int, int, int, int]]:
+    # (scope, star rows, star bytes, wide rows, wide bytes) of a full and a last-year refresh
+    frames = {t: pd.read_sql(f"SELECT * FROM [{t}]", star)
+              for t in GEO_DIMS + [t for tables in STAR_TABLES.values() for t in tables]}
+    last = min(int(df["YEAR"].max()) for df in wide.values())  # the last year of every fact
+    geo = sum(csv_bytes(frames[t]) for t in GEO_DIMS), sum(len(frames[t]) for t in GEO_DIMS)
+
+    rows = []
+    for scope in ("full", f"year {last}"):
+        star_rows, star_bytes, wide_rows, wide_bytes = geo[1], geo[0], 0, 0
+        for table, star_tables in STAR_TABLES.items():
+            for t in star_tables:
+                df = frames[t]
+                if scope != "full" and t.startswith("fact_"):
+                    df = df[df["YEAR"] == last]
+                star_rows, star_bytes = star_rows + len(df), star_bytes + csv_bytes(df)
+            df = wide[table] if scope == "full" else wide[table][wide[table]["YEAR"] == last]
+            wide_rows, wide_bytes = wide_rows + len(df), wide_bytes + csv_bytes(df)
+        rows.append((scope, star_rows, star_bytes, wide_rows, wide_bytes))
+    return rows
+
+
+def timed(cn: sqlite3.Connection, sql: str, repeat: int) -> tuple[float, list[tuple]]:
+    times, result = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = cn.execute(sql).fetchall()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), sorted(result)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--warehouse", type=Path, default=PROJECT_ROOT / "warehouse" / "dw_local.sqlite",
+                        help="SQLite warehouse of a finished load (the star schema)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if not args.warehouse.exists():
+        print(f"No warehouse at {args.warehouse}: run DW_BACKEND=sqlite python main.py first", file=sys.stderr)
+        return 2
+
+    t0 = time.perf_counter()
+    data = read_inputs()
+    geo = geography(data["codauto"])
+    wide = {t: build(t, data, geo) for t in WIDE_TABLES}
+    print(f"wide tables built in {time.perf_counter() - t0:.2f}s: "
+          + ", ".join(f"{t}={len(df)}" for t, df in wide.items()))
+
+    star = sqlite3.connect(f"file:{args.warehouse}?mode=ro", uri=True)
+    print()
+    print(f"{'refresh':<12}{'star rows':>12}{'star MB':>10}{'wide rows':>12}{'wide MB':>10}")
+    for scope, star_rows, star_bytes, wide_rows, wide_bytes in refresh_sizes(star, wide):
+        print(f"{scope:<12}{star_rows:>12}{star_bytes / 1e6:>10.2f}{wide_rows:>12}{wide_bytes / 1e6:>10.2f}")
+
+    same = True
+    with tempfile.TemporaryDirectory() as tmp:
+        wide_cn = sqlite3.connect(Path(tmp) / "wide.sqlite")
+        for table, df in wide.items():
+            df.astype({c: "string" for c in df.select_dtypes("category")}).to_sql(table, wide_cn, index=False)
+
+        print()
+        print(f"{'query':<42}{'star ms':>10}{'wide ms':>10}{'rows':>8}")
+        for name, (star_sql, wide_sql) in QUERIES.items():
+            star_s, star_rows = timed(star, star_sql, args.repeat)
+            wide_s, wide_rows = timed(wide_cn, wide_sql, args.repeat)
+            ok = star_rows == wide_rows
+            same &= ok
+            print(f"{name:<42}{star_s * 1000:>10.2f}{wide_s * 1000:>10.2f}{len(wide_rows):>8}"
+                  f"{'' if ok else '  DIFFERENT'}")
+        wide_cn.close()
+    star.close()
+    print()
+    print("same results in both layouts" if same else "results DIFFER between the layouts")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,30 @@
 # main.py
-from src.orchestration import run_pipeline
+import argparse
+import os
 
 if __name__ == "__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser(description="Run the ETL pipeline (unchanged steps are skipped)")
+    parser.add_argument("--force", action="store_true", help="run every selected step, ignoring the stage cache")
+    parser.add_argument("--only", nargs="+", metavar="STEP",
+                        help="run only these steps: names, groups (fetch, transform, load) or globs")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile every step that runs (logs/profiles/<run id>/, same as PIPELINE_PROFILE=1)")
+    parser.add_argument("--sample", nargs="?", const="auto", metavar="CPROS",
+                        help="development run on a few provinces (auto: one per autonomy, or e.g. 28,8,46) "
+                             "into data/sample/ and warehouse/dw_sample.sqlite (same as PIPELINE_SAMPLE)")
+    parser.add_argument("--reprocess", nargs="*", metavar="SOURCE",
+                        help="parse the quarantined bad lines again (all sources, or these) and merge them, "
+                             "then run what changed (see src/quarantine.py)")
+    parser.add_argument("--wide-export", action="store_true",
+                        help="also write one denormalized table per fact to data/export/wide/ "
+                             "(see src/wide_export.py, same as WIDE_EXPORT=1)")
+    args = parser.parse_args()
+
+    # before the import: the data paths of every module depend on it
+    if args.sample:
+        os.environ["PIPELINE_SAMPLE"] = args.sample
+
+    from src.orchestration import run_pipeline
+
+    run_pipeline(force=args.force, only=args.only, profile=args.profile, reprocess_sources=args.reprocess,
+                 wide_export=args.wide_export)
@@ -0,0 +1,249 @@
+# AGGREGATES FOR THE POWER BI LAYER
+# Builds small rollup tables from the staged data so the dashboards in
+# docs/powerbi_examples.md read a few thousand rows instead of aggregating the
+# fine-grained facts at query time:
+#
+# agg_population_province_year   population, sex ratio and YoY growth per province and year
+# agg_population_autonomy_year    the same per autonomy and year
+# agg_economic_sector_autonomy_year  average sector percentage per autonomy and year
+# agg_deaths_autonomy_year        deaths per autonomy, year, sex and cause
+#
+# Refresh is incremental: every input is fingerprinted per YEAR and only the
+# years that changed (plus the next year, because of YoY growth) are recomputed
+# and handed to load_dw for a delete + insert of those years.
+
+from __future__ import annotations
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from run_history import record_rows
+from sampling import data_dir
+from schemas import STAGED, read_csv
+
+# logging (configured in __main__, load_dw imports the state helpers from here)
+logger = logging.getLogger(__name__)
+
+
+DATA_DIR = data_dir("staging")
+STATE_DIR = data_dir("state")
+
+CSV_CODAUTO = DATA_DIR / "codauto_cpro_transformed.csv"
+CSV_DEATH  = DATA_DIR / "death_causes_province_transformed.csv"
+CSV_SECTOR = DATA_DIR / "economic_sector_province_transformed.csv"
+CSV_POB    = DATA_DIR / "pobmun_combined_transformed.csv"
+
+AGG_STATE = STATE_DIR / "aggregates_state.json"
+
+AGG_TABLES = {
+    "agg_population_province_year": ["CPRO", "YEAR"],
+    "agg_population_autonomy_year": ["CODAUTO", "YEAR"],
+    "agg_economic_sector_autonomy_year": ["CODAUTO", "YEAR", "ECONOMIC_SECTOR"],
+    "agg_deaths_autonomy_year": ["CODAUTO", "YEAR", "SEX", "DEATH_CAUSE_CODE"],
+}
+
+# which staged input feeds each rollup (used for the per-year fingerprints)
+AGG_SOURCES = {
+    "agg_population_province_year": "pobmun",
+    "agg_population_autonomy_year": "pobmun",
+    "agg_economic_sector_autonomy_year": "sector",
+    "agg_deaths_autonomy_year": "deaths",
+}
+
+
+def agg_path(table: str) -> Path:
+    return DATA_DIR / f"{table}.csv"
+
+
+def load_state(path: Path = AGG_STATE) -> dict:
+    if not path.exists():
+        return {"year_hashes": {}, "pending_years": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_state(state: dict, path: Path = AGG_STATE) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def year_hashes(df: pd.DataFrame) -> dict[str, str]:
+    # one order-independent fingerprint per YEAR (sum of the row hashes)
+    row_hash = pd.util.hash_pandas_object(df, index=False).astype("uint64")
+    sums = row_hash.groupby(df["YEAR"]).sum()
+    return {str(int(y)): format(int(h), "x") for y, h in sums.items()}
+
+
+def changed_years(old: dict[str, str], new: dict[str, str]) -> set[int]:
+    keys = set(old) | set(new)
+    return {int(y) for y in keys if old.get(y) != new.get(y)}
+
+
+# reading
+def read_inputs() -> dict[str, pd.DataFrame]:
+    # typed reads (schemas.py), only the columns of the rollups
+    cod = read_csv(STAGED["codauto"], CSV_CODAUTO, usecols=["CODAUTO", "CPRO"])
+    pob = read_csv(STAGED["pobmun"], CSV_POB,
+                   usecols=["CPRO", "MUN_NUMBER", "YEAR", "POBLATION", "MALE", "FEMALE"])
+    sec = read_csv(STAGED["sector"], CSV_SECTOR, usecols=["CPRO", "YEAR", "ECONOMIC_SECTOR", "TOTAL"])
+    dea = read_csv(STAGED["deaths"], CSV_DEATH, usecols=["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE", "TOTAL"])
+
+    pob = pob.dropna(subset=["CPRO", "MUN_NUMBER", "YEAR", "POBLATION", "MALE", "FEMALE"])
+    # same dedupe rule as load_dw: MAX per (CPRO, MUN_NUMBER, YEAR)
+    pob = (
+        pob.groupby(["CPRO", "MUN_NUMBER", "YEAR"], as_index=False)[["POBLATION", "MALE", "FEMALE"]]
+           .max()
+    )
+    sec = sec.dropna(subset=["CPRO", "YEAR", "ECONOMIC_SECTOR", "TOTAL"])
+    dea = dea.dropna(subset=["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE", "TOTAL"])
+
+    return {
+        "codauto": cod[["CODAUTO", "CPRO"]].dropna().drop_duplicates(subset=["CPRO"]),
+        "pobmun": pob,
+        "sector": sec[["CPRO", "YEAR", "ECONOMIC_SECTOR", "TOTAL"]],
+        "deaths": dea[["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE", "TOTAL"]],
+    }
+
+
+# rollups (all vectorized groupby / merge)
+def add_population_measures(df: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    # sex ratio = men per 100 women, YoY growth against YEAR - 1 of the same key
+    df["SEX_RATIO"] = (df["MALE_TOTAL"] / df["FEMALE_TOTAL"].where(df["FEMALE_TOTAL"] > 0) * 100).round(2)
+
+    prev = df[keys + ["POPULATION_TOTAL"]].rename(columns={"POPULATION_TOTAL": "PREV"})
+    prev["YEAR"] = prev["YEAR"] + 1
+    df = df.merge(prev, on=keys, how="left")
+    df["POPULATION_YOY_PCT"] = ((df["POPULATION_TOTAL"] - df["PREV"]) / df["PREV"].where(df["PREV"] > 0) * 100).round(3)
+    return df.drop(columns=["PREV"])
+
+
+def population_rollup(pob: pd.DataFrame, cod: pd.DataFrame, level: str) -> pd.DataFrame:
+    if level == "CODAUTO":
+        pob = pob.merge(cod, on="CPRO", how="inner")
+
+    keys = [level, "YEAR"]
+    out = (
+        pob.groupby(keys, as_index=False)
+           .agg(POPULATION_TOTAL=("POBLATION", "sum"),
+                MALE_TOTAL=("MALE", "sum"),
+                FEMALE_TOTAL=("FEMALE", "sum"),
+                MUNICIPALITIES=("MUN_NUMBER", "count"))
+    )
+    return add_population_measures(out, keys)
+
+
+def sector_rollup(sec: pd.DataFrame, cod: pd.DataFrame) -> pd.DataFrame:
+    # percentages are non-additive: average of the provinces, never a sum
+    out = (
+        sec.merge(cod, on="CPRO", how="inner")
+           .groupby(["CODAUTO", "YEAR", "ECONOMIC_SECTOR"], as_index=False)
+           .agg(AVG_VALUE=("TOTAL", "mean"), PROVINCES=("CPRO", "nunique"))
+    )
+    out["AVG_VALUE"] = out["AVG_VALUE"].round(4)
+    return out
+
+
+def deaths_rollup(dea: pd.DataFrame, cod: pd.DataFrame) -> pd.DataFrame:
+    return (
+        dea.merge(cod, on="CPRO", how="inner")
+           .groupby(["CODAUTO", "YEAR", "SEX", "DEATH_CAUSE_CODE"], as_index=False)
+           .agg(TOTAL_DEATHS=("TOTAL", "sum"))
+    )
+
+
+def build(table: str, data: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    cod = data["codauto"]
+    if table == "agg_population_province_year":
+        return population_rollup(data["pobmun"], cod, "CPRO")
+    if table == "agg_population_autonomy_year":
+        return population_rollup(data["pobmun"], cod, "CODAUTO")
+    if table == "agg_economic_sector_autonomy_year":
+        return sector_rollup(data["sector"], cod)
+    if table == "agg_deaths_autonomy_year":
+        return deaths_rollup(data["deaths"], cod)
+    raise ValueError(f"Unknown aggregate table: {table}")
+
+
+def refresh(table: str, data: dict[str, pd.DataFrame], years: set[int] | None) -> pd.DataFrame:
+    # years=None -> full rebuild, otherwise only those years are recomputed and
+    # merged into the previous output
+    path = agg_path(table)
+    if years is None or not path.exists():
+        return build(table, data)
+
+    source = AGG_SOURCES[table]
+    # YoY needs the previous year as input, it is dropped again after building
+    needed = years | {y - 1 for y in years}
+    subset = dict(data)
+    subset[source] = data[source][data[source]["YEAR"].isin(needed)]
+
+    fresh = build(table, subset)
+    fresh = fresh[fresh["YEAR"].isin(years)]
+
+    old = read_csv(STAGED[table], path)
+    old = old[~old["YEAR"].isin(years)]
+    return pd.concat([old, fresh], ignore_index=True).sort_values(AGG_TABLES[table]).reset_index(drop=True)
+
+
+# MAIN
+def main(full: bool = False) -> int:
+    start_ts = time.time()
+    logger.info("==== aggregates START ====")
+
+    data = read_inputs()
+    state = load_state()
+    old_hashes = state.get("year_hashes", {})
+    pending = state.get("pending_years", {})
+
+    # codauto changes move provinces between autonomies: everything is dirty
+    cod_hash = format(int(pd.util.hash_pandas_object(data["codauto"], index=False).sum()), "x")
+    if full or cod_hash != old_hashes.get("codauto"):
+        full = True
+
+    new_hashes = {"codauto": cod_hash}
+    for source in ("pobmun", "sector", "deaths"):
+        new_hashes[source] = year_hashes(data[source])
+
+    for table, source in AGG_SOURCES.items():
+        if full or not agg_path(table).exists():
+            years = None
+        else:
+            years = changed_years(old_hashes.get(source, {}), new_hashes[source])
+            if table.startswith("agg_population"):
+                years |= {y + 1 for y in years}
+            if not years:
+                logger.info("[%s] no input changes, skipped", table)
+                continue
+
+        out = refresh(table, data, years)
+        out.to_csv(agg_path(table), index=False)
+        record_rows(table, len(out))
+
+        if years is None:
+            pending[table] = "all"
+        elif pending.get(table) != "all":
+            pending[table] = sorted(set(pending.get(table, [])) | years)
+        logger.info(
+            "[%s] %s -> %d rows", table,
+            "full rebuild" if years is None else f"refreshed years {sorted(years)}", len(out)
+        )
+
+    state["year_hashes"] = new_hashes
+    state["pending_years"] = pending
+    save_state(state)
+
+    logger.info("==== aggregates SUCCESS in %.2fs ====", time.time() - start_ts)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    from log_setup import configure_logging
+    configure_logging("aggregates")
+    raise SystemExit(main(full="--full" in sys.argv[1:]))
@@ -0,0 +1,204 @@
+# ADAPTIVE BATCH LOADER
+# Replaces the fixed batch_size loop of exec_many:
+# - each batch is committed on its own, so a failure never throws away finished batches
+# - batch size follows the observed rows/s and the payload size of the rows
+# - transient errors (timeouts, lost connection, locks) are retried with backoff
+# - data errors bisect the failing batch until the bad rows are isolated,
+#   those rows go to a reject file and the rest of the batch is loaded.
+#   data/rejects/<table>[.<part>].csv is rewritten by the first reject of a
+#   load; the other passes over the same file in the process (a dim insert and
+#   its SCD update pass have their own part) append to it
+# - with a LoadJournal, every committed row range is journaled in the same
+#   transaction, and run(rows, start=n) continues a load after its first n rows
+
+from __future__ import annotations
+import csv
+import logging
+import random
+import re
+import time
+from pathlib import Path
+
+from sampling import data_dir
+
+
+logger = logging.getLogger(__name__)
+
+REJECTS_DIR = data_dir("rejects")
+# reject files already written by this process (the next passes append)
+_rejects_opened: set[Path] = set()
+
+BATCH_SIZE_INITIAL = 5000
+BATCH_SIZE_MIN = 100
+BATCH_SIZE_MAX = 50000
+TARGET_BATCH_SECONDS = 1.0           # how long one executemany round trip should take
+MAX_BATCH_BYTES = 8 * 1024 * 1024    # rough wire payload limit per batch
+SMOOTHING = 0.5                      # weight of the newest throughput sample
+
+TRANSIENT_RETRIES = 3
+BACKOFF = 2
+
+# SQLSTATEs / Azure SQL error numbers that are worth retrying
+TRANSIENT_SQLSTATES = {"08S01", "08001", "08004", "HYT00", "HYT01", "40001"}
+TRANSIENT_AZURE_CODES = ("40613", "40197", "40501", "49918", "49919", "49920", "10928", "10929", "4060")
+TRANSIENT_SQLITE_MESSAGES = ("database is locked", "database table is locked", "disk i/o error")
+
+
+def is_transient(exc: Exception) -> bool:
+    args = getattr(exc, "args", ())
+    sqlstate = args[0] if args and isinstance(args[0], str) else ""
+    if sqlstate in TRANSIENT_SQLSTATES:
+        return True
+
+    message = " ".join(str(a) for a in args).lower()
+    if any(code in message for code in TRANSIENT_AZURE_CODES):
+        return True
+    return type(exc).__name__ == "OperationalError" and any(m in message for m in TRANSIENT_SQLITE_MESSAGES)
+
+
+def table_from_sql(sql: str) -> str:
+    m = re.search(r"(?:INSERT\s+INTO|UPDATE)\s+([\w.\[\]]+)", sql, flags=re.IGNORECASE)
+    return m.group(1).replace("[", "").replace("]", "") if m else "unknown"
+
+
+def estimate_row_bytes(rows: list[tuple], sample: int = 200) -> int:
+    picked = rows[:sample]
+    if not picked:
+        return 1
+    total = sum(len(str(v)) + 2 for row in picked for v in row)
+    return max(1, total // len(picked))
+
+
+class AdaptiveBatcher:
+    def __init__(self, cursor, sql: str, *, table: str | None = None,
+                 batch_size: int = BATCH_SIZE_INITIAL,
+                 min_size: int = BATCH_SIZE_MIN, max_size: int = BATCH_SIZE_MAX,
+                 target_seconds: float = TARGET_BATCH_SECONDS,
+                 max_bytes: int = MAX_BATCH_BYTES,
+                 retries: int = TRANSIENT_RETRIES, backoff: float = BACKOFF,
+                 rejects_dir: Path = REJECTS_DIR, part: str | None = None, journal=None):
+        self.cursor = cursor
+        self.cn = cursor.connection
+        self.sql = sql
+        self.table = table or table_from_sql(sql)
+        self.batch_size = batch_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.backoff = backoff
+        self.rejects_path = Path(rejects_dir) / f"{self.table}{'.' + part if part else ''}.csv"
+        self.bytes_cap = max_size
+        self.journal = journal
+
+        self.rows_per_sec: float | None = None
+        self.loaded = 0
+        self.rejected = 0
+        self.rejected_at: list[int] = []   # positions of the rejected rows
+        self.batches = 0
+
+    # sizing
+    def _observe(self, n_rows: int, seconds: float) -> None:
+        rate = n_rows / max(seconds, 1e-6)
+        if self.rows_per_sec is None:
+            self.rows_per_sec = rate
+        else:
+            self.rows_per_sec = SMOOTHING * rate + (1 - SMOOTHING) * self.rows_per_sec
+
+        wanted = int(self.rows_per_sec * self.target_seconds)
+        self.batch_size = max(self.min_size, min(self.max_size, self.bytes_cap, wanted))
+
+    # execution
+    def _execute(self, batch: list[tuple], start: int) -> None:
+        # retries transient errors, anything else goes back to the caller
+        for attempt in range(1, self.retries + 1):
+            try:
+                self.cursor.executemany(self.sql, batch)
+                if self.journal is not None:
+                    self.journal.record(self.cursor, start, start + len(batch), len(batch))
+                self.cn.commit()
+                return
+            except Exception as exc:
+                self.cn.rollback()
+                if not is_transient(exc) or attempt == self.retries:
+                    raise
+                wait = self.backoff * 2 ** (attempt - 1) + random.uniform(0, self.backoff)
+                logger.warning(
+                    "[%s] transient error on batch of %d rows (attempt %d/%d), retrying in %.1fs: %s",
+                    self.table, len(batch), attempt, self.retries, wait, exc
+                )
+                time.sleep(wait)
+
+    def _load_isolating(self, batch: list[tuple], start: int) -> None:
+        # bisect a failing batch: good halves are committed, single bad rows are rejected
+        try:
+            self._execute(batch, start)
+            self.loaded += len(batch)
+        except Exception as exc:
+            if is_transient(exc):
+                raise
+            self._split(batch, start, exc)
+
+    def _split(self, batch: list[tuple], start: int, exc: Exception) -> None:
+        if len(batch) == 1:
+            self._reject(batch[0], start, exc)
+            return
+        mid = len(batch) // 2
+        self._load_isolating(batch[:mid], start)
+        self._load_isolating(batch[mid:], start + mid)
+
+    def _reject(self, row: tuple, pos: int, exc: Exception) -> None:
+        self.rejected += 1
+        self.rejected_at.append(pos)
+        self.rejects_path.parent.mkdir(parents=True, exist_ok=True)
+        header = not self.rejects_path.exists()
+        with self.rejects_path.open("a", newline="", encoding="utf-8") as fh:
+            w = csv.writer(fh)
+            if header:
+                w.writerow(["ROW", "ERROR"])
+            w.writerow([repr(row), str(exc).replace("\n", " ")])
+        logger.warning("[%s] rejected row %r: %s", self.table, row, exc)
+
+        if self.journal is not None:
+            self.journal.record(self.cursor, pos, pos + 1, 0, rejected=1)
+            self.cn.commit()
+
+    def run(self, rows: list[tuple], start: int = 0) -> int:
+        self.bytes_cap = max(self.min_size, self.max_bytes // estimate_row_bytes(rows[start:]))
+        self.batch_size = max(self.min_size, min(self.batch_size, self.bytes_cap))
+        if self.rejects_path not in _rejects_opened:
+            # the first load of the file in this process starts it over, even without
+            # rejects, so it never shows an older run (a resumed load keeps it)
+            _rejects_opened.add(self.rejects_path)
+            if start == 0:
+                self.rejects_path.unlink(missing_ok=True)
+        if start:
+            logger.info("[%s] resuming at row %d of %d", self.table, start, len(rows))
+
+        pos = start
+        while pos < len(rows):
+            batch = rows[pos:pos + self.batch_size]
+            t0 = time.perf_counter()
+            try:
+                self._execute(batch, pos)
+                self.loaded += len(batch)
+                self._observe(len(batch), time.perf_counter() - t0)
+            except Exception as exc:
+                if is_transient(exc):
+                    raise
+                logger.warning(
+                    "[%s] batch rows %d-%d failed (%s), isolating bad rows",
+                    self.table, pos, pos + len(batch) - 1, exc
+                )
+                self._split(batch, pos, exc)
+            pos += len(batch)
+            self.batches += 1
+
+        logger.info(
+            "[%s] loaded %d rows in %d batches (last batch size %d, %.0f rows/s), rejected %d",
+            self.table, self.loaded, self.batches, self.batch_size, self.rows_per_sec or 0.0, self.rejected
+        )
+        if self.rejected:
+            logger.warning("[%s] %d rejected rows written to %s", self.table, self.rejected, self.rejects_path)
+        return self.loaded
@@ -0,0 +1,142 @@
+# DIMENSION CACHE
+# data/state/dim_cache.json keeps the members every dimension has in the
+# warehouse after the last dims load: primary key, attributes and a 64-bit
+# hash of the attributes, plus the version of that load. The same version is
+# written to the load journal, so a cache that does not describe the warehouse
+# (first load, --restart, another warehouse) is detected.
+# - the dims step sends only what changed (SCD type 1): a new key is inserted,
+#   a key whose attribute hash changed is updated in place, the rest is not sent
+# - a member that disappears from staging stays (facts may still reference it)
+# - a member the warehouse rejected (data/rejects/) is not recorded as loaded,
+#   the next load sends it again
+# - the surrogate id lookups of the facts / aggregates and the dim keys of the
+#   integrity pre-check are served from the cache, not from the staging files
+# A different shard layout (sharded.py loads dim_municipality per shard)
+# starts from an empty cache, the dims are then cleared and reloaded.
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from integrity import key_index
+from sampling import data_dir
+from surrogate_keys import SURROGATE_DIMS
+
+
+CACHE_PATH = data_dir("state") / "dim_cache.json"
+
+# dim -> (primary key, attributes), in load order
+DIMS = {
+    "dim_autonomy": (["CODAUTO"], ["CODAUTO_NAME"]),
+    "dim_province": (["CPRO"], ["CODAUTO", "CPRO_NAME"]),
+    "dim_time": (["YEAR"], []),
+    "dim_sex": (["SEX_ID"], ["SEX"]),
+    "dim_death_cause": (["DEATH_CAUSE_ID"], ["DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME"]),
+    "dim_economic_sector": (["ECONOMIC_SECTOR_ID"], ["ECONOMIC_SECTOR"]),
+    "dim_municipality": (["CPRO", "MUN_NUMBER"], ["MUN_NAME"]),
+}
+
+
+def attribute_hash(df: pd.DataFrame, attrs: list[str]) -> np.ndarray:
+    # one uint64 per row, computed on the text of the attributes (stable across runs and dtypes)
+    if not attrs:
+        return np.zeros(len(df), dtype="uint64")
+    return pd.util.hash_pandas_object(df[attrs].astype("string"), index=False).to_numpy()
+
+
+class DimCache:
+    def __init__(self, frames: dict[str, pd.DataFrame] | None = None,
+                 version: str | None = None, layout: str | None = None):
+        self.frames = frames or {}   # dim -> key + attribute columns + HASH, sorted by key
+        self.version = version       # version in the warehouse (None: not loaded yet)
+        self.layout = layout
+
+    @classmethod
+    def load(cls, layout: str | None = None, path: Path = CACHE_PATH) -> DimCache:
+        # layout given and different from the cached one -> empty cache for that layout
+        if not path.exists():
+            return cls(layout=layout)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if layout is not None and data["layout"] != layout:
+            return cls(layout=layout)
+        frames = {
+            dim: pd.DataFrame({c: pd.array(v, dtype=d["dtypes"][c]) for c, v in d["columns"].items()})
+            for dim, d in data["dims"].items()
+        }
+        return cls(frames, data["version"], data["layout"])
+
+    def save(self, path: Path = CACHE_PATH) -> None:
+        data = {
+            "version": self.version,
+            "layout": self.layout,
+            "dims": {
+                dim: {
+                    "dtypes": {c: str(t) for c, t in df.dtypes.items()},
+                    "columns": {c: df[c].astype(object).where(df[c].notna(), None).tolist() for c in df.columns},
+                }
+                for dim, df in self.frames.items()
+            },
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def diff(self, dim: str, df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+        # (members with a key the cache does not have, members whose attributes changed)
+        keys, attrs = DIMS[dim]
+        df = df.assign(HASH=attribute_hash(df, attrs))
+        old = self.frames.get(dim)
+        if old is None or old.empty:
+            return df, df.iloc[0:0]
+        pos = key_index(old, keys).get_indexer(key_index(df, keys))
+        new = pos == -1
+        changed = ~new & (old["HASH"].to_numpy()[pos] != df["HASH"].to_numpy())
+        return df[new], df[changed]
+
+    def merged(self, dims: dict[str, pd.DataFrame]) -> DimCache:
+        # the cache once these dims are upserted (not saved, version None until content_version())
+        frames = dict(self.frames)
+        for dim, df in dims.items():
+            keys, attrs = DIMS[dim]
+            df = df[keys + attrs].assign(HASH=attribute_hash(df, attrs))
+            old = frames.get(dim)
+            if old is not None:
+                df = pd.concat([old[~key_index(old, keys).isin(key_index(df, keys))], df], ignore_index=True)
+            frames[dim] = df.sort_values(keys, ignore_index=True)
+        return DimCache(frames, layout=self.layout)
+
+    def reverted(self, dim: str, df: pd.DataFrame, old: DimCache) -> DimCache:
+        # this cache with the members of df (by key) as old has them, or without them
+        keys, _ = DIMS[dim]
+        frames = dict(self.frames)
+        current = frames[dim]
+        current = current[~key_index(current, keys).isin(key_index(df, keys))]
+        previous = old.frames.get(dim)
+        if previous is not None:
+            previous = previous[key_index(previous, keys).isin(key_index(df, keys))]
+            current = pd.concat([current, previous], ignore_index=True)
+        frames[dim] = current.sort_values(keys, ignore_index=True)
+        return DimCache(frames, layout=self.layout)
+
+    def content_version(self) -> str:
+        h = hashlib.sha256(f"layout={self.layout}\n".encode())
+        for dim in sorted(self.frames):
+            keys, _ = DIMS[dim]
+            h.update(f"{dim}\n".encode())
+            h.update(pd.util.hash_pandas_object(self.frames[dim][keys + ["HASH"]], index=False).to_numpy().tobytes())
+        return h.hexdigest()
+
+    def ids(self, dim: str, values: pd.Series) -> pd.Series:
+        # natural key -> surrogate id of the cached member, <NA> when not in the warehouse
+        natural, (id_col,) = SURROGATE_DIMS[dim], DIMS[dim][0]
+        df = self.frames.get(dim)
+        if df is None:
+            return pd.Series(pd.NA, index=values.index, dtype="Int32")
+        mapping = pd.Series(df[id_col].to_numpy(), index=df[natural].astype("string"))
+        return values.astype("string").map(mapping).astype("Int32")
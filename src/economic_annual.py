@@ -0,0 +1,172 @@
+# STREAMING QUARTERLY -> ANNUAL (economic sector)
+# economic_sector_province.csv has one row per province, sector and quarter
+# (~18.8k rows, 4 more per province and sector every year). It is read in
+# chunks of ECONOMIC_CHUNK_ROWS (5000) rows, and each chunk only updates running
+# accumulators per (province, sector, year):
+#   SUM      sum of the reported totals
+#   COUNT    number of reported totals
+#   MISSING  quarters without a total ("..", or not a number)
+# Memory is one chunk plus one accumulator per group (~5k), whatever the number
+# of quarters in the file.
+#
+# The missing quarters are imputed at the end. The group means of imputation.py
+# are sums of the same accumulators, so group_fills() gives them exactly the
+# values impute() gives the rows. The annual value is then
+# (SUM + imputed quarters) / (COUNT + MISSING). Strategies that need the rows
+# (median, ffill_year) are not streamable, and transformation.py reads the whole
+# file for them.
+#
+# Closed years: a year with its four quarters in the file does not change when
+# a new quarter arrives. Its accumulators and a fingerprint of its raw rows are
+# kept in data/state/economic_annual.json. The next runs only fingerprint the
+# rows of a closed year (no number parsing, no grouping) and accumulate the open
+# years: the current one, or a new one. A closed year whose rows changed anyway
+# (an INE revision, or rows removed) is accumulated again in a second pass.
+
+from __future__ import annotations
+import json
+import logging
+import os
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from imputation import MASK, MASK_DTYPE, Spec, additive, group_fills, parse_number
+from sampling import data_dir
+from schemas import RAW, read_csv_chunks
+
+logger = logging.getLogger(__name__)
+
+
+STATE_PATH = data_dir("state") / "economic_annual.json"
+CHUNK_ROWS = int(os.getenv("ECONOMIC_CHUNK_ROWS", "5000"))
+
+KEYS = ["Provincias", "Sector económico", "YEAR"]
+STATS = ["SUM", "COUNT", "MISSING"]
+# the state is dropped when its layout changes
+LAYOUT = [*KEYS, *STATS]
+QUARTERS = {"1", "2", "3", "4"}
+
+
+def streamable(spec: Spec) -> bool:
+    # additive strategies over groups the accumulators keep
+    return additive(spec) and set(spec.groups) <= set(KEYS) - {"YEAR"}
+
+
+def load_state(path: Path = STATE_PATH) -> dict[str, dict]:
+    # closed year -> {"hash", "rows": [[province, sector, SUM, COUNT, MISSING], ...]}
+    if not path.exists():
+        return {}
+    state = json.loads(path.read_text(encoding="utf-8"))
+    return state.get("closed", {}) if state.get("layout") == LAYOUT else {}
+
+
+def save_state(closed: dict[str, dict], path: Path = STATE_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"layout": LAYOUT, "closed": closed}), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def accumulate(rows: pd.DataFrame, year: pd.Series) -> pd.DataFrame:
+    # (SUM, COUNT, MISSING) per KEYS of a chunk, without the national rows
+    province = rows["Provincias"].str.strip()
+    national = province.str.lower().eq("total nacional").fillna(False).to_numpy()
+    total = parse_number(rows["Total"])
+    part = pd.DataFrame({
+        "Provincias": province, "Sector económico": rows["Sector económico"], "YEAR": year,
+        "SUM": total, "COUNT": total.notna().astype("int64"), "MISSING": total.isna().astype("int64"),
+    })[~national]
+    # a row without a valid period still counts for the group means (YEAR "")
+    return part.groupby(KEYS, as_index=False).agg(SUM=("SUM", "sum"), COUNT=("COUNT", "sum"),
+                                                 MISSING=("MISSING", "sum"))
+
+
+def scan(path: Path, chunksize: int, only: set[str] | None = None,
+         skip: set[str] = frozenset()) -> tuple[pd.DataFrame, dict[str, str], dict[str, set[str]]]:
+    # one pass over the file: accumulators of the years to accumulate (only, or all but
+    # skip), plus the fingerprint and the quarters of every year
+    acc = pd.DataFrame(columns=LAYOUT)
+    hashes: dict[str, int] = defaultdict(int)
+    quarters: dict[str, set[str]] = defaultdict(set)
+    chunks = rows_read = 0
+
+    for chunk in read_csv_chunks(RAW["economic"], path, chunksize=chunksize):
+        chunks, rows_read = chunks + 1, rows_read + len(chunk)
+        period = chunk["Periodo"].str.strip().str.extract(r"^(\d{4})T([1-4])$")
+        year = period[0].fillna("")
+
+        # order-independent fingerprint of the raw rows of each year (sum of the row hashes)
+        row_hash = pd.util.hash_pandas_object(chunk, index=False).astype("uint64")
+        for y, h in row_hash.groupby(year.to_numpy()).sum().items():
+            hashes[y] = (hashes[y] + int(h)) % (1 << 64)
+        for y, q in period.dropna().drop_duplicates().itertuples(index=False):
+            quarters[y].add(q)
+
+        wanted = year.isin(only) if only is not None else ~year.isin(skip)
+        if wanted.any():
+            part = accumulate(chunk[wanted.to_numpy()], year[wanted])
+            acc = part if acc.empty else (
+                pd.concat([acc, part], ignore_index=True).groupby(KEYS, as_index=False)[STATS].sum()
+            )
+
+    logger.info("Economic sector streamed: %d rows in %d chunks -> %d accumulators", rows_read, chunks, len(acc))
+    return acc, {y: format(h, "x") for y, h in hashes.items()}, quarters
+
+
+def closed_frame(closed: dict[str, dict], years: list[str]) -> pd.DataFrame:
+    # accumulators of the closed years kept in the state
+    parts = [pd.DataFrame(closed[y]["rows"], columns=["Provincias", "Sector económico", *STATS]).assign(YEAR=y)
+             for y in years if closed[y]["rows"]]
+    if not parts:
+        return pd.DataFrame(columns=LAYOUT)
+    return pd.concat(parts, ignore_index=True)[LAYOUT]
+
+
+def annual(path: Path, spec: Spec, chunksize: int = CHUNK_ROWS, full: bool = False,
+           state_path: Path = STATE_PATH) -> pd.DataFrame:
+    # per (province, sector, year): TOTAL_SUM / TOTAL_COUNT of the quarters, imputed
+    # ones included, and the IMPUTED mask; full=True ignores the closed years kept
+    if not streamable(spec):
+        raise ValueError(f"Strategies {spec.strategies} over {spec.groups} cannot be streamed")
+    closed = {} if full else load_state(state_path)
+
+    acc, hashes, quarters = scan(path, chunksize, skip=set(closed))
+    revised = sorted(y for y in closed if hashes.get(y) != closed[y]["hash"])
+    kept = sorted(set(closed) - set(revised))
+    if revised:
+        logger.warning("Closed years changed in %s, accumulated again: %s", path.name, revised)
+        again, _, _ = scan(path, chunksize, only=set(revised))
+        acc = pd.concat([acc, again], ignore_index=True)
+    acc = pd.concat([closed_frame(closed, kept), acc], ignore_index=True) if kept else acc
+    acc = acc.astype({"SUM": "float64", "COUNT": "int64", "MISSING": "int64"})
+    logger.info("Economic sector years: %d closed kept, %d accumulated", len(kept),
+                len({y for y in hashes if y not in kept}))
+
+    # the years with their four quarters are closed from now on
+    complete = sorted(y for y in hashes if y and quarters[y] >= QUARTERS)
+    by_year = dict(tuple(acc.groupby("YEAR")))
+    save_state({
+        y: {"hash": hashes[y],
+            "rows": by_year[y][["Provincias", "Sector económico", *STATS]].to_numpy().tolist() if y in by_year else []}
+        for y in complete
+    }, state_path)
+
+    # impute the missing quarters from the group sums (same values as impute())
+    groups = list(spec.groups)
+    g = acc.groupby(groups)[STATS].sum()
+    fill = group_fills(g["SUM"], g["COUNT"], g["MISSING"], spec.strategies).rename("FILL")
+    acc = acc.merge(fill, left_on=groups, right_index=True, how="left")
+    imputed = acc["MISSING"].where(acc["FILL"].notna(), 0)
+    # impute() rounds every value: the reported ones are already integers
+    acc["TOTAL_SUM"] = acc["SUM"] + (imputed * acc["FILL"].round()).fillna(0)
+    acc["TOTAL_COUNT"] = acc["COUNT"] + imputed
+    acc[MASK] = pd.array((imputed > 0).to_numpy().astype(np.uint8), dtype=MASK_DTYPE)
+    logger.info("[economic] Total: %d quarters missing, %d imputed (%s)", int(acc["MISSING"].sum()),
+                int(imputed.sum()), ",".join(spec.strategies))
+
+    acc = acc[acc["YEAR"] != ""]
+    acc["YEAR"] = acc["YEAR"].astype("Int64")
+    return acc[["Provincias", "Sector económico", "YEAR", "TOTAL_SUM", "TOTAL_COUNT", MASK]].reset_index(drop=True)
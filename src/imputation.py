@@ -0,0 +1,238 @@
+# IMPUTATION
+# One engine for the missing measures of the INE tables (economic, deaths),
+# instead of a hand-written chain per dataset:
+#   parse   text -> float ("4.059" -> 4059: the thousands separator is dropped;
+#           ".." and anything else that is not a number is missing)
+#   fill    the strategies of the dataset, in order, each one fills what the
+#           previous ones left:
+#             group_mean    mean of the group (e.g. province + cause)
+#             median        median of the group
+#             ffill_year    last value of the group in an earlier period
+#             global_mean   mean of the column as filled so far
+#   round   to Int64
+# The filled cells are flagged in the bitmask column IMPUTED (UInt8, bit i =
+# measure i of the spec; 0 = every measure of the row was reported), so the
+# staging files tell reported values from imputed ones.
+#
+# Group statistics come from one groupby over (group, period): the sum and count
+# of every measure per group and period, for every measure at once. A group mean
+# is the sum of its partials. The partials are cached per period with a
+# fingerprint of the rows of that period in data/state/imputation/<dataset>.json:
+# a run only aggregates the periods whose rows changed (a new quarter, a
+# corrected year), the unchanged history comes from the cache. Medians are not
+# additive, the median strategy is computed over every row.
+#
+# The strategies of a dataset can be changed with IMPUTE_<DATASET>, e.g.
+#   IMPUTE_DEATHS=ffill_year,group_mean,global_mean
+
+from __future__ import annotations
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sampling import data_dir
+
+logger = logging.getLogger(__name__)
+
+
+STATS_DIR = data_dir("state") / "imputation"
+MASK = "IMPUTED"
+MASK_DTYPE = "UInt8"
+
+
+@dataclass(frozen=True)
+class Spec:
+    columns: tuple[str, ...]     # measures, bit i of the mask = columns[i]
+    groups: tuple[str, ...]      # the group of the group statistics
+    period: str                  # the order of ffill_year and the unit of the stats cache
+    strategies: tuple[str, ...] = ("group_mean", "global_mean")
+
+
+SPECS = {
+    "economic": Spec(columns=("Total",), groups=("Provincias",), period="Periodo"),
+    "deaths": Spec(columns=("Total",), groups=("Provincias", "Causa de muerte"), period="Periodo"),
+}
+
+
+def spec_for(dataset: str) -> Spec:
+    spec = SPECS[dataset]
+    env = os.getenv(f"IMPUTE_{dataset.upper()}", "").replace(" ", "")
+    if env:
+        spec = Spec(spec.columns, spec.groups, spec.period, tuple(env.split(",")))
+    unknown = [s for s in spec.strategies if s not in STRATEGIES]
+    if unknown:
+        raise ValueError(f"Unknown imputation strategies {unknown} for {dataset} (expected {list(STRATEGIES)})")
+    return spec
+
+
+def parse_number(series: pd.Series) -> pd.Series:
+    # "4.059" -> 4059.0, missing / not a number -> NaN
+    return pd.to_numeric(
+        series.astype("string").str.strip().str.replace(".", "", regex=False),
+        errors="coerce",
+    ).astype("float64")
+
+
+# group statistics
+class GroupStats:
+    # per-period partial sums / counts of every measure, merged into per-group totals
+    def __init__(self, dataset: str, spec: Spec, path: Path | None = None):
+        self.dataset, self.spec = dataset, spec
+        self.path = path or STATS_DIR / f"{dataset}.json"
+        self.layout = [*spec.groups, *spec.columns]
+        self.totals: pd.DataFrame | None = None
+        self.reused = self.computed = 0
+
+    def _load(self) -> dict:
+        if not self.path.exists():
+            return {}
+        cached = json.loads(self.path.read_text(encoding="utf-8"))
+        return cached.get("periods", {}) if cached.get("layout") == self.layout else {}
+
+    def _save(self, periods: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"layout": self.layout, "periods": periods}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def compute(self, df: pd.DataFrame) -> pd.DataFrame:
+        # df: parsed measures; returns sum_<col> / count_<col> per group
+        groups, columns = list(self.spec.groups), list(self.spec.columns)
+        period = df[self.spec.period].astype("string").fillna("")
+        # order-independent fingerprint of each period (sum of the row hashes)
+        row_hash = pd.util.hash_pandas_object(df[[*groups, *columns]], index=False).astype("uint64")
+        hashes = {p: format(int(h), "x") for p, h in row_hash.groupby(period).sum().items()}
+
+        cached = self._load()
+        fresh = [p for p, h in hashes.items() if cached.get(p, {}).get("hash") != h]
+        if fresh:
+            rows = df[[*groups, *columns]].assign(_period=period.to_numpy())[period.isin(fresh).to_numpy()]
+            agg = rows.groupby([*groups, "_period"])[columns].agg(["sum", "count"])
+            agg.columns = [f"{stat}_{col}" for col, stat in agg.columns]
+            agg = agg.reset_index()
+            for p in fresh:
+                part = agg[agg["_period"] == p].drop(columns="_period")
+                cached[p] = {"hash": hashes[p], "rows": part.to_numpy().tolist()}
+        periods = {p: cached[p] for p in hashes}
+        self.computed, self.reused = len(fresh), len(hashes) - len(fresh)
+
+        names = [*groups, *(f"{stat}_{col}" for col in columns for stat in ("sum", "count"))]
+        parts = [pd.DataFrame(entry["rows"], columns=names) for entry in periods.values() if entry["rows"]]
+        partials = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=names)
+        self.totals = partials.groupby(groups)[names[len(groups):]].sum()
+        self._save(periods)
+        return self.totals
+
+    def means(self, df: pd.DataFrame, column: str) -> np.ndarray:
+        # mean of the group of every row of df (NaN for a group without values)
+        t = self.totals
+        mean = t[f"sum_{column}"] / t[f"count_{column}"].where(t[f"count_{column}"] > 0)
+        keys = df[list(self.spec.groups)]
+        index = pd.MultiIndex.from_frame(keys) if len(self.spec.groups) > 1 else pd.Index(keys.iloc[:, 0])
+        return mean.reindex(index).to_numpy(dtype="float64")
+
+
+# strategies: (values so far, frame, spec, stats, column) -> fill value of every row (NaN = none)
+def fill_group_mean(values: pd.Series, df: pd.DataFrame, spec: Spec, stats: GroupStats, column: str) -> np.ndarray:
+    return stats.means(df, column)
+
+
+def fill_median(values: pd.Series, df: pd.DataFrame, spec: Spec, stats: GroupStats, column: str) -> np.ndarray:
+    return df.groupby(list(spec.groups))[column].transform("median").to_numpy(dtype="float64")
+
+
+def fill_ffill_year(values: pd.Series, df: pd.DataFrame, spec: Spec, stats: GroupStats, column: str) -> np.ndarray:
+    order = df[[*spec.groups, spec.period]].assign(_v=values).sort_values(spec.period, kind="stable")
+    filled = order.groupby(list(spec.groups))["_v"].ffill()
+    return filled.reindex(df.index).to_numpy(dtype="float64")
+
+
+def fill_global_mean(values: pd.Series, df: pd.DataFrame, spec: Spec, stats: GroupStats, column: str) -> np.ndarray:
+    return np.full(len(values), values.mean())
+
+
+STRATEGIES = {
+    "group_mean": fill_group_mean,
+    "median": fill_median,
+    "ffill_year": fill_ffill_year,
+    "global_mean": fill_global_mean,
+}
+
+
+# strategies that only need the sum / count of each group: a streaming reader can
+# fill from its running accumulators instead of the rows (see economic_annual.py)
+ADDITIVE = ("group_mean", "global_mean")
+
+
+def additive(spec: Spec) -> bool:
+    return all(s in ADDITIVE for s in spec.strategies)
+
+
+def group_fills(obs_sum: pd.Series, obs_count: pd.Series, missing: pd.Series,
+                strategies: tuple[str, ...]) -> pd.Series:
+    # value impute() gives the missing cells of each group (index: the groups), from the
+    # sum / count of the reported values and the number of missing cells per group
+    fill = pd.Series(np.nan, index=obs_sum.index)
+    cur_sum, cur_count = obs_sum.astype("float64"), obs_count.astype("float64")
+    left = missing.astype("float64")
+    for name in strategies:
+        if name == "group_mean":
+            value = obs_sum / obs_count.where(obs_count > 0)
+        elif name == "global_mean":
+            # the mean of the column as filled so far
+            total = cur_count.sum()
+            value = pd.Series(cur_sum.sum() / total if total else np.nan, index=fill.index)
+        else:
+            raise ValueError(f"{name} needs every row, only {ADDITIVE} work from accumulators")
+        take = (left > 0) & value.notna()
+        fill[take] = value[take]
+        cur_sum = cur_sum + (left * value).where(take, 0)
+        cur_count = cur_count + left.where(take, 0)
+        left = left.where(~take, 0)
+    return fill
+
+
+def impute(df: pd.DataFrame, dataset: str, stats_path: Path | None = None) -> pd.DataFrame:
+    # the measures of the spec parsed, filled and rounded to Int64, plus the IMPUTED mask
+    spec = spec_for(dataset)
+    df = df.copy()
+    for column in spec.columns:
+        df[column] = parse_number(df[column])
+
+    needs_stats = "group_mean" in spec.strategies
+    stats = GroupStats(dataset, spec, stats_path)
+    if needs_stats:
+        stats.compute(df)
+        logger.info("[%s] group statistics: %d periods aggregated, %d from cache (%s)",
+                    dataset, stats.computed, stats.reused, stats.path)
+
+    mask = np.zeros(len(df), dtype=np.uint8)
+    for bit, column in enumerate(spec.columns):
+        values = df[column]
+        missing = values.isna().to_numpy()
+        filled_by = {}
+        for name in spec.strategies:
+            if not values.isna().any():
+                break
+            before = int(values.isna().sum())
+            values = values.fillna(pd.Series(STRATEGIES[name](values, df, spec, stats, column), index=df.index))
+            filled_by[name] = before - int(values.isna().sum())
+        mask |= (missing & values.notna().to_numpy()).astype(np.uint8) << bit
+        df[column] = values.round().astype("Int64")
+        logger.info("[%s] %s: %d of %d missing, filled %s", dataset, column, int(missing.sum()), len(df), filled_by)
+
+    df[MASK] = pd.array(mask, dtype=MASK_DTYPE)
+    return df
+
+
+def combine_masks(mask: pd.Series, codes: np.ndarray, n: int) -> pd.array:
+    # OR of the masks of the rows of each group (codes: groupby().ngroup(), -1 = no group)
+    out = np.zeros(n, dtype=np.uint8)
+    keep = codes >= 0
+    np.bitwise_or.at(out, codes[keep], mask.to_numpy(dtype=np.uint8)[keep])
+    return pd.array(out, dtype=MASK_DTYPE)
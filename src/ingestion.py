@@ -4,15 +4,16 @@ import pandas as pd
 import io
 import os
 from urllib.parse import urlparse
+from pathlib import Path
 from datetime import datetime
 
+import quarantine
+from log_setup import configure_logging, lazy
+
 # activate debug logging for detailed output, it is useful in development phase
+# (LOG_LEVEL=DEBUG, see log_setup.py)
 # Configure logging
-logging.basicConfig(
-    filename="./logs/ingestion.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+configure_logging("ingestion")
 
 urls = ["https://raw.githubusercontent.com/liliarte-1/data-engineering_course-project/refs/heads/main/data_retrieval_simulation/pobmun/death_causes_province.csv",
         "https://raw.githubusercontent.com/liliarte-1/data-engineering_course-project/refs/heads/main/data_retrieval_simulation/pobmun/economic_sector_province.csv",
@@ -36,15 +37,16 @@ urls = ["https://raw.githubusercontent.com/liliarte-1/data-engineering_course-pr
         ]
         
 
-logging.info(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 raw_dir = "data/raw"
-os.makedirs(raw_dir, exist_ok=True)
+
+# source name (file stem) -> url, so the orchestrator can fetch each one as its own step
+SOURCES = {Path(urlparse(url).path).stem: url for url in urls}
 
 
-for idx, url in enumerate(urls):
+def fetch(url: str) -> bool:
     try:
         # log the URL being fetched
-        logging.info(f"[{idx+1}/{len(urls)}] Fetching: {url}")
+        logging.info(f"Fetching: {url}")
 
         response = requests.get(url)
         response.raise_for_status()
@@ -54,7 +56,20 @@ for idx, url in enumerate(urls):
         # df = pd.read_csv(io.StringIO(response.text),sep=',',on_bad_lines='skip')
 
         # so we do this instead
-        df = pd.read_csv(io.StringIO(response.text), sep=";", on_bad_lines="warn")
+        # the lines on_bad_lines would drop (more fields than the header) are
+        # quarantined with their byte offset and line number, see quarantine.py
+        source = Path(urlparse(url).path).stem
+        encoding = response.encoding or response.apparent_encoding
+        good, bad_lines = quarantine.split_bad_lines(response.content, sep=";", encoding=encoding)
+        for bad in bad_lines:
+            logging.warning(f"Bad line {bad.line} of {source} (byte {bad.offset}, {bad.reason}), quarantined")
+        quarantine.save(source, "ingestion", url, bad_lines, header_lines=1, data=response.content,
+                        sep=";", encoding=encoding)
+
+        # everything as text: the raw file keeps the values as published ("08", "2.467"),
+        # the types are declared in schemas.py and parsed by transformation.py
+        df = pd.read_csv(io.StringIO(good.decode(encoding, errors="replace")), sep=";", on_bad_lines="warn",
+                         dtype=str, keep_default_na=False)
 
         # extract file name from URL
         file_name = os.path.basename(urlparse(url).path)
@@ -70,8 +85,9 @@ for idx, url in enumerate(urls):
 
          # INITIAL DATA EXPLORATION
         logging.info(f"Dataset Shape: {df.shape}")
-        logging.debug(f"Column Names & Types:\n{df.dtypes}")
-        logging.info(f"Total Missing: {df.isnull().sum().sum()}")
+        logging.debug("Column Names & Types:\n%s", lazy(lambda: df.dtypes))
+        logging.info("Total Missing: %s", lazy(lambda: df.isnull().sum().sum()))
+        return True
 
     # handle network errors and parsing errors
     except requests.RequestException as exc:
@@ -80,6 +96,32 @@ for idx, url in enumerate(urls):
     except pd.errors.ParserError as exc:
         logging.error(f"Failed to parse CSV from {url}: {exc}")
 
-       
-logging.info(f"Finished at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    return False
+
+
+def main(names: list[str] | None = None) -> int:
+    names = names or list(SOURCES)
+    unknown = set(names) - set(SOURCES)
+    if unknown:
+        raise ValueError(f"Unknown sources: {sorted(unknown)}")
+
+    logging.info(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    os.makedirs(raw_dir, exist_ok=True)
+
+    failed = []
+    for idx, name in enumerate(names):
+        logging.info(f"[{idx+1}/{len(names)}] Source: {name}")
+        if not fetch(SOURCES[name]):
+            failed.append(name)
+
+    logging.info(f"Finished at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    if failed:
+        logging.error(f"Failed sources: {failed}")
+        return 1
+    return 0
+
 
+if __name__ == "__main__":
+    # python src/ingestion.py [pobmun2008 economic_sector_province ...] (default: all)
+    import sys
+    raise SystemExit(main(sys.argv[1:] or None))
@@ -0,0 +1,149 @@
+# REFERENTIAL INTEGRITY PRE-CHECK
+# load_dw checks every table it is about to insert against the PRIMARY KEY /
+# UNIQUE and FOREIGN KEY constraints of warehouse/schema.sql before the
+# warehouse connection is opened:
+# - keys referencing a dim are semi-joined with the keys of that dim
+#   (Index.isin: one hash lookup per row, a column or a tuple of columns)
+# - primary / unique keys are checked with duplicated()
+# so an orphan that SQL Server would only reject deep into a batch is found
+# in milliseconds, on the whole table at once.
+#
+# DW_RI_POLICY=quarantine (default): the offending rows are written to
+#   data/rejects/dw.<table>.precheck.csv with the broken constraint, the rest is loaded
+# DW_RI_POLICY=fail: the load stops with IntegrityError, nothing is sent
+#
+# The dims come from the dim cache (dim_cache.py): a fact step that runs on
+# its own is checked against the members the warehouse has.
+
+from __future__ import annotations
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from batch_loader import REJECTS_DIR
+
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("quarantine", "fail")
+
+# table -> keys that must be unique (PRIMARY KEY first, then UNIQUE)
+UNIQUE_KEYS = {
+    "dim_autonomy": [["CODAUTO"]],
+    "dim_province": [["CPRO"]],
+    "dim_time": [["YEAR"]],
+    "dim_sex": [["SEX_ID"], ["SEX"]],
+    "dim_death_cause": [["DEATH_CAUSE_ID"], ["DEATH_CAUSE_CODE"]],
+    "dim_economic_sector": [["ECONOMIC_SECTOR_ID"], ["ECONOMIC_SECTOR"]],
+    "dim_municipality": [["CPRO", "MUN_NUMBER"]],
+    "fact_deaths": [["CPRO", "YEAR", "SEX_ID", "DEATH_CAUSE_ID"]],
+    "fact_economic_sector": [["CPRO", "YEAR", "ECONOMIC_SECTOR_ID"]],
+    "fact_population_municipality": [["CPRO", "MUN_NUMBER", "YEAR"]],
+    "agg_population_province_year": [["CPRO", "YEAR"]],
+    "agg_population_autonomy_year": [["CODAUTO", "YEAR"]],
+    "agg_economic_sector_autonomy_year": [["CODAUTO", "YEAR", "ECONOMIC_SECTOR_ID"]],
+    "agg_deaths_autonomy_year": [["CODAUTO", "YEAR", "SEX_ID", "DEATH_CAUSE_ID"]],
+}
+
+# table -> [(columns, dim, dim columns)]
+FOREIGN_KEYS = {
+    "dim_province": [(["CODAUTO"], "dim_autonomy", ["CODAUTO"])],
+    "dim_municipality": [(["CPRO"], "dim_province", ["CPRO"])],
+    "fact_deaths": [
+        (["CPRO"], "dim_province", ["CPRO"]),
+        (["YEAR"], "dim_time", ["YEAR"]),
+        (["SEX_ID"], "dim_sex", ["SEX_ID"]),
+        (["DEATH_CAUSE_ID"], "dim_death_cause", ["DEATH_CAUSE_ID"]),
+    ],
+    "fact_economic_sector": [
+        (["CPRO"], "dim_province", ["CPRO"]),
+        (["YEAR"], "dim_time", ["YEAR"]),
+        (["ECONOMIC_SECTOR_ID"], "dim_economic_sector", ["ECONOMIC_SECTOR_ID"]),
+    ],
+    "fact_population_municipality": [
+        (["CPRO", "MUN_NUMBER"], "dim_municipality", ["CPRO", "MUN_NUMBER"]),
+        (["YEAR"], "dim_time", ["YEAR"]),
+    ],
+    "agg_population_province_year": [
+        (["CPRO"], "dim_province", ["CPRO"]),
+        (["YEAR"], "dim_time", ["YEAR"]),
+    ],
+    "agg_population_autonomy_year": [
+        (["CODAUTO"], "dim_autonomy", ["CODAUTO"]),
+        (["YEAR"], "dim_time", ["YEAR"]),
+    ],
+    "agg_economic_sector_autonomy_year": [
+        (["CODAUTO"], "dim_autonomy", ["CODAUTO"]),
+        (["YEAR"], "dim_time", ["YEAR"]),
+        (["ECONOMIC_SECTOR_ID"], "dim_economic_sector", ["ECONOMIC_SECTOR_ID"]),
+    ],
+    "agg_deaths_autonomy_year": [
+        (["CODAUTO"], "dim_autonomy", ["CODAUTO"]),
+        (["YEAR"], "dim_time", ["YEAR"]),
+        (["SEX_ID"], "dim_sex", ["SEX_ID"]),
+        (["DEATH_CAUSE_ID"], "dim_death_cause", ["DEATH_CAUSE_ID"]),
+    ],
+}
+
+
+class IntegrityError(ValueError):
+    pass
+
+
+def key_index(df: pd.DataFrame, cols: list[str]) -> pd.Index:
+    if len(cols) == 1:
+        return pd.Index(df[cols[0]])
+    return pd.MultiIndex.from_frame(df[cols])
+
+
+def violations(table: str, df: pd.DataFrame, dims: dict[str, pd.DataFrame]) -> pd.Series:
+    # broken constraint per row (the first one found), <NA> for the rows that are fine
+    reasons = pd.Series(pd.NA, index=df.index, dtype="object")
+
+    for cols in UNIQUE_KEYS.get(table, []):
+        dup = df.duplicated(subset=cols, keep="first").to_numpy()
+        reasons = reasons.mask(dup & reasons.isna().to_numpy(), f"duplicate key ({', '.join(cols)})")
+
+    for cols, dim, dim_cols in FOREIGN_KEYS.get(table, []):
+        if dims.get(dim) is None:
+            logger.warning("[%s] %s not available, foreign key (%s) not checked", table, dim, ", ".join(cols))
+            continue
+        orphan = ~key_index(df, cols).isin(key_index(dims[dim], dim_cols))
+        reasons = reasons.mask(orphan & reasons.isna().to_numpy(), f"({', '.join(cols)}) not in {dim}")
+
+    return reasons
+
+
+def rejects_path(table: str, part: str | None = None) -> Path:
+    return REJECTS_DIR / f"dw.{table}{'.' + part if part else ''}.precheck.csv"
+
+
+def check(table: str, df: pd.DataFrame, dims: dict[str, pd.DataFrame], part: str | None = None) -> pd.DataFrame:
+    # df without the rows that break a constraint (quarantined), or IntegrityError (fail)
+    policy = os.getenv("DW_RI_POLICY", "quarantine").lower()
+    if policy not in POLICIES:
+        raise ValueError(f"DW_RI_POLICY must be one of {POLICIES}, got {policy!r}")
+
+    reasons = violations(table, df, dims)
+    bad = reasons.notna().to_numpy()
+    path = rejects_path(table, part)
+    if not bad.any():
+        path.unlink(missing_ok=True)  # the file always describes the last load of the table
+        return df
+
+    counts = reasons[bad].value_counts().to_dict()
+    offenders = df[bad].assign(REASON=reasons[bad])
+    if policy == "fail":
+        raise IntegrityError(
+            f"[{table}] {int(bad.sum())} of {len(df)} rows break the warehouse constraints {counts}, "
+            f"first ones: {offenders.head(5).to_dict('records')}"
+        )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    offenders.to_csv(path, index=False)
+    logger.warning("[%s] %d of %d rows quarantined before the load %s -> %s",
+                   table, int(bad.sum()), len(df), counts, path)
+    return df[~bad]
+
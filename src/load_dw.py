@@ -1,27 +1,29 @@
 from __future__ import annotations
-import os
 import sys
 import time
 from pathlib import Path
 import pandas as pd
-import pyodbc
 import logging
 
-# logging 
-Path("./logs").mkdir(parents=True, exist_ok=True)
+import aggregates
+import integrity
+from batch_loader import AdaptiveBatcher, BATCH_SIZE_INITIAL
+from dim_cache import CACHE_PATH, DimCache
+from load_journal import LoadJournal, clear_journal, rows_key
+from log_setup import configure_logging
+from run_history import record_rows
+from sampling import data_dir
+from schemas import STAGED, read_csv
+from surrogate_keys import assign_keys, load_key_map, save_key_map
+from warehouse_backend import WarmConnection, get_backend
 
-logging.basicConfig(
-    filename="./logs/load_dw.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# logging 
+configure_logging("load_dw")
 logger = logging.getLogger(__name__)
 
 
 # csv
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
-
-DATA_DIR = PROJECT_ROOT / "data" / "staging"
+DATA_DIR = data_dir("staging")
 CSV_CODAUTO = DATA_DIR / "codauto_cpro_transformed.csv"
 CSV_DEATH  = DATA_DIR / "death_causes_province_transformed.csv"
 CSV_SECTOR = DATA_DIR / "economic_sector_province_transformed.csv"
@@ -29,22 +31,8 @@ CSV_POB    = DATA_DIR / "pobmun_combined_transformed.csv"
 CLEAR_BEFORE_LOAD = True  # True = IMPORTANT, CLEAR AND RELOADS BEFORE ADDING NEW DATA
 
 
-# CONFIG: connection (Azure SQL)
-SERVER   = os.getenv("AZURE_SQL_SERVER",   "srv-dw-liliarte-01.database.windows.net")
-DATABASE = os.getenv("AZURE_SQL_DATABASE", "dw_final_project")
-USERNAME = os.getenv("AZURE_SQL_USERNAME", "dwadmin")
-PASSWORD = os.getenv("AZURE_SQL_PASSWORD", "usj2526.")
-DRIVER = ("ODBC Driver 18 for SQL Server")
-
-CONNECTION = (
-    f"DRIVER={{{DRIVER}}};"
-    f"SERVER={SERVER};"
-    f"DATABASE={DATABASE};"
-    f"UID={USERNAME};"
-    f"PWD={PASSWORD};"
-    "Encrypt=yes;"
-    "TrustServerCertificate=no;"
-)
+# CONFIG: warehouse backend (DW_BACKEND=azure|sqlite, see warehouse_backend.py)
+BACKEND = get_backend()
 
 
 
@@ -59,24 +47,34 @@ def clean_str(s: pd.Series) -> pd.Series:
     return s.astype("string").str.strip().fillna("")
 
 
-def to_int_series(s: pd.Series) -> pd.Series:
-    return pd.to_numeric(s, errors="coerce").astype("Int64")
+def run_batches(cursor, sql: str, rows: list[tuple], batch_size: int = BATCH_SIZE_INITIAL,
+                journal: LoadJournal | None = None, start: int = 0, part: str | None = None) -> AdaptiveBatcher:
+    # adaptive batches committed one by one, bad rows are isolated to data/rejects/
+    # (part: suffix of the reject file); the batcher tells what was loaded and rejected
+    batcher = AdaptiveBatcher(cursor, sql, batch_size=batch_size, journal=journal, part=part)
+    if start < len(rows):
+        batcher.run(rows, start=start)
+    return batcher
 
 
-def chunked(seq, size: int):
-    for i in range(0, len(seq), size):
-        yield seq[i:i+size]
+def exec_many(cursor, sql: str, rows: list[tuple], batch_size: int = BATCH_SIZE_INITIAL,
+              journal: LoadJournal | None = None, start: int = 0, part: str | None = None) -> int:
+    return run_batches(cursor, sql, rows, batch_size, journal, start, part).loaded
 
 
-def exec_many(cursor, sql: str, rows: list[tuple], batch_size: int = 5000) -> None:
-    if not rows:
-        return
-    cursor.fast_executemany = True
-    for batch in chunked(rows, batch_size):
-        cursor.executemany(sql, batch)
+def rejected_rows(df: pd.DataFrame, batcher: AdaptiveBatcher) -> pd.DataFrame:
+    # the rows of df (in the order they were sent) the batcher rejected
+    return df.iloc[sorted(batcher.rejected_at)]
 
 
 def clear_tables(cursor) -> None:
+    # Journal (nothing is loaded anymore)
+    clear_journal(cursor)
+
+    # Aggregates
+    for table in AGG_INSERTS:
+        cursor.execute(f"DELETE FROM dw.{table};")
+
     # Facts
     cursor.execute("DELETE FROM dw.fact_population_municipality;")
     cursor.execute("DELETE FROM dw.fact_economic_sector;")
@@ -92,55 +90,160 @@ def clear_tables(cursor) -> None:
     cursor.execute("DELETE FROM dw.dim_autonomy;")
 
 
-# MAIN
-def main() -> int:
-    start_ts = time.time()
-    logger.info("==== load_dw START ====")
+# aggregates (built by aggregates.py): table -> (INSERT, columns in order)
+AGG_INSERTS = {
+    "agg_population_province_year": (
+        "INSERT INTO dw.agg_population_province_year "
+        "(CPRO, [YEAR], POPULATION_TOTAL, MALE_TOTAL, FEMALE_TOTAL, MUNICIPALITIES, SEX_RATIO, POPULATION_YOY_PCT) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+        ["CPRO", "YEAR", "POPULATION_TOTAL", "MALE_TOTAL", "FEMALE_TOTAL", "MUNICIPALITIES", "SEX_RATIO", "POPULATION_YOY_PCT"],
+    ),
+    "agg_population_autonomy_year": (
+        "INSERT INTO dw.agg_population_autonomy_year "
+        "(CODAUTO, [YEAR], POPULATION_TOTAL, MALE_TOTAL, FEMALE_TOTAL, MUNICIPALITIES, SEX_RATIO, POPULATION_YOY_PCT) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+        ["CODAUTO", "YEAR", "POPULATION_TOTAL", "MALE_TOTAL", "FEMALE_TOTAL", "MUNICIPALITIES", "SEX_RATIO", "POPULATION_YOY_PCT"],
+    ),
+    "agg_economic_sector_autonomy_year": (
+        "INSERT INTO dw.agg_economic_sector_autonomy_year "
+        "(CODAUTO, [YEAR], ECONOMIC_SECTOR_ID, AVG_VALUE, PROVINCES) VALUES (?, ?, ?, ?, ?);",
+        ["CODAUTO", "YEAR", "ECONOMIC_SECTOR_ID", "AVG_VALUE", "PROVINCES"],
+    ),
+    "agg_deaths_autonomy_year": (
+        "INSERT INTO dw.agg_deaths_autonomy_year "
+        "(CODAUTO, [YEAR], SEX_ID, DEATH_CAUSE_ID, TOTAL_DEATHS) VALUES (?, ?, ?, ?, ?);",
+        ["CODAUTO", "YEAR", "SEX_ID", "DEATH_CAUSE_ID", "TOTAL_DEATHS"],
+    ),
+}
+# journal key of an aggregate load: one entry per table once it is in the warehouse
+AGG_JOURNAL_KEY = "aggregates"
+
+
+def to_param(v):
+    # pandas/numpy scalars -> plain python for the driver, NaN/NA -> NULL
+    if pd.isna(v):
+        return None
+    return v.item() if hasattr(v, "item") else v
+
+
+def read_aggregates(dims: DimCache) -> dict[str, pd.DataFrame]:
+    # every aggregate row: which years are replaced is only known with the
+    # connection (load_aggregates), the tables are a few thousand rows anyway
+    tables: dict[str, pd.DataFrame] = {}
+
+    for table in AGG_INSERTS:
+        path = aggregates.agg_path(table)
+        if not path.exists():
+            logger.warning("Aggregate %s not found, run aggregates.py first", path)
+            continue
+
+        df = read_csv(STAGED[table], path)
+        if "SEX" in df.columns:
+            df["SEX_ID"] = dims.ids("dim_sex", df["SEX"])
+        if "DEATH_CAUSE_CODE" in df.columns:
+            df["DEATH_CAUSE_ID"] = dims.ids("dim_death_cause", df["DEATH_CAUSE_CODE"])
+        if "ECONOMIC_SECTOR" in df.columns:
+            df["ECONOMIC_SECTOR_ID"] = dims.ids("dim_economic_sector", df["ECONOMIC_SECTOR"])
+        tables[table] = df
+
+    return tables
+
+
+def load_aggregates(cn, cursor, tables: dict[str, pd.DataFrame]) -> None:
+    # a table the journal has no load of (first load, after clear_tables or --restart,
+    # another warehouse) is replaced in full, otherwise only the years aggregates.py
+    # refreshed since its last load
+    state = aggregates.load_state()
+    pending = state.get("pending_years", {})
+
+    for table, df in tables.items():
+        sql, cols = AGG_INSERTS[table]
+        journal = LoadJournal(table, AGG_JOURNAL_KEY)
+        years = pending.get(table) if journal.committed(cursor) > 0 else "all"
+        if not years:
+            logger.info("Aggregate %s up to date, skipped", table)
+            continue
+
+        if years == "all":
+            cursor.execute(f"DELETE FROM dw.{table};")
+        else:
+            marks = ", ".join("?" * len(years))
+            cursor.execute(f"DELETE FROM dw.{table} WHERE [YEAR] IN ({marks});", [int(y) for y in years])
+            df = df[df["YEAR"].isin(years)]
+        cn.commit()
+
+        rows = [tuple(to_param(v) for v in r) for r in df[cols].itertuples(index=False, name=None)]
+        n = exec_many(cursor, sql, rows)
+        clear_journal(cursor, table)
+        journal.record(cursor, 0, max(n, 1), n)
+        cn.commit()
+        logger.info("Inserted %s: %d rows (%s)", table, n, "all years" if years == "all" else f"years {years}")
+        pending.pop(table, None)
+
+    state["pending_years"] = pending
+    aggregates.save_state(state)
+
+
+# READ + NORMALIZE
+# staging columns used by the load (CPRO_NAME of the facts is not loaded)
+STAGING_COLS = {
+    "codauto": ["CODAUTO", "CODAUTO_NAME", "CPRO", "CPRO_NAME"],
+    "deaths": ["CPRO", "YEAR", "TOTAL", "SEX", "DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME"],
+    "sector": ["CPRO", "YEAR", "TOTAL", "ECONOMIC_SECTOR"],
+    "pobmun": ["CPRO", "MUN_NUMBER", "MUN_NAME", "YEAR", "POBLATION", "MALE", "FEMALE"],
+}
+# the subset build_dims needs from the fact sources
+DIM_COLS = {
+    "deaths": ["YEAR", "SEX", "DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME"],
+    "sector": ["YEAR", "ECONOMIC_SECTOR"],
+    "pobmun": ["CPRO", "MUN_NUMBER", "MUN_NAME", "YEAR"],
+}
+
+
+def read_staging(names: set[str], paths: dict[str, Path] | None = None,
+                 columns: dict[str, list[str]] | None = None) -> dict[str, pd.DataFrame]:
+    # names: subset of {"codauto", "deaths", "sector", "pobmun"}; paths / columns override
+    # the staging files / STAGING_COLS
+    columns = {**STAGING_COLS, **(columns or {})}
+    paths = {"codauto": CSV_CODAUTO, "deaths": CSV_DEATH, "sector": CSV_SECTOR, "pobmun": CSV_POB, **(paths or {})}
+    data: dict[str, pd.DataFrame] = {}
 
     # validate CSV files exist
-    for f in (CSV_CODAUTO, CSV_DEATH, CSV_SECTOR, CSV_POB):
-        logger.info(f"Checking input file exists: {f}")
-        require_file(f)
-
-    # read CSVs
-    logger.info("Reading CSVs from staging...")
-    df_cod = pd.read_csv(CSV_CODAUTO)
-    df_dea = pd.read_csv(CSV_DEATH)
-    df_sec = pd.read_csv(CSV_SECTOR)
-    df_pob = pd.read_csv(CSV_POB)
-    logger.info(
-        f"Rows read -> codauto:{len(df_cod)} deaths:{len(df_dea)} sector:{len(df_sec)} pob:{len(df_pob)}"
+    for name in sorted(names):
+        logger.info(f"Checking input file exists: {paths[name]}")
+        require_file(paths[name])
+
+    # read CSVs (typed by the schema, only the columns the dims and facts use)
+    logger.info("Reading CSVs from staging: %s", sorted(names))
+    for name in sorted(names):
+        data[name] = read_csv(STAGED[name], paths[name], usecols=columns[name])
+    logger.info("Rows read -> %s", {k: len(v) for k, v in data.items()})
+
+    # clean strings (the numbers already come as Int64 / float64)
+    logger.info("Cleaning strings...")
+    for name, df in data.items():
+        for c in df.columns:
+            if STAGED[name].columns[c] == "string":
+                df[c] = clean_str(df[c])
+
+    return data
+
+
+# DIMS
+def build_dim_municipality(df_pob: pd.DataFrame) -> pd.DataFrame:
+    return (
+        df_pob[["CPRO", "MUN_NUMBER", "MUN_NAME"]]
+        .dropna(subset=["CPRO", "MUN_NUMBER"])
+        .drop_duplicates(subset=["CPRO", "MUN_NUMBER"])
+        .sort_values(["CPRO", "MUN_NUMBER"])
     )
 
-    # normalice data types and clean strings
-    logger.info("Normalizing dtypes and cleaning strings...")
-    df_cod["CODAUTO"] = to_int_series(df_cod["CODAUTO"])
-    df_cod["CPRO"] = to_int_series(df_cod["CPRO"])
-    df_cod["CODAUTO_NAME"] = clean_str(df_cod["CODAUTO_NAME"])
-    df_cod["CPRO_NAME"] = clean_str(df_cod["CPRO_NAME"])
-
-    df_dea["CPRO"] = to_int_series(df_dea["CPRO"])
-    df_dea["YEAR"] = to_int_series(df_dea["YEAR"])
-    df_dea["TOTAL"] = to_int_series(df_dea["TOTAL"])
-    df_dea["SEX"] = clean_str(df_dea["SEX"])
-    df_dea["DEATH_CAUSE_CODE"] = clean_str(df_dea["DEATH_CAUSE_CODE"])
-    df_dea["DEATH_CAUSE_NAME"] = clean_str(df_dea["DEATH_CAUSE_NAME"])
-
-    df_sec["CPRO"] = to_int_series(df_sec["CPRO"])
-    df_sec["YEAR"] = to_int_series(df_sec["YEAR"])
-    df_sec["TOTAL"] = pd.to_numeric(df_sec["TOTAL"], errors="coerce")
-    df_sec["ECONOMIC_SECTOR"] = clean_str(df_sec["ECONOMIC_SECTOR"])
-
-    df_pob["CPRO"] = to_int_series(df_pob["CPRO"])
-    df_pob["MUN_NUMBER"] = to_int_series(df_pob["MUN_NUMBER"])
-    df_pob["YEAR"] = to_int_series(df_pob["YEAR"])
-    df_pob["POBLATION"] = to_int_series(df_pob["POBLATION"])
-    df_pob["MALE"] = to_int_series(df_pob["MALE"])
-    df_pob["FEMALE"] = to_int_series(df_pob["FEMALE"])
-    df_pob["MUN_NAME"] = clean_str(df_pob["MUN_NAME"])
-
-    # dims
+
+def build_dims(data: dict[str, pd.DataFrame], key_map: dict, municipality: bool = True) -> dict[str, pd.DataFrame]:
+    # municipality=False: data["pobmun"] only needs YEAR (sharded.py loads dim_municipality per shard)
     logger.info("Building dimensions...")
+    df_cod, df_dea, df_sec, df_pob = data["codauto"], data["deaths"], data["sector"], data["pobmun"]
+
     dim_autonomy = (
         df_cod[["CODAUTO", "CODAUTO_NAME"]]
         .dropna(subset=["CODAUTO"])
@@ -172,178 +275,409 @@ def main() -> int:
 
     dim_economic_sector = df_sec[["ECONOMIC_SECTOR"]].drop_duplicates().sort_values("ECONOMIC_SECTOR")
 
-    dim_municipality = (
-        df_pob[["CPRO", "MUN_NUMBER", "MUN_NAME"]]
-        .dropna(subset=["CPRO", "MUN_NUMBER"])
-        .drop_duplicates(subset=["CPRO", "MUN_NUMBER"])
-        .sort_values(["CPRO", "MUN_NUMBER"])
-    )
+    dim_municipality = build_dim_municipality(df_pob) if municipality else None
 
-    logger.info(
-        "Dim sizes -> autonomy:%d province:%d time:%d sex:%d death_cause:%d econ_sector:%d municipality:%d",
-        len(dim_autonomy), len(dim_province), len(dim_time), len(dim_sex),
-        len(dim_death_cause), len(dim_economic_sector), len(dim_municipality)
-    )
-
-    # facts
-    logger.info("Building facts...")
-    fact_deaths = (
-        df_dea[["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE", "TOTAL"]]
-        .dropna(subset=["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE", "TOTAL"])
-        .rename(columns={"TOTAL": "TOTAL_DEATHS"})
-    )
-
-    fact_economic_sector = (
-        df_sec[["CPRO", "YEAR", "ECONOMIC_SECTOR", "TOTAL"]]
-        .dropna(subset=["CPRO", "YEAR", "ECONOMIC_SECTOR", "TOTAL"])
-        .rename(columns={"TOTAL": "TOTAL_VALUE"})
-    )
-
-    fact_population = (
-        df_pob[["CPRO", "MUN_NUMBER", "YEAR", "POBLATION", "MALE", "FEMALE"]]
-        .dropna(subset=["CPRO", "MUN_NUMBER", "YEAR", "POBLATION", "MALE", "FEMALE"])
-        .rename(columns={
-            "POBLATION": "POPULATION_TOTAL",
-            "MALE": "MALE_TOTAL",
-            "FEMALE": "FEMALE_TOTAL",
-        })
-    )
-
-    # duplicates check
-    dup_count = fact_population.duplicated(subset=["CPRO", "MUN_NUMBER", "YEAR"]).sum()
-    if dup_count > 0:
-        logger.warning(
-            "Population: %d duplicates detected by (CPRO, MUN_NUMBER, YEAR). Aggregating using MAX.",
-            int(dup_count)
-        )
-
-    fact_population = (
-        fact_population
-        .groupby(["CPRO", "MUN_NUMBER", "YEAR"], as_index=False)
-        .agg({
-            "POPULATION_TOTAL": "max",
-            "MALE_TOTAL": "max",
-            "FEMALE_TOTAL": "max",
-        })
+    # integer surrogate keys for the string-keyed dims (stable across runs)
+    dim_sex["SEX_ID"] = assign_keys(key_map, "dim_sex", dim_sex["SEX"])
+    dim_death_cause["DEATH_CAUSE_ID"] = assign_keys(key_map, "dim_death_cause", dim_death_cause["DEATH_CAUSE_CODE"])
+    dim_economic_sector["ECONOMIC_SECTOR_ID"] = assign_keys(
+        key_map, "dim_economic_sector", dim_economic_sector["ECONOMIC_SECTOR"]
     )
+    save_key_map(key_map)
 
     logger.info(
-        "Fact sizes -> deaths:%d sector:%d population:%d",
-        len(fact_deaths), len(fact_economic_sector), len(fact_population)
+        "Dim sizes -> autonomy:%d province:%d time:%d sex:%d death_cause:%d econ_sector:%d municipality:%s",
+        len(dim_autonomy), len(dim_province), len(dim_time), len(dim_sex),
+        len(dim_death_cause), len(dim_economic_sector),
+        len(dim_municipality) if municipality else "per shard"
     )
 
-    # charge data warehouse
-    logger.info(f"Connecting to SQL Server with driver: {DRIVER}")
-    cn = pyodbc.connect(CONNECTION)
-    cn.autocommit = False
-
-    try:
-        cur = cn.cursor()
-
-        if CLEAR_BEFORE_LOAD:
-            logger.info("Clearing tables (facts -> dims)...")
-            clear_tables(cur)
-            cn.commit()
-            logger.info("Tables cleared and committed")
-
-        # insert dims
-        logger.info("Inserting dimensions...")
-
-        exec_many(
-            cur,
-            "INSERT INTO dw.dim_autonomy (CODAUTO, CODAUTO_NAME) VALUES (?, ?);",
-            [(int(r.CODAUTO), str(r.CODAUTO_NAME)) for r in dim_autonomy.itertuples(index=False)]
+    dims = {
+        "dim_autonomy": dim_autonomy,
+        "dim_province": dim_province,
+        "dim_time": dim_time,
+        "dim_sex": dim_sex,
+        "dim_death_cause": dim_death_cause,
+        "dim_economic_sector": dim_economic_sector,
+    }
+    if municipality:
+        dims["dim_municipality"] = dim_municipality
+    return dims
+
+
+# FACTS
+def build_fact(name: str, data: dict[str, pd.DataFrame], dims: DimCache | None) -> pd.DataFrame:
+    # dims: surrogate ids of the loaded dims (not needed by fact_population_municipality)
+    logger.info("Building %s...", name)
+
+    if name == "fact_deaths":
+        df_dea = data["deaths"]
+        # facts carry the surrogate ids, not the strings
+        df_dea["SEX_ID"] = dims.ids("dim_sex", df_dea["SEX"])
+        df_dea["DEATH_CAUSE_ID"] = dims.ids("dim_death_cause", df_dea["DEATH_CAUSE_CODE"])
+        # a code without id is not dropped here: the pre-check reports it as an orphan
+        return (
+            df_dea.dropna(subset=["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE", "TOTAL"])
+            [["CPRO", "YEAR", "SEX_ID", "DEATH_CAUSE_ID", "TOTAL"]]
+            .rename(columns={"TOTAL": "TOTAL_DEATHS"})
         )
-        logger.info("Inserted dim_autonomy: %d rows", len(dim_autonomy))
 
-        exec_many(
-            cur,
-            "INSERT INTO dw.dim_province (CPRO, CODAUTO, CPRO_NAME) VALUES (?, ?, ?);",
-            [(int(r.CPRO), int(r.CODAUTO), str(r.CPRO_NAME)) for r in dim_province.itertuples(index=False)]
+    if name == "fact_economic_sector":
+        df_sec = data["sector"]
+        df_sec["ECONOMIC_SECTOR_ID"] = dims.ids("dim_economic_sector", df_sec["ECONOMIC_SECTOR"])
+        return (
+            df_sec.dropna(subset=["CPRO", "YEAR", "ECONOMIC_SECTOR", "TOTAL"])
+            [["CPRO", "YEAR", "ECONOMIC_SECTOR_ID", "TOTAL"]]
+            .rename(columns={"TOTAL": "TOTAL_VALUE"})
         )
-        logger.info("Inserted dim_province: %d rows", len(dim_province))
 
-        exec_many(
-            cur,
-            "INSERT INTO dw.dim_time ([YEAR]) VALUES (?);",
-            [(int(r.YEAR),) for r in dim_time.itertuples(index=False)]
+    if name == "fact_population_municipality":
+        fact_population = (
+            data["pobmun"][["CPRO", "MUN_NUMBER", "YEAR", "POBLATION", "MALE", "FEMALE"]]
+            .dropna(subset=["CPRO", "MUN_NUMBER", "YEAR", "POBLATION", "MALE", "FEMALE"])
+            .rename(columns={
+                "POBLATION": "POPULATION_TOTAL",
+                "MALE": "MALE_TOTAL",
+                "FEMALE": "FEMALE_TOTAL",
+            })
         )
-        logger.info("Inserted dim_time: %d rows", len(dim_time))
 
-        exec_many(
-            cur,
-            "INSERT INTO dw.dim_sex (SEX) VALUES (?);",
-            [(str(r.SEX),) for r in dim_sex.itertuples(index=False)]
+        # duplicates check
+        dup_count = fact_population.duplicated(subset=["CPRO", "MUN_NUMBER", "YEAR"]).sum()
+        if dup_count > 0:
+            logger.warning(
+                "Population: %d duplicates detected by (CPRO, MUN_NUMBER, YEAR). Aggregating using MAX.",
+                int(dup_count)
+            )
+
+        return (
+            fact_population
+            .groupby(["CPRO", "MUN_NUMBER", "YEAR"], as_index=False)
+            .agg({
+                "POPULATION_TOTAL": "max",
+                "MALE_TOTAL": "max",
+                "FEMALE_TOTAL": "max",
+            })
         )
-        logger.info("Inserted dim_sex: %d rows", len(dim_sex))
-
-        exec_many(
-            cur,
-            "INSERT INTO dw.dim_death_cause (DEATH_CAUSE_CODE, DEATH_CAUSE_NAME) VALUES (?, ?);",
-            [(str(r.DEATH_CAUSE_CODE), str(r.DEATH_CAUSE_NAME)) for r in dim_death_cause.itertuples(index=False)]
-        )
-        logger.info("Inserted dim_death_cause: %d rows", len(dim_death_cause))
-
-        exec_many(
-            cur,
-            "INSERT INTO dw.dim_economic_sector (ECONOMIC_SECTOR) VALUES (?);",
-            [(str(r.ECONOMIC_SECTOR),) for r in dim_economic_sector.itertuples(index=False)]
-        )
-        logger.info("Inserted dim_economic_sector: %d rows", len(dim_economic_sector))
-
-        exec_many(
-            cur,
-            "INSERT INTO dw.dim_municipality (CPRO, MUN_NUMBER, MUN_NAME) VALUES (?, ?, ?);",
-            [(int(r.CPRO), int(r.MUN_NUMBER), str(r.MUN_NAME)) for r in dim_municipality.itertuples(index=False)]
-        )
-        logger.info("Inserted dim_municipality: %d rows", len(dim_municipality))
 
+    raise ValueError(f"Unknown fact table: {name}")
+
+
+# INSERTS: table -> (SQL, row builder)
+INSERTS = {
+    "dim_autonomy": (
+        "INSERT INTO dw.dim_autonomy (CODAUTO, CODAUTO_NAME) VALUES (?, ?);",
+        lambda df: [(int(r.CODAUTO), str(r.CODAUTO_NAME)) for r in df.itertuples(index=False)],
+    ),
+    "dim_province": (
+        "INSERT INTO dw.dim_province (CPRO, CODAUTO, CPRO_NAME) VALUES (?, ?, ?);",
+        lambda df: [(int(r.CPRO), int(r.CODAUTO), str(r.CPRO_NAME)) for r in df.itertuples(index=False)],
+    ),
+    "dim_time": (
+        "INSERT INTO dw.dim_time ([YEAR]) VALUES (?);",
+        lambda df: [(int(r.YEAR),) for r in df.itertuples(index=False)],
+    ),
+    "dim_sex": (
+        "INSERT INTO dw.dim_sex (SEX_ID, SEX) VALUES (?, ?);",
+        lambda df: [(int(r.SEX_ID), str(r.SEX)) for r in df.itertuples(index=False)],
+    ),
+    "dim_death_cause": (
+        "INSERT INTO dw.dim_death_cause (DEATH_CAUSE_ID, DEATH_CAUSE_CODE, DEATH_CAUSE_NAME) VALUES (?, ?, ?);",
+        lambda df: [(int(r.DEATH_CAUSE_ID), str(r.DEATH_CAUSE_CODE), str(r.DEATH_CAUSE_NAME))
+                    for r in df.itertuples(index=False)],
+    ),
+    "dim_economic_sector": (
+        "INSERT INTO dw.dim_economic_sector (ECONOMIC_SECTOR_ID, ECONOMIC_SECTOR) VALUES (?, ?);",
+        lambda df: [(int(r.ECONOMIC_SECTOR_ID), str(r.ECONOMIC_SECTOR)) for r in df.itertuples(index=False)],
+    ),
+    "dim_municipality": (
+        "INSERT INTO dw.dim_municipality (CPRO, MUN_NUMBER, MUN_NAME) VALUES (?, ?, ?);",
+        lambda df: [(int(r.CPRO), int(r.MUN_NUMBER), str(r.MUN_NAME)) for r in df.itertuples(index=False)],
+    ),
+    "fact_deaths": (
+        "INSERT INTO dw.fact_deaths (CPRO, [YEAR], SEX_ID, DEATH_CAUSE_ID, TOTAL_DEATHS) VALUES (?, ?, ?, ?, ?);",
+        lambda df: [(int(r.CPRO), int(r.YEAR), int(r.SEX_ID), int(r.DEATH_CAUSE_ID), int(r.TOTAL_DEATHS))
+                    for r in df.itertuples(index=False)],
+    ),
+    "fact_economic_sector": (
+        "INSERT INTO dw.fact_economic_sector (CPRO, [YEAR], ECONOMIC_SECTOR_ID, TOTAL_VALUE) VALUES (?, ?, ?, ?);",
+        lambda df: [(int(r.CPRO), int(r.YEAR), int(r.ECONOMIC_SECTOR_ID), float(r.TOTAL_VALUE))
+                    for r in df.itertuples(index=False)],
+    ),
+    "fact_population_municipality": (
+        "INSERT INTO dw.fact_population_municipality "
+        "(CPRO, MUN_NUMBER, [YEAR], POPULATION_TOTAL, MALE_TOTAL, FEMALE_TOTAL) "
+        "VALUES (?, ?, ?, ?, ?, ?);",
+        lambda df: [(int(r.CPRO), int(r.MUN_NUMBER), int(r.YEAR), int(r.POPULATION_TOTAL), int(r.MALE_TOTAL), int(r.FEMALE_TOTAL))
+                    for r in df.itertuples(index=False)],
+    ),
+}
+
+
+# SCD type 1 updates of the dims (dim_time has no attributes): table -> (SQL, row builder)
+UPDATES = {
+    "dim_autonomy": (
+        "UPDATE dw.dim_autonomy SET CODAUTO_NAME = ? WHERE CODAUTO = ?;",
+        lambda df: [(str(r.CODAUTO_NAME), int(r.CODAUTO)) for r in df.itertuples(index=False)],
+    ),
+    "dim_province": (
+        "UPDATE dw.dim_province SET CODAUTO = ?, CPRO_NAME = ? WHERE CPRO = ?;",
+        lambda df: [(int(r.CODAUTO), str(r.CPRO_NAME), int(r.CPRO)) for r in df.itertuples(index=False)],
+    ),
+    "dim_sex": (
+        "UPDATE dw.dim_sex SET SEX = ? WHERE SEX_ID = ?;",
+        lambda df: [(str(r.SEX), int(r.SEX_ID)) for r in df.itertuples(index=False)],
+    ),
+    "dim_death_cause": (
+        "UPDATE dw.dim_death_cause SET DEATH_CAUSE_CODE = ?, DEATH_CAUSE_NAME = ? WHERE DEATH_CAUSE_ID = ?;",
+        lambda df: [(str(r.DEATH_CAUSE_CODE), str(r.DEATH_CAUSE_NAME), int(r.DEATH_CAUSE_ID))
+                    for r in df.itertuples(index=False)],
+    ),
+    "dim_economic_sector": (
+        "UPDATE dw.dim_economic_sector SET ECONOMIC_SECTOR = ? WHERE ECONOMIC_SECTOR_ID = ?;",
+        lambda df: [(str(r.ECONOMIC_SECTOR), int(r.ECONOMIC_SECTOR_ID)) for r in df.itertuples(index=False)],
+    ),
+    "dim_municipality": (
+        "UPDATE dw.dim_municipality SET MUN_NAME = ? WHERE CPRO = ? AND MUN_NUMBER = ?;",
+        lambda df: [(str(r.MUN_NAME), int(r.CPRO), int(r.MUN_NUMBER)) for r in df.itertuples(index=False)],
+    ),
+}
+
+
+def insert_table(cursor, name: str, df: pd.DataFrame) -> tuple[int, pd.DataFrame]:
+    # (rows inserted, rows of df rejected)
+    sql, to_rows = INSERTS[name]
+    batcher = run_batches(cursor, sql, to_rows(df))
+    logger.info("Inserted %s: %d rows", name, batcher.loaded)
+    return batcher.loaded, rejected_rows(df, batcher)
+
+
+def update_table(cursor, name: str, df: pd.DataFrame) -> tuple[int, pd.DataFrame]:
+    # SCD type 1 update pass, with its own reject file: (rows updated, rows of df rejected)
+    sql, to_rows = UPDATES[name]
+    batcher = run_batches(cursor, sql, to_rows(df), part="update")
+    logger.info("Updated %s: %d rows", name, batcher.loaded)
+    return batcher.loaded, rejected_rows(df, batcher)
+
+
+def insert_table_resumable(cursor, name: str, df: pd.DataFrame,
+                           part: str | None = None, where: tuple[str, list] | None = None) -> int:
+    # the table ends up with exactly these rows: a load of the same rows that
+    # failed halfway continues after its last committed batch, other rows
+    # (or no journal) start over from an empty table.
+    # part/where: the load only owns the rows matching where (one shard, see sharded.py)
+    sql, to_rows = INSERTS[name]
+    rows = to_rows(df)
+    journal_name = name if part is None else f"{name}/{part}"
+    journal = LoadJournal(journal_name, rows_key(rows))
+
+    start = journal.committed(cursor)
+    if start == 0:
+        if where is None:
+            cursor.execute(f"DELETE FROM dw.{name};")
+        else:
+            cursor.execute(f"DELETE FROM dw.{name} WHERE {where[0]};", where[1])
+        clear_journal(cursor, journal_name)
+        cursor.connection.commit()
+    elif start >= len(rows):
+        batches, loaded, rejected = journal.summary(cursor)
+        logger.info("%s already loaded (%d rows, %d rejected, %d batches in journal), skipped",
+                    journal_name, loaded, rejected, batches)
+        return 0
+
+    n = exec_many(cursor, sql, rows, journal=journal, start=start, part=part)
+    logger.info("Inserted %s: %d rows%s", journal_name, n, f" (resumed at row {start})" if start else "")
+    return n
+
+
+# STEPS
+# dims must run first (it fills the dim cache the others map their keys with), then every
+# fact / the aggregates can be loaded on their own, also in parallel
+FACT_SOURCES = {
+    "fact_deaths": "deaths",
+    "fact_economic_sector": "sector",
+    "fact_population_municipality": "pobmun",
+}
+STEPS = ["dims", *FACT_SOURCES, "aggregates"]
+
+
+def prepare_step(step: str, key_map: dict, dims: DimCache) -> dict[str, pd.DataFrame]:
+    # read + build everything a step inserts, before any connection is opened
+    # (dims: the dim cache the facts / aggregates take their surrogate ids from)
+    if step == "dims":
+        data = read_staging({"codauto", "deaths", "sector", "pobmun"}, columns=DIM_COLS)
+        return build_dims(data, key_map)
+
+    if step in FACT_SOURCES:
+        data = read_staging({FACT_SOURCES[step]})
+        fact = build_fact(step, data, dims)
+        logger.info("Fact size -> %s:%d", step, len(fact))
+        return {step: fact}
+
+    if step == "aggregates":
+        return read_aggregates(dims)
+
+    raise ValueError(f"Unknown load step: {step} (expected one of {STEPS})")
+
+
+def precheck_dims(dims: dict[str, pd.DataFrame], cache: DimCache) -> DimCache:
+    # integrity of the dims of this run, each against the dims before it in load
+    # order (cached members included); returns the cache as it will be after the load
+    for name, df in dims.items():
+        dims[name] = integrity.check(name, df, cache.frames)
+        cache = cache.merged({name: dims[name]})
+    return cache
+
+
+def precheck(tables: dict[str, pd.DataFrame], cache: DimCache) -> None:
+    # facts / aggregates against the dims in the cache (integrity.py)
+    for name, df in tables.items():
+        tables[name] = integrity.check(name, df, cache.frames)
+
+
+def upsert_dims(cur, tables: dict[str, pd.DataFrame], cache: DimCache) -> tuple[int, dict[str, pd.DataFrame]]:
+    # SCD type 1: new members inserted, members with changed attributes updated, the rest not sent.
+    # Returns the rows sent and the rejected members per dim
+    sent, rejected = 0, {}
+    for name, df in tables.items():
+        new, changed = cache.diff(name, df)
+        for send, rows in ((insert_table, new), (update_table, changed)):
+            if len(rows):
+                n, bad = send(cur, name, rows)
+                sent += n
+                if len(bad):
+                    rejected[name] = pd.concat([rejected.get(name), bad])
+    return sent, rejected
+
+
+def load_step(cn, cur, step: str, tables: dict[str, pd.DataFrame], layout: str = "single") -> None:
+    if step == "dims":
+        # the dims are one unit in the journal, keyed by the version of the dim
+        # cache: if the warehouse holds the cached version, only the members that
+        # changed are sent and the facts keep their rows; otherwise (first load,
+        # --restart, other layout) the tables are cleared and the dims reloaded
+        cache = DimCache.load(layout)
+        target = cache.merged(tables)
+        target.version = target.content_version()
+        loaded = cache.version is not None and LoadJournal("dims", cache.version).committed(cur) > 0
+
+        if loaded:
+            if target.version == cache.version:
+                logger.info("Dimensions unchanged since the last load (dim cache), skipped")
+                return
+            logger.info("Upserting changed dimension members...")
+            total, rejected = upsert_dims(cur, tables, cache)
+        else:
+            if CLEAR_BEFORE_LOAD:
+                logger.info("Clearing tables (facts -> dims)...")
+                clear_tables(cur)
+                cn.commit()
+                logger.info("Tables cleared and committed")
+
+            # insert dims (with the cached members staging no longer has)
+            logger.info("Inserting dimensions...")
+            total, rejected = 0, {}
+            for name in tables:
+                n, bad = insert_table(cur, name, target.frames[name])
+                total += n
+                if len(bad):
+                    rejected[name] = bad
+
+        # the cache only records what was committed: a rejected member keeps what the
+        # warehouse has (its cached version, or nothing), so the next load sends it again
+        if rejected:
+            before = cache if loaded else DimCache(layout=target.layout)
+            for name, bad in rejected.items():
+                target = target.reverted(name, bad, before)
+            target.version = target.content_version()
+            logger.warning("Rejected dimension members not recorded in the dim cache: %s",
+                           {name: len(bad) for name, bad in rejected.items()})
+
+        clear_journal(cur, "dims")
+        LoadJournal("dims", target.version).record(cur, 0, max(total, 1), total)
         cn.commit()
-        logger.info("Dimensions committed successfully")
+        target.save()
+        logger.info("Dimensions committed successfully (%d rows sent)", total)
+
+    elif step == "aggregates":
+        # insert aggregates
+        logger.info("Inserting aggregates...")
+        load_aggregates(cn, cur, tables)
+
+    else:
+        # insert facts (journaled per batch, resumable)
+        logger.info("Inserting %s...", step)
+        for name, df in tables.items():
+            insert_table_resumable(cur, name, df)
+        cn.commit()
+        logger.info("%s committed successfully", step)
 
-        # insert facts
-        logger.info("Inserting facts...")
 
-        exec_many(
-            cur,
-            "INSERT INTO dw.fact_deaths (CPRO, [YEAR], SEX, DEATH_CAUSE_CODE, TOTAL_DEATHS) VALUES (?, ?, ?, ?, ?);",
-            [(int(r.CPRO), int(r.YEAR), str(r.SEX), str(r.DEATH_CAUSE_CODE), int(r.TOTAL_DEATHS))
-             for r in fact_deaths.itertuples(index=False)]
-        )
-        logger.info("Inserted fact_deaths: %d rows", len(fact_deaths))
-
-        exec_many(
-            cur,
-            "INSERT INTO dw.fact_economic_sector (CPRO, [YEAR], ECONOMIC_SECTOR, TOTAL_VALUE) VALUES (?, ?, ?, ?);",
-            [(int(r.CPRO), int(r.YEAR), str(r.ECONOMIC_SECTOR), float(r.TOTAL_VALUE))
-             for r in fact_economic_sector.itertuples(index=False)]
-        )
-        logger.info("Inserted fact_economic_sector: %d rows", len(fact_economic_sector))
-
-        exec_many(
-            cur,
-            "INSERT INTO dw.fact_population_municipality "
-            "(CPRO, MUN_NUMBER, [YEAR], POPULATION_TOTAL, MALE_TOTAL, FEMALE_TOTAL) "
-            "VALUES (?, ?, ?, ?, ?, ?);",
-            [(int(r.CPRO), int(r.MUN_NUMBER), int(r.YEAR), int(r.POPULATION_TOTAL), int(r.MALE_TOTAL), int(r.FEMALE_TOTAL))
-             for r in fact_population.itertuples(index=False)]
-        )
-        logger.info("Inserted fact_population_municipality: %d rows", len(fact_population))
+# MAIN
+def main(steps: list[str] | None = None, restart: bool = False) -> int:
+    steps = steps or STEPS
+    start_ts = time.time()
+    logger.info("==== load_dw START (%s) ====", ", ".join(steps))
 
-        cn.commit()
-        logger.info("Facts committed successfully")
-        logger.info("==== load_dw SUCCESS in %.2fs ====", time.time() - start_ts)
+    # the connection is opened and checked in the background while the staging
+    # files are read and reshaped (a paused serverless tier can take tens of seconds)
+    logger.info(f"Connecting to warehouse: {BACKEND.describe()}")
+    warm = WarmConnection(BACKEND)
 
-    except Exception:
-        cn.rollback()
-        logger.exception("ERROR during load_dw: rollback applied")
-        raise
+    # closed also when the preparation fails (missing staging, DW_RI_POLICY=fail)
+    try:
+        # dims first: a fact step in the same run maps its keys with the ids they assign.
+        # Everything is checked (integrity.py) before the connection is used.
+        key_map = load_key_map()
+        cache = DimCache.load("single")
+        prepared = {}
+        t0 = time.perf_counter()
+        if "dims" in steps:
+            prepared["dims"] = prepare_step("dims", key_map, cache)
+            cache = precheck_dims(prepared["dims"], cache)
+        elif cache.version is None:
+            raise RuntimeError(f"No dimensions loaded yet ({CACHE_PATH} missing), run the dims step first")
+        for step in steps:
+            if step != "dims":
+                prepared[step] = prepare_step(step, key_map, cache)
+                precheck(prepared[step], cache)
+        for tables in prepared.values():
+            for table, df in tables.items():
+                record_rows(table, len(df))
+        logger.info("Prepared and checked %d tables in %.2fs",
+                    sum(len(t) for t in prepared.values()), time.perf_counter() - t0)
+
+        # charge data warehouse
+        t0 = time.perf_counter()
+        cn = warm.get()
+        logger.info("Warehouse connection ready (waited %.2fs after preparing)", time.perf_counter() - t0)
+
+        try:
+            cur = cn.cursor()
+            BACKEND.prepare_cursor(cur)
+
+            if restart:
+                logger.info("Restart requested: load journal cleared, every step loads from scratch")
+                clear_journal(cur)
+                cn.commit()
+
+            for step in steps:
+                load_step(cn, cur, step, prepared[step])
+
+            logger.info("==== load_dw SUCCESS in %.2fs ====", time.time() - start_ts)
+
+        except Exception:
+            cn.rollback()
+            logger.exception("ERROR during load_dw: rollback applied")
+            raise
     finally:
-        cn.close()
-        logger.info("SQL connection closed")
+        warm.close()
+        logger.info("Warehouse connection closed")
 
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    # python src/load_dw.py [--restart] [dims] [fact_deaths] ... (default: every step in order)
+    args = [a for a in sys.argv[1:] if a != "--restart"]
+    raise SystemExit(main(args or None, restart="--restart" in sys.argv[1:]))
@@ -0,0 +1,70 @@
+# LOAD JOURNAL
+# dw.etl_load_journal records every committed range of rows of a load:
+#   (TABLE_NAME, LOAD_KEY, BATCH_START, BATCH_END, ROWS_LOADED, ROWS_REJECTED)
+# The journal row is written in the same transaction as the batch it describes,
+# so after a crash the journal and the table always agree. LOAD_KEY is a hash of
+# all the rows of the load: running the same load again resumes after the last
+# committed batch, a load with different rows starts over from an empty table.
+
+from __future__ import annotations
+import hashlib
+
+
+JOURNAL_TABLE = "dw.etl_load_journal"
+
+
+def rows_key(*row_lists: list[tuple]) -> str:
+    # fingerprint of the rows, in load order
+    h = hashlib.sha256()
+    for rows in row_lists:
+        for row in rows:
+            h.update(repr(row).encode())
+            h.update(b"\n")
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def clear_journal(cursor, table: str | None = None) -> None:
+    if table is None:
+        cursor.execute(f"DELETE FROM {JOURNAL_TABLE};")
+    else:
+        cursor.execute(f"DELETE FROM {JOURNAL_TABLE} WHERE TABLE_NAME = ?;", [table])
+
+
+class LoadJournal:
+    def __init__(self, table: str, key: str):
+        self.table = table
+        self.key = key
+
+    def record(self, cursor, start: int, end: int, loaded: int, rejected: int = 0) -> None:
+        # caller commits (together with the batch)
+        cursor.execute(
+            f"INSERT INTO {JOURNAL_TABLE} "
+            "(TABLE_NAME, LOAD_KEY, BATCH_START, BATCH_END, ROWS_LOADED, ROWS_REJECTED) "
+            "VALUES (?, ?, ?, ?, ?, ?);",
+            [self.table, self.key, start, end, loaded, rejected],
+        )
+
+    def committed(self, cursor) -> int:
+        # rows [0, n) already handled by this load (end of the contiguous committed prefix)
+        cursor.execute(
+            f"SELECT BATCH_START, BATCH_END FROM {JOURNAL_TABLE} "
+            "WHERE TABLE_NAME = ? AND LOAD_KEY = ? ORDER BY BATCH_START;",
+            [self.table, self.key],
+        )
+        end = 0
+        for start, stop in cursor.fetchall():
+            if start > end:
+                break
+            end = max(end, stop)
+        return end
+
+    def summary(self, cursor) -> tuple[int, int, int]:
+        # (batches, rows loaded, rows rejected) of this load so far
+        cursor.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(ROWS_LOADED), 0), COALESCE(SUM(ROWS_REJECTED), 0) "
+            f"FROM {JOURNAL_TABLE} WHERE TABLE_NAME = ? AND LOAD_KEY = ?;",
+            [self.table, self.key],
+        )
+        batches, loaded, rejected = cursor.fetchone()
+        return int(batches), int(loaded), int(rejected)
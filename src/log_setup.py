@@ -0,0 +1,176 @@
+# SHARED LOGGING SETUP
+# Every stage calls configure_logging("<stage>") instead of logging.basicConfig.
+# The calling thread only puts the record on a queue (QueueHandler); a listener
+# thread formats it and writes it to
+#   logs/<stage>.log    the same text lines as before
+#   logs/app.log        one JSON object per line, the merged log of every stage,
+#                       subprocess and worker (config/settings.yaml: logging)
+# Every record carries run_id and step: the orchestrator creates one run id per
+# pipeline run and passes it to the step subprocesses with the step name
+# (PIPELINE_RUN_ID / PIPELINE_STEP), so app.log can be filtered per run and step.
+# A script run by hand gets its own run id and its stage as step.
+#
+# Expensive payloads go through lazy(): logger.info("Missing: %s", lazy(df.isnull().sum))
+# only computes df.isnull().sum() if INFO is enabled.
+#
+# Like basicConfig, the first call in a process wins (sharded.py configures
+# before importing the stage modules).
+
+from __future__ import annotations
+import atexit
+import json
+import logging
+import os
+import queue
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SETTINGS = PROJECT_ROOT / "config" / "settings.yaml"
+LOG_DIR = PROJECT_ROOT / "logs"
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+RUN_ENV = "PIPELINE_RUN_ID"
+STEP_ENV = "PIPELINE_STEP"
+
+_listener: QueueListener | None = None
+_queue_handler: QueueHandler | None = None
+
+
+class lazy:
+    # log argument computed when (and only if) the message is formatted
+    def __init__(self, fn, *args, **kwargs):
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+
+    def __str__(self) -> str:
+        return str(self.fn(*self.args, **self.kwargs))
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def read_settings(path: Path = SETTINGS) -> dict:
+    # logging section of settings.yaml; LOG_LEVEL / LOG_FORMAT / LOG_FILE override it
+    settings = {"level": "INFO", "format": "json", "file": "./logs/app.log"}
+    try:
+        import yaml
+        with open(path, encoding="utf-8") as fh:
+            settings.update((yaml.safe_load(fh) or {}).get("logging") or {})
+    except (ImportError, OSError):
+        pass
+    for key in settings:
+        settings[key] = os.getenv(f"LOG_{key.upper()}", settings[key])
+    return settings
+
+
+class ContextFilter(logging.Filter):
+    # run / step of the process, unless the call passed its own (extra={"step": ...})
+    def __init__(self, run_id: str, step: str):
+        super().__init__()
+        self.run_id, self.step = run_id, step
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "run_id"):
+            record.run_id = self.run_id
+        if not hasattr(record, "step"):
+            record.step = self.step
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "run_id": getattr(record, "run_id", None),
+            "step": getattr(record, "step", None),
+            "pid": record.process,
+            "thread": record.threadName,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    # only the message (with its lazy arguments) and the traceback are rendered
+    # in the calling thread, the listener does the text / JSON formatting and the I/O
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+
+def _start_listener(handlers: list[logging.Handler]) -> None:
+    global _listener
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler.queue = q
+    _listener = QueueListener(q, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _after_fork() -> None:
+    # a forked worker has the queue handler but not the listener thread: give it its
+    # own queue + listener (same files, opened in append mode), drained at exit
+    if _listener is None:
+        return
+    _start_listener(list(_listener.handlers))
+    try:
+        from multiprocessing.util import Finalize
+        # multiprocessing children leave with os._exit: atexit would not run
+        Finalize(None, stop_logging, exitpriority=100)
+    except ImportError:
+        pass
+
+
+def stop_logging() -> None:
+    # flush what is still queued (also registered with atexit)
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(stage: str, text_format: str = TEXT_FORMAT, log_dir: Path = LOG_DIR) -> None:
+    global _queue_handler
+    root = logging.getLogger()
+    if root.handlers:
+        return
+
+    settings = read_settings()
+    level = logging.getLevelName(str(settings["level"]).upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    text = logging.FileHandler(log_dir / f"{stage}.log", encoding="utf-8")
+    text.setFormatter(logging.Formatter(text_format))
+
+    app_path = Path(settings["file"])
+    app_path = app_path if app_path.is_absolute() else PROJECT_ROOT / app_path
+    app_path.parent.mkdir(parents=True, exist_ok=True)
+    app = logging.FileHandler(app_path, encoding="utf-8")
+    app.setFormatter(JsonFormatter() if settings["format"] == "json" else logging.Formatter(
+        "%(asctime)s - %(levelname)s - %(run_id)s - %(step)s - %(process)d - %(message)s"))
+
+    _queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+    # a run id created here is exported too, so child processes (and profiling.py) share it
+    run_id = os.environ.setdefault(RUN_ENV, new_run_id())
+    _queue_handler.addFilter(ContextFilter(run_id, os.getenv(STEP_ENV) or stage))
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _start_listener([text, app])
+    atexit.register(stop_logging)
+    os.register_at_fork(after_in_child=_after_fork)
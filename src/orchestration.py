@@ -1,83 +1,506 @@
 # src/orchestration.py
+# The pipeline is a DAG of small steps instead of four scripts in a row:
+#
+#   fetch:<source> ──> transform:<dataset> ──┬──> aggregates ─────────────┐
+#   transform:codauto ───────────────────────┤                           ├──> load:aggregates
+#                                            ├──> load:dims ──┬──────────┘
+#                                            │                └──> load:fact_*
+#                                            └──> export:wide  (only with --wide-export, see wide_export.py)
+#
+# Every step is a subprocess; a step starts as soon as all its dependencies
+# succeeded, so independent steps (the 19 downloads, the four transformations,
+# the three fact loads) run in parallel on a small worker pool.
+# Steps are memoized (see stage_cache.py): a step whose code, config, inputs and
+# upstream results did not change since its last successful run is skipped;
+# for a load step that includes what the load journal of the warehouse holds
+# for it, so a fresh or wiped warehouse is loaded again.
+# Every run and step (time, peak memory, rows, input hash) is kept in the run
+# history (see run_history.py), and the end of the run prints the steps that
+# regressed against their previous runs.
+# When load steps are selected, the warehouse connection is opened and checked
+# in the background while the first steps run (WarmConnection), so a paused
+# serverless database is awake when the loads start.
+#
+#   python main.py                      run what changed
+#   python main.py --force              run every step
+#   python main.py --only transform load:dims   run only these steps (names, groups or globs)
+#   python main.py --profile            profile every step that runs (see profiling.py)
+#   python main.py --sample [CPROS]     the whole pipeline on a few provinces (see sampling.py)
+#   python main.py --reprocess [SOURCE ...]   quarantined lines parsed again, then what changed (see quarantine.py)
+#   python main.py --wide-export        also write the denormalized per-fact extracts (see wide_export.py)
+import ast
 import logging
+import os
 import subprocess
 import sys
 import time
+from fnmatch import fnmatch
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
 from datetime import datetime
 
-# Paths 
+# Paths
 ROOT = Path(__file__).resolve().parent.parent
 SRC = ROOT / "src"
 LOGS = ROOT / "logs"
 WAREHOUSE = ROOT / "warehouse"
+RAW = ROOT / "data" / "raw"
+
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from log_setup import RUN_ENV, STEP_ENV, configure_logging, new_run_id  # noqa: E402
+from profiling import PROFILE_ENV, enabled as profiling_enabled, profile_dir  # noqa: E402
+from quarantine import indexes as quarantined  # noqa: E402
+from run_history import METRICS_ENV, RunHistory, inputs_hash, metrics_path, read_metrics  # noqa: E402
+from sampling import SAMPLE_WAREHOUSE, data_dir, spec as sample_spec  # noqa: E402
+from stage_cache import StageCache  # noqa: E402
+from warehouse_backend import PREWARM, WarmConnection, get_backend  # noqa: E402
+
+STAGING = data_dir("staging")
 
 # Commands
 INGESTION = [sys.executable, SRC / "ingestion.py"]
 TRANSFORMATION = [sys.executable, SRC / "transformation.py"]
+AGGREGATES = [sys.executable, SRC / "aggregates.py"]
+WIDE_EXPORT = [sys.executable, SRC / "wide_export.py"]
 LOAD_DW = [sys.executable, SRC / "load_dw.py"]
+PROFILED = [sys.executable, SRC / "profiling.py"]  # + script + args
+REPROCESS = [sys.executable, SRC / "quarantine.py", "reprocess"]
 SCHEMA = ["psql", "-f", WAREHOUSE / "schema.sql"]
 
 
-# Retry policy for ingestion
+# Retry policy for ingestion (per source now, a failed download no longer repeats the other 18)
 INGESTION_RETRIES = 3
 BACKOFF = 2
 
+# parallel steps (subprocesses), override with PIPELINE_WORKERS
+MAX_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
 
-# logging
-logging.basicConfig(
-    filename=LOGS / "orchestration.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+# exit code of the pipeline by the group of the step that failed
+EXIT_CODES = {"fetch": 1, "transform": 2, "reprocess": 2, "load": 4, "aggregates": 5, "export": 6}
 
-logger = logging.getLogger(__name__)
-logger.info(f"Pipeline started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+# raw sources feeding each transformation (codauto_cpro.csv is a versioned reference file)
+TRANSFORM_SOURCES = {
+    "pobmun": [f"pobmun{year}" for year in range(2008, 2025)],
+    "codauto": [],
+    "economic": ["economic_sector_province"],
+    "deaths": ["death_causes_province"],
+}
 
+# load_dw steps after dims (same names as load_dw.FACT_SOURCES)
+LOAD_FACTS = ["fact_deaths", "fact_economic_sector", "fact_population_municipality"]
 
-def run(cmd, step_name, retry=False):
-    attempts = INGESTION_RETRIES if retry else 1
+# staged file written by each transformation
+STAGED = {
+    "pobmun": STAGING / "pobmun_combined_transformed.csv",
+    "codauto": STAGING / "codauto_cpro_transformed.csv",
+    "economic": STAGING / "economic_sector_province_transformed.csv",
+    "deaths": STAGING / "death_causes_province_transformed.csv",
+}
+FACT_INPUTS = {
+    "fact_deaths": [STAGED["deaths"]],
+    "fact_economic_sector": [STAGED["economic"]],
+    "fact_population_municipality": [STAGED["pobmun"]],
+}
+AGG_OUTPUTS = [
+    STAGING / f"{t}.csv" for t in (
+        "agg_population_province_year", "agg_population_autonomy_year",
+        "agg_economic_sector_autonomy_year", "agg_deaths_autonomy_year",
+    )
+]
 
-    for attempt in range(1, attempts + 1):
-        logger.info(f"[{step_name}] Running (attempt {attempt}/{attempts})")
+# manifests of the optional wide extracts (wide_export.py, off unless WIDE_EXPORT=1)
+WIDE_EXPORT_ENV = "WIDE_EXPORT"
+WIDE_OUTPUTS = [
+    data_dir("export") / "wide" / t / "_manifest.json" for t in (
+        "wide_deaths", "wide_economic_sector", "wide_population_municipality",
+    )
+]
 
-        result = subprocess.run(cmd)
+# a download is reused for this long before fetching the source again
+FETCH_MAX_AGE_HOURS = float(os.getenv("FETCH_MAX_AGE_HOURS", "24"))
 
-        if result.returncode == 0:
-            logger.info(f"[{step_name}] Completed successfully")
-            return True
 
-        logger.error(f"[{step_name}] Failed with return code {result.returncode}")
+def local_modules(script: Path) -> list[Path]:
+    # the script and every module of src/ it imports, directly or through another one
+    seen: set[Path] = set()
+    todo = [script]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            todo += [SRC / f"{n.split('.')[0]}.py" for n in names if (SRC / f"{n.split('.')[0]}.py").exists()]
+    return sorted(seen)
 
-        if not retry:
-            return False
 
-        time.sleep(BACKOFF * attempt)
+# code behind each group of steps (part of the fingerprint)
+LOAD_CODE = local_modules(SRC / "load_dw.py") + [WAREHOUSE / "schema.sql", WAREHOUSE / "schema_sqlite.sql"]
+# env vars that select the target warehouse and how it is loaded
+LOAD_ENV = ["DW_BACKEND", "DW_SQLITE_PATH", "AZURE_SQL_SERVER", "AZURE_SQL_DATABASE", "DW_RI_POLICY"]
 
-    logger.error(f"[{step_name}] Exhausted retries")
-    return False
+
+# logging: one run id per pipeline run, inherited by the step subprocesses
+# (with the step name) so logs/app.log merges every step of the run
+RUN_ID = os.environ.setdefault(RUN_ENV, new_run_id())
+configure_logging("orchestration", log_dir=LOGS)
+
+logger = logging.getLogger(__name__)
 
 
-def run_pipeline():
-    # ingestion → retry
-    if not run(INGESTION, "ingestion", retry=True):
-        logger.error("Pipeline stopped at ingestion step")
-        sys.exit(1)
+@dataclass
+class Task:
+    name: str
+    cmd: list
+    deps: list[str] = field(default_factory=list)
+    retries: int = 1
+    backoff: float = 0
+    # memoization: what the result depends on and which files it writes
+    code: list[Path] = field(default_factory=list)
+    inputs: list[Path] = field(default_factory=list)
+    outputs: list[Path] = field(default_factory=list)
+    config: dict[str, str] = field(default_factory=dict)
+    # load steps: their entries in dw.etl_load_journal (TABLE_NAME, or TABLE_NAME/<part>)
+    journal: list[str] = field(default_factory=list)
 
-    # transformation → stop
-    if not run(TRANSFORMATION, "transformation"):
-        logger.error("Pipeline stopped at transformation step")
-        sys.exit(2)
+    @property
+    def group(self) -> str:
+        return self.name.split(":", 1)[0]
+
+
+def build_dag() -> dict[str, Task]:
+    tasks: list[Task] = []
+    # remote sources have no local input to hash: a fetch is valid for FETCH_MAX_AGE_HOURS
+    fetch_period = str(int(time.time() // (FETCH_MAX_AGE_HOURS * 3600)))
+    load_env = {k: os.getenv(k, "") for k in LOAD_ENV}
+
+    for dataset, sources in TRANSFORM_SOURCES.items():
+        for source in sources:
+            tasks.append(Task(
+                f"fetch:{source}", INGESTION + [source], retries=INGESTION_RETRIES, backoff=BACKOFF,
+                code=[SRC / "ingestion.py", SRC / "quarantine.py"], outputs=[RAW / f"{source}.csv"],
+                config={"period": fetch_period},
+            ))
+        inputs = [RAW / f"{s}.csv" for s in sources] if sources else [RAW / "codauto_cpro.csv"]
+        tasks.append(Task(
+            f"transform:{dataset}", TRANSFORMATION + [dataset], deps=[f"fetch:{s}" for s in sources],
+            code=[SRC / "transformation.py", SRC / "pobmun_reader.py", SRC / "schemas.py", SRC / "sampling.py",
+                  SRC / "quarantine.py", SRC / "imputation.py", SRC / "economic_annual.py"],
+            inputs=inputs, outputs=[STAGED[dataset]],
+            config={"sample": sample_spec() or "", "impute": os.getenv(f"IMPUTE_{dataset.upper()}", "")},
+        ))
+
+    transforms = [f"transform:{d}" for d in TRANSFORM_SOURCES]
+    tasks.append(Task(
+        "aggregates", AGGREGATES, deps=transforms,
+        code=[SRC / "aggregates.py", SRC / "schemas.py"], inputs=list(STAGED.values()), outputs=AGG_OUTPUTS,
+    ))
+
+    if os.getenv(WIDE_EXPORT_ENV, "").lower() in ("1", "true", "yes", "on"):
+        tasks.append(Task(
+            "export:wide", WIDE_EXPORT, deps=transforms,
+            code=[SRC / m for m in ("wide_export.py", "aggregates.py", "schemas.py")], inputs=list(STAGED.values()),
+            outputs=WIDE_OUTPUTS, config={"format": os.getenv("WIDE_FORMAT", "")},
+        ))
 
     # not necessary if there if tables are already created
-    # # schema → stop
-    # if not run(SCHEMA, "schema"):
-    #     logger.error("Pipeline stopped at schema step")
-    #     sys.exit(3)
+    # tasks.append(Task("schema", SCHEMA))
+
+    tasks.append(Task(
+        "load:dims", LOAD_DW + ["dims"], deps=transforms,
+        code=LOAD_CODE, inputs=list(STAGED.values()), config=load_env, journal=["dims", "dim_municipality"],
+    ))
+    for fact in LOAD_FACTS:
+        tasks.append(Task(
+            f"load:{fact}", LOAD_DW + [fact], deps=["load:dims"],
+            code=LOAD_CODE, inputs=FACT_INPUTS[fact], config=load_env, journal=[fact],
+        ))
+    tasks.append(Task(
+        "load:aggregates", LOAD_DW + ["aggregates"], deps=["aggregates", "load:dims"],
+        code=LOAD_CODE, inputs=AGG_OUTPUTS, config=load_env, journal=[p.stem for p in AGG_OUTPUTS],
+    ))
+
+    return {t.name: t for t in tasks}
+
+
+def command(task: Task) -> list[str]:
+    # python steps run under profiling.py when profiling is on
+    cmd = task.cmd
+    if profiling_enabled() and cmd[0] == sys.executable:
+        cmd = PROFILED + cmd[1:]
+    return [str(c) for c in cmd]
+
+
+def run_process(cmd: list[str], env: dict[str, str]) -> tuple[int, float | None]:
+    # (return code, peak RSS in MB of the process and the children it waited for)
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    if not hasattr(os, "wait4"):  # Windows: no rusage per child
+        return proc.wait(), None
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage.ru_maxrss / 1024  # KB on Linux
+
+
+def run(task: Task) -> tuple[bool, float, float | None]:
+    # (success, seconds, peak MB of the largest attempt)
+    start = time.time()
+    env = {**os.environ, STEP_ENV: task.name, METRICS_ENV: str(metrics_path(RUN_ID, task.name))}
+    step = {"step": task.name}
+    cmd = command(task)
+    peak = None
+
+    for attempt in range(1, task.retries + 1):
+        logger.info(f"[{task.name}] Running (attempt {attempt}/{task.retries})", extra=step)
+
+        returncode, attempt_peak = run_process(cmd, env)
+        if attempt_peak is not None:
+            peak = max(peak or 0, attempt_peak)
+
+        if returncode == 0:
+            logger.info(f"[{task.name}] Completed successfully in {time.time() - start:.2f}s", extra=step)
+            return True, time.time() - start, peak
+
+        logger.error(f"[{task.name}] Failed with return code {returncode}", extra=step)
+
+        if attempt < task.retries:
+            time.sleep(task.backoff * attempt)
+
+    if task.retries > 1:
+        logger.error(f"[{task.name}] Exhausted retries", extra=step)
+    return False, time.time() - start, peak
+
+
+def critical_path(tasks: dict[str, Task], durations: dict[str, float]) -> tuple[list[str], float]:
+    # longest chain of dependent steps, the lower bound of the wall time with unlimited workers
+    finish: dict[str, float] = {}
+    prev: dict[str, str | None] = {}
+
+    def visit(name: str) -> float:
+        if name not in finish:
+            best = max(tasks[name].deps, key=visit, default=None)
+            prev[name] = best
+            finish[name] = (finish[best] if best else 0) + durations.get(name, 0)
+        return finish[name]
+
+    end = max(tasks, key=visit)
+    total = finish[end]
+    path = []
+    while end:
+        if end in durations:
+            path.append(end)
+        end = prev[end]
+    return path[::-1], total
+
+
+def select(tasks: dict[str, Task], patterns: list[str] | None) -> set[str]:
+    # --only: exact names, groups ("transform") or globs ("load:fact_*")
+    if not patterns:
+        return set(tasks)
+    selected = {n for n, t in tasks.items() if any(fnmatch(n, p) or t.group == p for p in patterns)}
+    if not selected:
+        raise ValueError(f"--only {patterns} matches no step (steps: {list(tasks)})")
+    return selected
+
+
+def journal_state(warehouse: WarmConnection, names: list[str]) -> str | None:
+    # the loads of the load journal for these entries (None: warehouse not reachable)
+    try:
+        cn = warehouse.get()
+        cur = cn.cursor()
+        cur.execute(
+            "SELECT TABLE_NAME, LOAD_KEY, COUNT(*), SUM(ROWS_LOADED), SUM(ROWS_REJECTED) "
+            "FROM dw.etl_load_journal GROUP BY TABLE_NAME, LOAD_KEY ORDER BY TABLE_NAME, LOAD_KEY;"
+        )
+        rows = [tuple(r) for r in cur.fetchall() if r[0].split("/", 1)[0] in names]
+        cn.rollback()
+    except Exception as exc:
+        logger.warning(f"Load journal not readable ({exc}), the load steps run")
+        return None
+    return repr(rows)
+
+
+def fingerprint(cache: StageCache, tasks: dict[str, Task], task: Task,
+                warehouse: WarmConnection | None = None) -> str | None:
+    # deps that write files count by the content of those files, warehouse-only
+    # steps by the id of their last execution; load steps also by what the
+    # warehouse holds for them (None: a load step whose warehouse is not readable)
+    deps = {
+        d: cache.outputs_hash(tasks[d].outputs) if tasks[d].outputs else cache.latest(d)
+        for d in task.deps
+    }
+    config = task.config
+    if task.journal and warehouse is not None:
+        state = journal_state(warehouse, task.journal)
+        if state is None:
+            return None
+        config = {**config, "warehouse": state}
+    # the scripts are hashed as code, the command only adds its arguments
+    args = [str(c) for c in task.cmd[2:]]
+    return cache.fingerprint(task.name, args, task.code, task.inputs, config, deps)
+
+
+def record(history: RunHistory | None, cache: StageCache | None, task: Task, status: str,
+           fingerprint: str | None, duration: float | None = None, peak: float | None = None) -> None:
+    # the step in the run history, with the row counts it reported
+    rows = read_metrics(metrics_path(RUN_ID, task.name))
+    if history is None:
+        return
+    inputs = inputs_hash([cache.file_hash(p) for p in task.inputs]) if cache is not None else None
+    history.record_step(RUN_ID, task.name, status, duration, peak, rows, fingerprint, inputs)
+
+
+def run_dag(tasks: dict[str, Task], workers: int = MAX_WORKERS, cache: StageCache | None = None,
+            force: bool = False, only: list[str] | None = None, history: RunHistory | None = None,
+            warehouse: WarmConnection | None = None) -> str | None:
+    # returns the name of the first failed task (None if everything succeeded);
+    # warehouse: the connection the load journal is read with (see fingerprint)
+    pending = dict(tasks)
+    done: set[str] = set()
+    durations: dict[str, float] = {}
+    fingerprints: dict[str, str] = {}
+    selected = select(tasks, only)
+    skipped = []
+    failed = None
+    start = time.time()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while pending or running:
+            # stop scheduling new work after a failure, let the running steps finish
+            ready = [] if failed is not None else [
+                n for n, t in pending.items() if all(d in done for d in t.deps)
+            ]
+            for name in ready:
+                task = pending.pop(name)
+                if name not in selected:
+                    done.add(name)
+                    continue
+                if cache is not None:
+                    fingerprints[name] = fingerprint(cache, tasks, task, warehouse)
+                    if not force and fingerprints[name] and cache.lookup(name, fingerprints[name]):
+                        logger.info(f"[{name}] Up to date, skipped", extra={"step": name})
+                        record(history, cache, task, "skipped", fingerprints[name])
+                        skipped.append(name)
+                        done.add(name)
+                        continue
+                running[pool.submit(run, task)] = name
+
+            # a skipped step can make others ready without anything running
+            if ready:
+                continue
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                ok, durations[name], peak = fut.result()
+                record(history, cache, tasks[name], "ok" if ok else "failed",
+                       fingerprints.get(name), durations[name], peak)
+                if ok:
+                    done.add(name)
+                    if cache is not None and tasks[name].journal:
+                        # recorded with what the load left in the warehouse
+                        fingerprints[name] = fingerprint(cache, tasks, tasks[name], warehouse)
+                    if cache is not None and fingerprints[name]:
+                        cache.record(name, fingerprints[name], tasks[name].outputs)
+                elif failed is None:
+                    failed = name
+                    # drop the steps still queued in the pool
+                    for queued in [f for f in running if f.cancel()]:
+                        del running[queued]
+
+    if cache is not None:
+        cache.save()
+
+    wall = time.time() - start
+    logger.info(
+        f"Wall time {wall:.2f}s vs {sum(durations.values()):.2f}s of steps "
+        f"({len(durations)} steps run, {len(skipped)} up to date, {workers} workers)"
+    )
+    if durations:
+        path, path_time = critical_path(tasks, durations)
+        logger.info(f"Critical path ({path_time:.2f}s): {' -> '.join(path)}")
+    return failed
+
+
+def reprocess(tasks: dict[str, Task], cache: StageCache, sources: list[str],
+              history: RunHistory | None = None) -> bool:
+    # --reprocess: the quarantined lines parsed again (quarantine.py) before the DAG.
+    # Lines of a download go back to their raw file, so their transform re-runs as
+    # usual. Lines of a raw pobmun file are merged into the staging file: that file
+    # is recorded as the result of transform:pobmun for the current code, so the
+    # transform is not re-run over every file and the steps after it see the rows
+    found = [i for i in quarantined() if not sources or i["source"] in sources]
+    if not found:
+        logger.info(f"Nothing in quarantine to reprocess ({sources or 'all sources'})")
+        return True
+    # a download is only re-transformed if repaired lines went back to its raw file
+    raw_before = {i["source"]: cache.file_hash(RAW / f"{i['source']}.csv")
+                  for i in found if i["stage"] == "ingestion"}
+    task = Task("reprocess", REPROCESS + sorted({i["source"] for i in found}))
+    ok, duration, peak = run(task)
+    record(history, None, task, "ok" if ok else "failed", None, duration, peak)
+    if not ok:
+        return False
+
+    dataset_of = {s: d for d, sources in TRANSFORM_SOURCES.items() for s in sources}
+    raw_changed = {dataset_of[s] for s, digest in raw_before.items() if cache.file_hash(RAW / f"{s}.csv") != digest}
+    merged = {dataset_of[i["source"]] for i in found if i["stage"] == "transform"} - raw_changed
+    for dataset in sorted(merged):
+        name = f"transform:{dataset}"
+        cache.record(name, fingerprint(cache, tasks, tasks[name]), tasks[name].outputs)
+        logger.info(f"[{name}] Reprocessed rows merged, recorded as up to date", extra={"step": name})
+    cache.save()
+    return True
+
+
+def run_pipeline(force: bool = False, only: list[str] | None = None, profile: bool = False,
+                 reprocess_sources: list[str] | None = None, wide_export: bool = False):
+    logger.info(f"Pipeline started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} (run {RUN_ID})")
+    if profile:
+        os.environ[PROFILE_ENV] = "1"
+    if wide_export:
+        os.environ[WIDE_EXPORT_ENV] = "1"
+    if profiling_enabled():
+        logger.info(f"Profiling on: per-step .prof / .collapsed files in {profile_dir()}")
+    if sample_spec():
+        logger.info(f"Sample mode ({sample_spec()}): staging and state in {STAGING.parent}, warehouse {SAMPLE_WAREHOUSE}")
+
+    tasks = build_dag()
+    # the warehouse is woken up and checked while the steps before the loads run
+    # (without pre-warming, it is opened when the first load step is fingerprinted)
+    warm = None
+    if any(tasks[n].group == "load" for n in select(tasks, only)):
+        warm = WarmConnection(get_backend(), background=PREWARM)
+    cache = StageCache()
+    history = RunHistory()
+    history.start_run(RUN_ID, sys.argv)
+    start = time.time()
+    failed = None
+    if reprocess_sources is not None and not reprocess(tasks, cache, reprocess_sources, history):
+        failed = "reprocess"
+    failed = failed or run_dag(tasks, cache=cache, force=force, only=only, history=history, warehouse=warm)
+    if warm is not None:
+        warm.close()
 
-    # load_dw → stop
-    if not run(LOAD_DW, "load_dw"):
-        logger.error("Pipeline stopped at load_dw step")
-        sys.exit(4)
+    history.finish_run(RUN_ID, "failed" if failed else "ok", time.time() - start)
+    summary = history.summary(RUN_ID)
+    history.close()
+    logger.info(summary)
+    print(summary)
+    if failed:
+        logger.error(f"Pipeline stopped at {failed} step")
+        sys.exit(EXIT_CODES[failed.split(":", 1)[0]])
 
+    cache.prune()
     logger.info("Pipeline finished successfully")
@@ -0,0 +1,162 @@
+# POBMUN READER
+# Dedicated reader for the INE pobmun<year>.csv layout (RAW["pobmun"]): a title
+# line, the header, then 7 fixed columns
+#   CPRO, PROVINCIA, CMUN, NOMBRE, POBxx, VARONES / HOMBRES, MUJERES
+# The file is memory-mapped and tokenized with NumPy on the raw bytes instead
+# of read_csv (every column as text) + clean_int_like (string ops per column):
+# - line ends and separators are found with one vectorized comparison each; a
+#   ',' inside a quoted name ("Balears, Illes") is not a separator, because
+#   the number of '"' before it on its line is odd
+# - the 5 number columns go from digits to integers without Python strings:
+#   the digits of each field are gathered into a (fields x digits) matrix and
+#   weighted by powers of ten. '.' (thousands separator) and spaces are
+#   ignored, as in clean_int_like
+# - only the 2 name columns are decoded, all the fields of a column in one go
+# A line without 7 fields, or with something other than digits in a number,
+# is not parsed: it is returned as a BadLine with its byte offset, line number
+# and length in the file (clean_pobmun_file quarantines them, see quarantine.py).
+#
+# usage: df, bad = read_pobmun(Path("data/raw/pobmun2016.csv"))
+
+from __future__ import annotations
+import mmap
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from quarantine import BadLine
+from schemas import INT, MUN_CODE, RAW, validate_header
+
+
+SCHEMA = RAW["pobmun"]
+NAMES = list(SCHEMA.columns)
+# column position -> dtype of the numbers. CPRO keeps room for the 3-digit
+# codes that normalize_cpro divides by 10, so it becomes CODE after that fix
+NUMBER_COLS = {0: "Int16", 2: MUN_CODE, 4: INT, 5: INT, 6: INT}
+TEXT_COLS = (1, 3)
+MAX_DIGITS = 18  # int64
+
+NL, CR, QUOTE, SEP, DOT, SPACE, TAB = (ord(c) for c in '\n\r",. \t')
+
+
+def body_offset(buf: np.ndarray, lines: int) -> int:
+    # byte offset after the first `lines` lines (title + header)
+    ends = np.flatnonzero(buf == NL)[:lines]
+    return int(ends[-1]) + 1 if len(ends) == lines else len(buf)
+
+
+def count_in(positions: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    # how many of the (sorted) positions fall in each [start, end)
+    return np.searchsorted(positions, ends) - np.searchsorted(positions, starts)
+
+
+def prefix_count(mask: np.ndarray) -> np.ndarray:
+    # [i] = how many bytes before position i are in the mask
+    return np.concatenate([[0], np.cumsum(mask, dtype=np.int32)])
+
+
+def parse_numbers(digits_before: np.ndarray, values: np.ndarray, invalid_before: np.ndarray,
+                  starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (values, missing, bad) of the fields [starts, ends), from the prefix counts
+    # of the digits (values: every digit of the body in order) and of the bytes
+    # that cannot be in a number
+    bad = invalid_before[ends] - invalid_before[starts] > 0
+    first = digits_before[starts]
+    count = digits_before[ends] - first
+    bad |= count > MAX_DIGITS
+    count = np.where(bad, 0, count)
+    width = int(count.max()) if len(count) else 0
+
+    # digit j counted from the right of each field, 0 where the field is shorter
+    j = np.arange(width)
+    present = j[None, :] < count[:, None]
+    pos = np.where(present, (first + count)[:, None] - 1 - j[None, :], 0)
+    matrix = np.where(present, values[pos] if len(values) else 0, 0)
+    return matrix @ (10 ** j.astype(np.int64)), count == 0, bad
+
+
+def decode_fields(body: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> pd.arrays.StringArray:
+    # the fields [starts, ends) as strings, decoded in one go: the bytes of every
+    # field + a '\n' (never inside a field) are gathered, decoded and split
+    quoted = (ends - starts >= 2) & (body[starts] == QUOTE) & (body[np.maximum(ends - 1, 0)] == QUOTE)
+    starts, ends = starts + quoted, ends - quoted
+    length = ends - starts + 1
+    offsets = np.cumsum(length) - length
+    idx = np.repeat(starts - offsets, length) + np.arange(int(length.sum()))
+    gathered = body[idx]
+    gathered[offsets + length - 1] = NL
+    text = gathered.tobytes().decode(SCHEMA.encoding).split("\n")[:-1]
+    for i in np.flatnonzero(quoted):
+        text[i] = text[i].replace('""', '"')
+    out = pd.array(text, dtype="string")
+    out[length == 1] = pd.NA
+    return out
+
+
+def tokenize(buf: np.ndarray) -> tuple[pd.DataFrame, list[BadLine]]:
+    start = body_offset(buf, SCHEMA.skiprows + 1)
+    body = buf[start:]
+
+    ends = np.flatnonzero(body == NL)
+    if len(body) and body[-1] != NL:
+        ends = np.append(ends, len(body))
+    starts = np.concatenate([[0], ends[:-1] + 1]).astype(np.int64)
+
+    # separators: the commas with an even number of quotes before them on their line
+    commas = np.flatnonzero(body == SEP)
+    comma_line = np.searchsorted(ends, commas)
+    quotes = np.flatnonzero(body == QUOTE)
+    outside = count_in(quotes, starts[comma_line], commas) % 2 == 0
+    seps, sep_line = commas[outside], comma_line[outside]
+
+    fields = np.bincount(sep_line, minlength=len(ends)) + 1
+    length = ends - starts - (body[np.maximum(ends - 1, 0)] == CR)
+    blank = length <= 0
+    good = (fields == len(NAMES)) & ~blank
+    # line numbers: the body starts after the title and header lines
+    numbers = np.arange(len(starts)) + SCHEMA.skiprows + 2
+    bad = [BadLine(start + int(s), int(n), int(e - s), f"expected {len(NAMES)} fields, found {f}")
+           for s, e, n, f in zip(starts[~good & ~blank], ends[~good & ~blank],
+                                 numbers[~good & ~blank], fields[~good & ~blank])]
+
+    sep_matrix = seps[good[sep_line]].reshape(-1, len(NAMES) - 1)
+    field_start = np.column_stack([starts[good], sep_matrix + 1])
+    field_end = np.column_stack([sep_matrix, ends[good]])
+
+    is_digit = (body >= ord("0")) & (body <= ord("9"))
+    ignored = (body == DOT) | (body == SPACE) | (body == TAB) | (body == CR)
+    values = (body[is_digit] - ord("0")).astype(np.int64)
+    digits_before, invalid_before = prefix_count(is_digit), prefix_count(~is_digit & ~ignored)
+
+    columns, invalid = {}, np.zeros(len(field_start), dtype=bool)
+    for i, dtype in NUMBER_COLS.items():
+        parsed, missing, wrong = parse_numbers(digits_before, values, invalid_before, field_start[:, i], field_end[:, i])
+        info = np.iinfo(dtype.lower())
+        wrong |= (parsed < info.min) | (parsed > info.max)
+        invalid |= wrong
+        columns[NAMES[i]] = (parsed, missing, dtype)
+    for s, e, n in zip(starts[good][invalid], ends[good][invalid], numbers[good][invalid]):
+        bad.append(BadLine(start + int(s), int(n), int(e - s), "value that is not a valid number"))
+
+    keep = ~invalid
+    data = {}
+    for i, name in enumerate(NAMES):
+        if i in TEXT_COLS:
+            data[name] = decode_fields(body, field_start[keep, i], field_end[keep, i])
+        else:
+            parsed, missing, dtype = columns[name]
+            data[name] = pd.arrays.IntegerArray(parsed[keep].astype(dtype.lower()), missing[keep])
+    return pd.DataFrame(data), sorted(bad, key=lambda b: b.offset)
+
+
+def read_pobmun(path: Path) -> tuple[pd.DataFrame, list[BadLine]]:
+    # typed frame of the 7 columns (numbers as nullable ints, names as string) + the lines left out
+    path = Path(path)
+    validate_header(path, SCHEMA)
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        try:
+            return tokenize(buf)
+        finally:
+            del buf  # the view must be gone before the map is closed
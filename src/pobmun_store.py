@@ -0,0 +1,165 @@
+# MUNICIPALITY TIME-SERIES STORE
+# pobmun is a matrix: municipalities x years x (total, male, female).
+# Instead of the long ~138k-row DataFrame, the store keeps
+#   values  int32 [n_municipalities, n_years, 3]   (-1 = year missing)
+#   keys    int64 [n_municipalities]  CPRO * 10000 + MUN_NUMBER, sorted (row map)
+#   years   int16 [n_years]           sorted (column map)
+# saved as .npy files in data/state/pobmun_store/ and memory-mapped on open.
+#
+#   python src/pobmun_store.py          -> (re)build from the staging CSV
+#
+#   store = PobmunStore.open()
+#   store.series(50, 297)               -> [n_years, 3] for one municipality
+#   store.growth(2010, 2020)            -> % growth for every municipality
+#   store.sex_ratio(), store.gaps()     -> vectorized over the whole matrix
+
+from __future__ import annotations
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sampling import data_dir
+from schemas import STAGED, read_csv
+
+
+CSV_POB = data_dir("staging") / "pobmun_combined_transformed.csv"
+STORE_DIR = data_dir("state") / "pobmun_store"
+
+MUN_FACTOR = 10000
+MISSING = -1
+FRAME_COLS = ["CPRO", "MUN_NUMBER", "YEAR", "POBLATION", "MALE", "FEMALE"]
+TOTAL, MALE, FEMALE = 0, 1, 2
+
+
+class PobmunStore:
+    def __init__(self, values: np.ndarray, keys: np.ndarray, years: np.ndarray):
+        self.values = values
+        self.keys = keys
+        self.years = years
+        self._year_col = {int(y): i for i, y in enumerate(years)}
+
+    # building
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "PobmunStore":
+        # long pobmun frame -> matrix; duplicates of (CPRO, MUN_NUMBER, YEAR) keep the MAX, like load_dw
+        df = df[FRAME_COLS].apply(pd.to_numeric, errors="coerce").dropna()
+        arr = df.to_numpy(dtype=np.int64)
+
+        mun_key = arr[:, 0] * MUN_FACTOR + arr[:, 1]
+        keys, rows = np.unique(mun_key, return_inverse=True)
+        years, cols_idx = np.unique(arr[:, 2], return_inverse=True)
+
+        values = np.full((len(keys), len(years), 3), MISSING, dtype=np.int32)
+        for measure in (TOTAL, MALE, FEMALE):
+            np.maximum.at(values[:, :, measure], (rows, cols_idx), arr[:, 3 + measure].astype(np.int32))
+
+        return cls(values, keys.astype(np.int64), years.astype(np.int16))
+
+    @classmethod
+    def build(cls, csv_path: Path = CSV_POB, store_dir: Path = STORE_DIR) -> "PobmunStore":
+        # only the key and measure columns, typed (no names parsed)
+        store = cls.from_frame(read_csv(STAGED["pobmun"], csv_path, usecols=FRAME_COLS))
+        store.save(store_dir, source=csv_path)
+        return store
+
+    def save(self, store_dir: Path = STORE_DIR, source: Path | None = None) -> None:
+        store_dir = Path(store_dir)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        np.save(store_dir / "values.npy", self.values)
+        np.save(store_dir / "keys.npy", self.keys)
+        np.save(store_dir / "years.npy", self.years)
+
+        meta = {"shape": list(self.values.shape)}
+        if source is not None:
+            st = Path(source).stat()
+            meta["source"] = str(source)
+            meta["source_signature"] = [st.st_size, st.st_mtime_ns]
+        tmp = store_dir / "meta.tmp"
+        tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        os.replace(tmp, store_dir / "meta.json")
+
+    @classmethod
+    def open(cls, store_dir: Path = STORE_DIR, csv_path: Path = CSV_POB) -> "PobmunStore":
+        # memory-mapped; rebuilt first if missing or older than the staging CSV
+        store_dir = Path(store_dir)
+        meta_path = store_dir / "meta.json"
+        if csv_path.exists():
+            st = csv_path.stat()
+            meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+            if meta.get("source_signature") != [st.st_size, st.st_mtime_ns]:
+                cls.build(csv_path, store_dir)
+
+        return cls(
+            np.load(store_dir / "values.npy", mmap_mode="r"),
+            np.load(store_dir / "keys.npy", mmap_mode="r"),
+            np.load(store_dir / "years.npy", mmap_mode="r"),
+        )
+
+    # lookups
+    def row(self, cpro: int, mun_number: int) -> int:
+        key = int(cpro) * MUN_FACTOR + int(mun_number)
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            raise KeyError(f"Municipality not found: CPRO={cpro} MUN_NUMBER={mun_number}")
+        return i
+
+    def col(self, year: int) -> int:
+        try:
+            return self._year_col[int(year)]
+        except KeyError:
+            raise KeyError(f"Year not in store: {year}") from None
+
+    def series(self, cpro: int, mun_number: int) -> np.ndarray:
+        return self.values[self.row(cpro, mun_number)]
+
+    def municipalities(self) -> pd.DataFrame:
+        keys = np.asarray(self.keys)
+        return pd.DataFrame({"CPRO": keys // MUN_FACTOR, "MUN_NUMBER": keys % MUN_FACTOR})
+
+    # vectorized analytics (NaN where a year is missing)
+    def measure(self, measure: int = TOTAL) -> np.ndarray:
+        m = np.asarray(self.values[:, :, measure], dtype=np.float64)
+        m[m == MISSING] = np.nan
+        return m
+
+    def growth(self, start: int, end: int, measure: int = TOTAL) -> np.ndarray:
+        m = self.measure(measure)
+        a, b = m[:, self.col(start)], m[:, self.col(end)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(a > 0, (b - a) / a * 100, np.nan)
+
+    def yoy(self, measure: int = TOTAL) -> np.ndarray:
+        # [n_municipalities, n_years - 1], only between consecutive calendar years
+        m = self.measure(measure)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = np.where(m[:, :-1] > 0, (m[:, 1:] - m[:, :-1]) / m[:, :-1] * 100, np.nan)
+        consecutive = np.diff(np.asarray(self.years, dtype=np.int32)) == 1
+        out[:, ~consecutive] = np.nan
+        return out
+
+    def sex_ratio(self) -> np.ndarray:
+        # men per 100 women, [n_municipalities, n_years]
+        male, female = self.measure(MALE), self.measure(FEMALE)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(female > 0, male / female * 100, np.nan)
+
+    def missing(self) -> np.ndarray:
+        return np.asarray(self.values[:, :, TOTAL]) == MISSING
+
+    def gaps(self) -> np.ndarray:
+        # missing years between the first and the last year a municipality appears
+        present = ~self.missing()
+        n_years = present.shape[1]
+        any_present = present.any(axis=1)
+        first = np.argmax(present, axis=1)
+        last = n_years - 1 - np.argmax(present[:, ::-1], axis=1)
+        span = np.where(any_present, last - first + 1, 0)
+        return span - present.sum(axis=1)
+
+
+if __name__ == "__main__":
+    s = PobmunStore.build()
+    print(f"pobmun store built: {s.values.shape[0]} municipalities x {s.values.shape[1]} years -> {STORE_DIR}")
@@ -0,0 +1,165 @@
+# OPT-IN PROFILING
+# Off by default. With PIPELINE_PROFILE=1 (python main.py --profile sets it)
+# every step of the pipeline runs under two profilers:
+#   cProfile        exact call counts and times per function
+#   stack sampler   a thread that records the stack of the main thread every
+#                   PIPELINE_PROFILE_INTERVAL ms (default 5)
+# and writes, per step, to logs/profiles/<run id>/:
+#   <step>.prof        cProfile stats (python -m pstats, snakeviz, ...)
+#   <step>.collapsed   "frame;frame;frame <samples>" lines, the collapsed stack
+#                      format of flamegraph.pl, speedscope and inferno
+# The top PIPELINE_PROFILE_TOP (default 15) functions by own time go to the
+# step's log, so a regression in clean_int_like, the batch inserts, etc. shows
+# up in the run log without opening a profile.
+#
+# The orchestrator starts each step as
+#   python src/profiling.py src/<stage>.py <args>
+# which runs the stage script as __main__ inside profiled(<step>). sharded.py
+# wraps its worker processes in profiled() too (a forked child drops the
+# profiler inherited from its parent and starts its own).
+
+from __future__ import annotations
+import cProfile
+import logging
+import os
+import pstats
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from log_setup import RUN_ENV, STEP_ENV, new_run_id
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PROFILE_ROOT = PROJECT_ROOT / "logs" / "profiles"
+PROFILE_ENV = "PIPELINE_PROFILE"
+
+logger = logging.getLogger(__name__)
+
+# (pid, profiler) of the profile running in this process
+_active: tuple[int, cProfile.Profile] | None = None
+
+
+def enabled() -> bool:
+    return os.getenv(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on")
+
+
+def profile_dir() -> Path:
+    # one folder per pipeline run (a script run by hand gets its own run id)
+    run_id = os.environ.setdefault(RUN_ENV, new_run_id())
+    return PROFILE_ROOT / run_id
+
+
+def frame_label(code) -> str:
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def wrapper_frame(code) -> bool:
+    # frames of the profiling.py runner itself, left out of the stacks
+    return code.co_filename == __file__ or code.co_filename.startswith("<frozen runpy")
+
+
+class StackSampler(threading.Thread):
+    # collapsed stacks of one thread: "root;...;leaf" -> number of samples
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id, self.interval = thread_id, interval
+        self.stacks: Counter[str] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                if not wrapper_frame(frame.f_code):
+                    labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path: Path) -> None:
+        path.write_text("".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common()), encoding="utf-8")
+
+
+def top_functions(stats: pstats.Stats, n: int) -> str:
+    # one line per function: own time, cumulative time, calls, where
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:n]
+    lines = [f"{'own s':>8} {'cum s':>8} {'calls':>9}  function"]
+    for (filename, line, name), (_, calls, own, cum, _) in rows:
+        where = f" ({Path(filename).name}:{line})" if line else ""  # built-ins have no file
+        lines.append(f"{own:>8.3f} {cum:>8.3f} {calls:>9}  {name}{where}")
+    return "\n".join(lines)
+
+
+@contextmanager
+def profiled(step: str):
+    # profile the block when PIPELINE_PROFILE is on (no-op otherwise, or inside another profile)
+    global _active
+    if not enabled() or (_active is not None and _active[0] == os.getpid()):
+        yield
+        return
+    if _active is not None:
+        _active[1].disable()  # inherited through fork, the parent writes its own
+
+    out = profile_dir()
+    out.mkdir(parents=True, exist_ok=True)
+    stem = step.replace(":", "_").replace("/", "_")
+    interval = float(os.getenv("PIPELINE_PROFILE_INTERVAL", "5")) / 1000
+    sampler = StackSampler(threading.get_ident(), interval)
+    profiler = cProfile.Profile()
+    _active = (os.getpid(), profiler)
+
+    start = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        _active = None
+        elapsed = time.perf_counter() - start
+
+        profiler.dump_stats(out / f"{stem}.prof")
+        sampler.write(out / f"{stem}.collapsed")
+        top = int(os.getenv("PIPELINE_PROFILE_TOP", "15"))
+        logger.info("[%s] profiled %.2fs (%d stack samples) -> %s\n%s", step, elapsed,
+                    sum(sampler.stacks.values()), out / f"{stem}.prof",
+                    top_functions(pstats.Stats(profiler), top))
+
+
+def main(argv: list[str]) -> int:
+    # python src/profiling.py <script> [args]: the script as __main__ inside profiled()
+    if not argv:
+        print("usage: python src/profiling.py <script.py> [args...]", file=sys.stderr)
+        return 2
+    script = Path(argv[0]).resolve()
+    step = os.getenv(STEP_ENV) or script.stem
+    sys.argv = [str(script), *argv[1:]]
+    sys.path[0] = str(script.parent)
+    os.environ.setdefault(PROFILE_ENV, "1")
+
+    with profiled(step):
+        try:
+            runpy.run_path(str(script), run_name="__main__")
+        except SystemExit as exc:
+            code = exc.code
+        else:
+            code = 0
+    if code is None or isinstance(code, int):
+        return code or 0
+    print(code, file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,249 @@
+# BAD-LINE QUARANTINE
+# Lines that a parser cannot read are kept instead of only logged:
+#   ingestion   lines of a download with more fields than its header (what
+#               on_bad_lines="warn" used to drop with a warning), before the
+#               raw file is written
+#   transform   lines of a raw pobmun<year>.csv that pobmun_reader rejects
+# Per stage and source, in data/quarantine/ (<name> = <stage>-<source>, e.g.
+# transform-pobmun2016; a source can be in quarantine at both stages):
+#   <name>.lines     the header lines of the source + every bad line as it was
+#                    (same bytes, same dialect), so it reads like a small copy
+#                    of the source with the rejected lines only
+#   <name>.json      the index: stage, origin (URL or raw file), dialect, and
+#                    per line its byte offset and line number in the origin,
+#                    its length, its offset in <name>.lines and the reason
+# A new read of the source at a stage replaces its quarantine of that stage
+# (removed when it is clean), the other stage keeps its own.
+#
+# After a parsing rule is fixed (or a line of <source>.lines is corrected by
+# hand), only the quarantined lines are parsed again:
+#   python src/quarantine.py                        what is quarantined
+#   python src/quarantine.py reprocess [SOURCE ...] re-parse <name>.lines
+#   python main.py --reprocess [SOURCE ...]         the same, then the steps
+#                                                   downstream (see orchestration.py)
+# The lines that parse now are merged where the source would have put them
+# and leave the quarantine:
+#   transform   the rows go through the cleaning of clean_pobmun_file and
+#               replace / join the rows of their year in the pobmun staging file
+#   ingestion   the rows are appended to data/raw/<source>.csv; the transform
+#               of the dataset re-runs because its input changed (economic and
+#               deaths impute with means over every row, they cannot take rows
+#               in the staging file one by one)
+#
+# The quarantine belongs to the raw files, so it is shared with --sample runs,
+# and reprocess is refused there (the merge would only reach the sample).
+#
+# No pandas at import: the orchestrator reads the indexes.
+
+from __future__ import annotations
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+import sampling
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+QUARANTINE_DIR = PROJECT_ROOT / "data" / "quarantine"
+RAW_DIR = PROJECT_ROOT / "data" / "raw"
+# in the order reprocess handles them: repaired download lines go back to the
+# raw file before the transform lines are parsed again
+STAGES = ("ingestion", "transform")
+
+
+@dataclass(frozen=True)
+class BadLine:
+    offset: int   # byte offset of the line in its source
+    line: int     # line number in the source (1 = first line)
+    length: int   # bytes, without the line end
+    reason: str
+
+
+def paths(source: str, stage: str) -> tuple[Path, Path]:
+    return QUARANTINE_DIR / f"{stage}-{source}.lines", QUARANTINE_DIR / f"{stage}-{source}.json"
+
+
+def iter_lines(data: bytes):
+    # (offset, line number, bytes without the '\n') of every line
+    offset = 0
+    for number, line in enumerate(data.split(b"\n"), start=1):
+        if offset == len(data):
+            break
+        yield offset, number, line
+        offset += len(line) + 1
+
+
+def split_bad_lines(data: bytes, sep: str, encoding: str, header_lines: int = 1) -> tuple[bytes, list[BadLine]]:
+    # pandas' rule for on_bad_lines: a line with more fields than the header is
+    # bad (fewer is fine, the missing ones are empty). Returns the other lines
+    # and the bad ones. One record per line: the sources have no quoted line ends
+    good, bad = [], []
+    expected = None
+    for offset, number, line in iter_lines(data):
+        text = line.decode(encoding, errors="replace").rstrip("\r")
+        fields = len(next(csv.reader([text], delimiter=sep), []))
+        if number <= header_lines:
+            expected = fields
+        elif expected is not None and fields > expected:
+            bad.append(BadLine(offset, number, len(line), f"expected {expected} fields, found {fields}"))
+            continue
+        good.append(line)
+    return b"\n".join(good) + b"\n", bad
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def clear(source: str, stage: str) -> None:
+    for path in paths(source, stage):
+        path.unlink(missing_ok=True)
+
+
+def save(source: str, stage: str, origin: str | Path, bad: list[BadLine], header_lines: int,
+         data: bytes | None = None, sep: str = ",", encoding: str = "utf-8") -> Path | None:
+    # quarantine of one read of the source at a stage (data: its bytes, read from origin when None)
+    if not bad:
+        clear(source, stage)
+        return None
+    if data is None:
+        data = Path(origin).read_bytes()
+
+    header = b"".join(line + b"\n" for _, number, line in iter_lines(data) if number <= header_lines)
+    chunks, entries, at = [header], [], len(header)
+    for b in bad:
+        chunks.append(data[b.offset:b.offset + b.length] + b"\n")
+        entries.append({**asdict(b), "at": at})
+        at += b.length + 1
+
+    lines_path, index_path = paths(source, stage)
+    QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+    write_atomic(lines_path, b"".join(chunks))
+    index = {
+        "source": source, "stage": stage, "origin": str(origin), "sep": sep, "encoding": encoding,
+        "header_lines": header_lines, "quarantined": datetime.now().isoformat(timespec="seconds"),
+        "lines": entries,
+    }
+    write_atomic(index_path, json.dumps(index, indent=2, ensure_ascii=False).encode("utf-8"))
+    return lines_path
+
+
+def load_index(source: str, stage: str) -> dict | None:
+    _, index_path = paths(source, stage)
+    return json.loads(index_path.read_text(encoding="utf-8")) if index_path.exists() else None
+
+
+def indexes() -> list[dict]:
+    # the index of everything in quarantine, by stage (STAGES order) and source
+    if not QUARANTINE_DIR.exists():
+        return []
+    return [json.loads(p.read_text(encoding="utf-8"))
+            for stage in STAGES for p in sorted(QUARANTINE_DIR.glob(f"{stage}-*.json"))]
+
+
+def keep_only(index: dict, still_bad: list[BadLine], repaired: int) -> None:
+    # rewrite the quarantine of a source with the lines that still fail (offsets: in
+    # <name>.lines). Its lines match the index entries in order, also when one was
+    # corrected by hand
+    if not still_bad:
+        clear(index["source"], index["stage"])
+        return
+    lines_path, index_path = paths(index["source"], index["stage"])
+    data = lines_path.read_bytes()
+    body = [(offset, line) for offset, number, line in iter_lines(data) if number > index["header_lines"]]
+    position = {offset: i for i, (offset, _) in enumerate(body)}
+
+    header = data[:body[0][0]]
+    chunks, entries, at = [header], [], len(header)
+    for b in still_bad:
+        i = position[b.offset]
+        chunks.append(body[i][1] + b"\n")
+        entries.append({**index["lines"][i], "reason": b.reason, "at": at})
+        at += len(body[i][1]) + 1
+    write_atomic(lines_path, b"".join(chunks))
+    index.update(lines=entries, reprocessed=index.get("reprocessed", 0) + repaired,
+                 updated=datetime.now().isoformat(timespec="seconds"))
+    write_atomic(index_path, json.dumps(index, indent=2, ensure_ascii=False).encode("utf-8"))
+
+
+def reprocess_ingestion(index: dict) -> tuple[int, list[BadLine]]:
+    # the lines that now pass the field count are appended to the raw file, like ingestion writes it
+    import pandas as pd
+
+    lines_path, _ = paths(index["source"], index["stage"])
+    good, bad = split_bad_lines(lines_path.read_bytes(), index["sep"], index["encoding"], index["header_lines"])
+    df = pd.read_csv(io.StringIO(good.decode(index["encoding"], errors="replace")), sep=index["sep"],
+                     dtype=str, keep_default_na=False)
+    if len(df):
+        df.to_csv(RAW_DIR / f"{index['source']}.csv", mode="a", header=False, index=False)
+    return len(df), bad
+
+
+def reprocess_transform(index: dict) -> tuple[int, list[BadLine]]:
+    # lazy import: transformation imports this module
+    from transformation import reprocess_pobmun
+
+    lines_path, _ = paths(index["source"], index["stage"])
+    return reprocess_pobmun(lines_path, index["source"])
+
+
+REPROCESS = {"ingestion": reprocess_ingestion, "transform": reprocess_transform}
+
+
+def reprocess(source: str, stage: str) -> tuple[int, int]:
+    # (rows merged, lines still in quarantine)
+    index = load_index(source, stage)
+    if index is None:
+        return 0, 0
+    repaired, still_bad = REPROCESS[index["stage"]](index)
+    keep_only(index, still_bad, repaired)
+    return repaired, len(still_bad)
+
+
+def describe(index: dict) -> str:
+    reasons = Counter(e["reason"] for e in index["lines"])
+    lines = ", ".join(str(e["line"]) for e in index["lines"][:5]) + (", ..." if len(index["lines"]) > 5 else "")
+    return (f"{index['source']:<28}{index['stage']:<11}{len(index['lines']):>6} lines (line {lines}) "
+            f"{'; '.join(f'{n} x {r}' for r, n in reasons.items())}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Quarantined bad lines, and their reprocessing after a rule fix")
+    parser.add_argument("command", nargs="?", choices=["list", "reprocess"], default="list")
+    parser.add_argument("sources", nargs="*", help="sources to reprocess (default: all)")
+    args = parser.parse_args(argv)
+
+    found = indexes()
+    if args.command == "list":
+        if not found:
+            print(f"Nothing in quarantine ({QUARANTINE_DIR})")
+        for index in found:
+            print(describe(index))
+        return 0
+
+    if sampling.enabled():
+        print("reprocess merges into the full staging files, run it without --sample / PIPELINE_SAMPLE",
+              file=sys.stderr)
+        return 2
+    unknown = set(args.sources) - {index["source"] for index in found}
+    if unknown:
+        print(f"Not in quarantine: {sorted(unknown)}", file=sys.stderr)
+        return 2
+    for index in found:
+        if args.sources and index["source"] not in args.sources:
+            continue
+        repaired, left = reprocess(index["source"], index["stage"])
+        print(f"{index['source']} ({index['stage']}): {repaired} rows merged, {left} lines still in quarantine")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
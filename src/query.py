@@ -0,0 +1,196 @@
+# QUERY LIBRARY OVER THE STAGED STAR SCHEMA
+# Quick questions without the DW or an ad-hoc pandas script:
+#
+#   from query import StagedQuery
+#   q = StagedQuery()
+#   q.population_history(50, 297)          # one municipality across years
+#   q.top_death_causes(28, year=2020)      # top causes in a province
+#   q.select("sector", CPRO=28, YEAR=2020)
+#
+# Each staging table is sorted by its keys once and indexed:
+# - sorted keys (searchsorted ranges) on CPRO and (CPRO, MUN_NUMBER)
+# - hash maps value -> row positions on YEAR and the sector / sex / cause codes
+# The sorted frame and its indexes are persisted in data/state/query_index/ and
+# reused while the staging file is unchanged (size + mtime). Results are kept in
+# an LRU cache that is cleared when any staging file changes.
+
+from __future__ import annotations
+import functools
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sampling import data_dir
+from schemas import STAGED, read_csv
+
+
+DATA_DIR = data_dir("staging")
+INDEX_DIR = data_dir("state") / "query_index"
+
+INDEX_VERSION = 2  # 2: typed reads (string columns are StringDtype)
+CACHE_SIZE = 512
+
+# table -> (staging schema, sort keys, hash-indexed columns)
+TABLES = {
+    "population": ("pobmun", ["CPRO", "MUN_NUMBER", "YEAR"], ["YEAR"]),
+    "deaths": ("deaths", ["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE"], ["YEAR", "SEX", "DEATH_CAUSE_CODE"]),
+    "sector": ("sector", ["CPRO", "YEAR", "ECONOMIC_SECTOR"], ["YEAR", "ECONOMIC_SECTOR"]),
+    "codauto": ("codauto", ["CPRO"], ["CODAUTO"]),
+}
+
+INT_COLS = {"CPRO", "MUN_NUMBER", "YEAR", "CODAUTO", "POBLATION", "MALE", "FEMALE"}
+MUN_FACTOR = 10000  # composite key CPRO * MUN_FACTOR + MUN_NUMBER
+
+
+def file_signature(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def read_table(schema: str, path: Path, sort_keys: list[str]) -> pd.DataFrame:
+    # typed read (Int64 keys), plain int64 where nothing is missing
+    df = read_csv(STAGED[schema], path)
+    df = df.dropna(subset=[c for c in sort_keys if c in INT_COLS])
+    for c in INT_COLS & set(df.columns):
+        if not df[c].isna().any():
+            df[c] = df[c].astype("int64")
+    return df.sort_values(sort_keys, kind="stable").reset_index(drop=True)
+
+
+def hash_index(values: pd.Series) -> dict:
+    # value -> sorted row positions
+    return {k: np.asarray(v, dtype=np.int64) for k, v in values.groupby(values, sort=False).indices.items()}
+
+
+def build_index(df: pd.DataFrame, hashed: list[str]) -> dict:
+    index = {"cpro": df["CPRO"].to_numpy(dtype=np.int64)}
+    if "MUN_NUMBER" in df.columns:
+        index["mun"] = index["cpro"] * MUN_FACTOR + df["MUN_NUMBER"].to_numpy(dtype=np.int64)
+    index["hash"] = {c: hash_index(df[c]) for c in hashed}
+    return index
+
+
+class StagedQuery:
+    def __init__(self, staging_dir: Path = DATA_DIR, index_dir: Path = INDEX_DIR, cache_size: int = CACHE_SIZE):
+        self.staging_dir = Path(staging_dir)
+        self.index_dir = Path(index_dir)
+        self._tables: dict[str, tuple[pd.DataFrame, dict]] = {}
+        self._signatures: dict[str, tuple | None] = {}
+        self._cached = functools.lru_cache(maxsize=cache_size)(self._query)
+
+    # index management
+    def _path(self, table: str) -> Path:
+        return self.staging_dir / STAGED[TABLES[table][0]].path.name
+
+    def _load(self, table: str) -> tuple[pd.DataFrame, dict]:
+        path = self._path(table)
+        sig = file_signature(path)
+        if sig is None:
+            raise FileNotFoundError(f"Staging file not found: {path}")
+
+        pkl = self.index_dir / f"{table}.pkl"
+        if pkl.exists():
+            with pkl.open("rb") as fh:
+                stored = pickle.load(fh)
+            if stored.get("version") == INDEX_VERSION and stored.get("signature") == sig:
+                return stored["frame"], stored["index"]
+
+        schema, sort_keys, hashed = TABLES[table]
+        df = read_table(schema, path, sort_keys)
+        index = build_index(df, hashed)
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp = pkl.with_suffix(".tmp")
+        with tmp.open("wb") as fh:
+            pickle.dump({"version": INDEX_VERSION, "signature": sig, "frame": df, "index": index},
+                        fh, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(pkl)
+        return df, index
+
+    def _check_fresh(self) -> None:
+        # a stat per staging file: if anything changed, drop indexes and cached results
+        changed = False
+        for table in TABLES:
+            sig = file_signature(self._path(table))
+            if self._signatures.get(table, sig) != sig:
+                self._tables.pop(table, None)
+                changed = True
+            self._signatures[table] = sig
+        if changed:
+            self._cached.cache_clear()
+
+    def _table(self, table: str) -> tuple[pd.DataFrame, dict]:
+        if table not in self._tables:
+            self._tables[table] = self._load(table)
+        return self._tables[table]
+
+    def refresh(self) -> None:
+        self._tables.clear()
+        self._signatures.clear()
+        self._cached.cache_clear()
+
+    # lookups
+    def _positions(self, table: str, filters: dict) -> np.ndarray:
+        df, index = self._table(table)
+        cpro = filters.pop("CPRO", None)
+        mun = filters.pop("MUN_NUMBER", None)
+
+        if cpro is not None and mun is not None and "mun" in index:
+            key = int(cpro) * MUN_FACTOR + int(mun)
+            lo, hi = np.searchsorted(index["mun"], [key, key + 1])
+            pos = np.arange(lo, hi)
+        elif cpro is not None:
+            lo, hi = np.searchsorted(index["cpro"], [int(cpro), int(cpro) + 1])
+            pos = np.arange(lo, hi)
+        else:
+            pos = None
+
+        for col, value in filters.items():
+            if col in index["hash"]:
+                hit = index["hash"][col].get(value, np.empty(0, dtype=np.int64))
+                pos = hit if pos is None else np.intersect1d(pos, hit, assume_unique=True)
+            else:
+                base = df if pos is None else df.iloc[pos]
+                mask = (base[col] == value).to_numpy()
+                pos = np.flatnonzero(mask) if pos is None else pos[mask]
+
+        return np.arange(len(df)) if pos is None else pos
+
+    def _query(self, table: str, filters: tuple, by: tuple | None, value: str | None, agg: str | None) -> pd.DataFrame:
+        df, _ = self._table(table)
+        out = df.iloc[self._positions(table, dict(filters))]
+        if by:
+            out = out.groupby(list(by), as_index=False)[value].agg(agg)
+        return out.reset_index(drop=True)
+
+    def select(self, table: str, **filters) -> pd.DataFrame:
+        self._check_fresh()
+        return self._cached(table, tuple(sorted(filters.items())), None, None, None).copy()
+
+    def grouped(self, table: str, by: list[str], value: str, agg: str = "sum", **filters) -> pd.DataFrame:
+        self._check_fresh()
+        return self._cached(table, tuple(sorted(filters.items())), tuple(by), value, agg).copy()
+
+    # common questions
+    def population_history(self, cpro: int, mun_number: int) -> pd.DataFrame:
+        cols = ["YEAR", "MUN_NAME", "POBLATION", "MALE", "FEMALE"]
+        return self.select("population", CPRO=cpro, MUN_NUMBER=mun_number)[cols]
+
+    def province_population(self, cpro: int) -> pd.DataFrame:
+        return self.grouped("population", ["YEAR"], "POBLATION", "sum", CPRO=cpro)
+
+    def top_death_causes(self, cpro: int, year: int | None = None, sex: str = "Total", n: int = 10) -> pd.DataFrame:
+        filters = {"CPRO": cpro, "SEX": sex}
+        if year is not None:
+            filters["YEAR"] = year
+        out = self.grouped("deaths", ["DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME"], "TOTAL", "sum", **filters)
+        return out.nlargest(n, "TOTAL").reset_index(drop=True)
+
+    def sector_share(self, cpro: int, year: int | None = None) -> pd.DataFrame:
+        filters = {"CPRO": cpro} if year is None else {"CPRO": cpro, "YEAR": year}
+        return self.select("sector", **filters)[["YEAR", "ECONOMIC_SECTOR", "TOTAL"]]
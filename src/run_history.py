@@ -0,0 +1,220 @@
+# RUN HISTORY
+# data/state/run_history.sqlite keeps every pipeline run and every step of it:
+#   runs    run_id, started, finished, status, wall_s, argv
+#   steps   run_id, step, status (ok / failed / skipped), duration_s, peak_mb,
+#           rows (JSON {table: rows}), fingerprint (stage cache), inputs_hash
+# The orchestrator measures the duration and the peak RSS of each step
+# subprocess (os.wait4). The row counts come from the step itself: the stages
+# call record_rows(table, n) and, when PIPELINE_METRICS points to a file (set
+# by the orchestrator per step), the counts are written there.
+#
+# compare() checks the steps of a run against the median of the same step in
+# its last RUN_HISTORY_WINDOW (5) successful runs and flags
+#   duration  RUN_HISTORY_DURATION_PCT (50) % slower, and at least
+#             RUN_HISTORY_MIN_SECONDS (1) s, so tiny steps do not flap
+#   rows      a table whose row count moves more than RUN_HISTORY_ROWS_PCT (5) %
+#   peak_mb   RUN_HISTORY_MEMORY_PCT (50) % more memory
+# A step needs RUN_HISTORY_MIN_RUNS (2) earlier runs before it is compared.
+#
+#   python src/run_history.py [--runs 10]   last runs + the comparison of the latest one
+#
+# No pandas here: it is imported by the orchestrator.
+
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import statistics
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from sampling import data_dir
+
+
+HISTORY_PATH = data_dir("state") / "run_history.sqlite"
+METRICS_DIR = data_dir("state") / "run_metrics"
+METRICS_ENV = "PIPELINE_METRICS"
+
+WINDOW = int(os.getenv("RUN_HISTORY_WINDOW", "5"))
+MIN_RUNS = int(os.getenv("RUN_HISTORY_MIN_RUNS", "2"))
+DURATION_PCT = float(os.getenv("RUN_HISTORY_DURATION_PCT", "50"))
+MIN_SECONDS = float(os.getenv("RUN_HISTORY_MIN_SECONDS", "1"))
+ROWS_PCT = float(os.getenv("RUN_HISTORY_ROWS_PCT", "5"))
+MEMORY_PCT = float(os.getenv("RUN_HISTORY_MEMORY_PCT", "50"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY, started TEXT, finished TEXT, status TEXT, wall_s REAL, argv TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id TEXT, step TEXT, status TEXT, started TEXT, duration_s REAL, peak_mb REAL,
+    rows TEXT, fingerprint TEXT, inputs_hash TEXT,
+    PRIMARY KEY (run_id, step)
+);
+CREATE INDEX IF NOT EXISTS steps_by_step ON steps (step, status);
+"""
+
+
+def record_rows(table: str, rows: int) -> None:
+    # called by the stages: row count of a table they produced (no-op outside the orchestrator)
+    path = os.getenv(METRICS_ENV)
+    if not path:
+        return
+    path = Path(path)
+    counts = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    counts[table] = int(rows)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(counts), encoding="utf-8")
+
+
+def metrics_path(run_id: str, step: str) -> Path:
+    return METRICS_DIR / f"{run_id}.{step.replace(':', '_')}.json"
+
+
+def read_metrics(path: Path) -> dict[str, int]:
+    # row counts reported by a step (the file is removed once read)
+    if not path.exists():
+        return {}
+    counts = json.loads(path.read_text(encoding="utf-8"))
+    path.unlink()
+    return counts
+
+
+def inputs_hash(file_hashes: list[str | None]) -> str:
+    return hashlib.sha256("\n".join(h or "-" for h in file_hashes).encode()).hexdigest()[:16]
+
+
+@dataclass
+class Flag:
+    step: str
+    metric: str
+    value: float
+    baseline: float
+    note: str = ""
+
+    def __str__(self) -> str:
+        pct = (self.value - self.baseline) / self.baseline * 100 if self.baseline else float("inf")
+        return f"{self.step}: {self.metric} {self.value:g} vs {self.baseline:g} ({pct:+.0f}%){self.note}"
+
+
+class RunHistory:
+    def __init__(self, path: Path = HISTORY_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.cn = sqlite3.connect(path)
+        self.cn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.cn.close()
+
+    def start_run(self, run_id: str, argv: list[str]) -> None:
+        self.cn.execute("INSERT OR REPLACE INTO runs (run_id, started, status, argv) VALUES (?, ?, 'running', ?)",
+                        (run_id, datetime.now().isoformat(timespec="seconds"), json.dumps(argv)))
+        self.cn.commit()
+
+    def finish_run(self, run_id: str, status: str, wall_s: float) -> None:
+        self.cn.execute("UPDATE runs SET finished = ?, status = ?, wall_s = ? WHERE run_id = ?",
+                        (datetime.now().isoformat(timespec="seconds"), status, round(wall_s, 3), run_id))
+        self.cn.commit()
+
+    def record_step(self, run_id: str, step: str, status: str, duration_s: float | None = None,
+                    peak_mb: float | None = None, rows: dict[str, int] | None = None,
+                    fingerprint: str | None = None, inputs: str | None = None) -> None:
+        self.cn.execute(
+            "INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, step, status, datetime.now().isoformat(timespec="seconds"),
+             None if duration_s is None else round(duration_s, 3),
+             None if peak_mb is None else round(peak_mb, 1),
+             json.dumps(rows or {}, sort_keys=True), fingerprint, inputs),
+        )
+        self.cn.commit()
+
+    def steps(self, run_id: str) -> list[tuple]:
+        return self.cn.execute(
+            "SELECT step, status, duration_s, peak_mb, rows, inputs_hash FROM steps WHERE run_id = ? ORDER BY rowid",
+            (run_id,),
+        ).fetchall()
+
+    def baseline(self, run_id: str, step: str, window: int = WINDOW) -> list[tuple]:
+        # last successful executions of the step in earlier runs
+        return self.cn.execute(
+            "SELECT duration_s, peak_mb, rows, inputs_hash FROM steps "
+            "WHERE step = ? AND status = 'ok' AND run_id != ? ORDER BY rowid DESC LIMIT ?",
+            (step, run_id, window),
+        ).fetchall()
+
+    def compare(self, run_id: str) -> list[Flag]:
+        flags = []
+        for step, status, duration, peak, rows, inputs in self.steps(run_id):
+            if status != "ok":
+                continue
+            base = self.baseline(run_id, step)
+            if len(base) < MIN_RUNS:
+                continue
+
+            med = statistics.median(b[0] for b in base)
+            if duration > med * (1 + DURATION_PCT / 100) and duration - med >= MIN_SECONDS:
+                flags.append(Flag(step, "duration s", duration, round(med, 2)))
+
+            peaks = [b[1] for b in base if b[1] is not None]
+            if peak is not None and peaks:
+                med = statistics.median(peaks)
+                if peak > med * (1 + MEMORY_PCT / 100):
+                    flags.append(Flag(step, "peak MB", peak, med))
+
+            note = "" if inputs == base[0][3] else " (inputs changed)"
+            base_rows = [json.loads(b[2]) for b in base]
+            for table, n in json.loads(rows).items():
+                history = [r[table] for r in base_rows if table in r]
+                if len(history) < MIN_RUNS:
+                    continue
+                med = statistics.median(history)
+                if abs(n - med) > med * ROWS_PCT / 100:
+                    flags.append(Flag(step, f"rows {table}", n, med, note))
+        return flags
+
+    def summary(self, run_id: str) -> str:
+        run = self.cn.execute("SELECT status, wall_s FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        steps = self.steps(run_id)
+        ran = [s for s in steps if s[1] != "skipped"]
+        lines = [f"Run {run_id}: {run[0] if run else '?'} in {(run[1] or 0) if run else 0:.2f}s, "
+                 f"{len(ran)} steps run, {len(steps) - len(ran)} up to date"]
+        if ran:
+            lines.append(f"  {'step':<34}{'status':>8}{'seconds':>9}{'peak MB':>9}  rows")
+        for step, status, duration, peak, rows, _ in ran:
+            counts = ", ".join(f"{t}={n}" for t, n in json.loads(rows).items())
+            lines.append(f"  {step:<34}{status:>8}{duration or 0:>9.2f}{peak or 0:>9.1f}  {counts}")
+
+        flags = self.compare(run_id)
+        if flags:
+            lines.append(f"Regressions vs the median of the last {WINDOW} successful runs of each step:")
+            lines.extend(f"  {f}" for f in flags)
+        elif ran:
+            lines.append(f"No regressions vs the last {WINDOW} successful runs of each step")
+        return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Recent pipeline runs and regressions of the latest one")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    history = RunHistory()
+    runs = history.cn.execute(
+        "SELECT run_id, started, status, wall_s FROM runs ORDER BY started DESC LIMIT ?", (args.runs,)
+    ).fetchall()
+    if not runs:
+        print(f"No runs recorded in {HISTORY_PATH}")
+        return 0
+    for run_id, started, status, wall in runs:
+        print(f"{run_id}  {started}  {status:<8}{wall or 0:>8.2f}s")
+    print()
+    print(history.summary(runs[0][0]))
+    history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
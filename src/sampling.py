@@ -0,0 +1,61 @@
+# DEVELOPMENT SAMPLE
+# PIPELINE_SAMPLE (python main.py --sample [CPROS]) runs the whole pipeline on
+# a fixed set of provinces, across all the years:
+#   PIPELINE_SAMPLE=auto       one province per autonomous community, the lowest
+#                              CPRO of each in codauto_cpro.csv (19 provinces,
+#                              ~29% of pobmun, every autonomy in the aggregates)
+#   PIPELINE_SAMPLE=28,8,46    these provinces
+# transformation.py drops the rows of the other provinces (pobmun per yearly
+# file, economic and deaths before writing). Every step after the per-file
+# cleaning is row by row, so the sampled staging files are exactly the rows
+# of the full ones for those provinces. codauto stays complete, so dim_province
+# and dim_autonomy have every member a fact can reference.
+#
+# A sample never touches the real data: staging, state (dim cache, key maps,
+# stage cache, run history) and rejects go to data/sample/, and the warehouse
+# is always the SQLite file warehouse/dw_sample.sqlite.
+
+from __future__ import annotations
+import functools
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # no pandas import: stage_cache / run_history use data_dir() on no-op runs
+    import pandas as pd
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_ENV = "PIPELINE_SAMPLE"
+SAMPLE_DIR = PROJECT_ROOT / "data" / "sample"
+SAMPLE_WAREHOUSE = PROJECT_ROOT / "warehouse" / "dw_sample.sqlite"
+
+
+def spec() -> str | None:
+    return os.getenv(SAMPLE_ENV, "").strip() or None
+
+
+def enabled() -> bool:
+    return spec() is not None
+
+
+def data_dir(name: str) -> Path:
+    # data/<name>, or data/sample/<name> in sample mode
+    return (SAMPLE_DIR if enabled() else PROJECT_ROOT / "data") / name
+
+
+@functools.lru_cache(maxsize=None)
+def provinces(value: str) -> frozenset[int]:
+    if value.lower() != "auto":
+        return frozenset(int(v) for v in value.replace(" ", "").split(",") if v)
+    # lazy import: schemas is not needed to know the paths
+    from schemas import RAW, read_csv
+    codauto = read_csv(RAW["codauto"], usecols=["CODAUTO", "CPRO"]).dropna()
+    return frozenset(int(c) for c in codauto.astype("int64").groupby("CODAUTO")["CPRO"].min())
+
+
+def sample_rows(df: pd.DataFrame, cpro: pd.Series) -> pd.DataFrame:
+    # the rows of the sampled provinces (all of them outside sample mode); cpro: normalized codes
+    if not enabled():
+        return df
+    return df[cpro.isin(provinces(spec())).fillna(False).to_numpy()]
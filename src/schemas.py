@@ -0,0 +1,234 @@
+# SCHEMA REGISTRY
+# Names, dtypes and CSV dialect of every file the pipeline reads:
+#
+#   RAW      the INE files in data/raw, read as text: transformation.py owns the
+#            parsing, so a code like "08" or a count like "2.467" never goes
+#            through a guessed int or float first (pandas used to infer float
+#            for CPRO / CMUN in 2009 and 2016 because of the blank "Total"
+#            rows, "73" came back as "73.0" and the digits were shifted)
+#   STAGED   the files written by transformation.py and aggregates.py, read
+#            straight into their final types (CPRO is a small int once, not
+#            string -> number -> string)
+#
+# read_csv() checks the header of the file against the schema before parsing,
+# so a renamed or moved column fails with the file name instead of a KeyError
+# further down. Only the columns a reader asks for (usecols) are parsed.
+
+from __future__ import annotations
+import csv
+import importlib.util
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sampling import data_dir
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RAW_DIR = PROJECT_ROOT / "data" / "raw"
+STAGING_DIR = data_dir("staging")
+
+# pyarrow's multithreaded parser when it is installed, the C parser otherwise
+ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+TEXT = "string"
+INT = "Int64"
+FLOAT = "float64"
+# geographic codes stay compact integers from the raw text to the insert:
+# provinces (CPRO 1-52) and autonomies (CODAUTO 1-19) fit in Int8, municipality
+# numbers (MUN_NUMBER 1-999) in Int16. A zero-padded "08" is only display.
+CODE = "Int8"
+MUN_CODE = "Int16"
+# bitmask of the imputed measures (imputation.py)
+FLAGS = "UInt8"
+INT_TYPES = (INT, CODE, MUN_CODE, FLAGS)
+
+# the C parser reads nullable ints through Python objects (~8x slower than
+# float64), so there they are parsed as float64 and masked afterwards
+C_PARSE_AS = {t: "float64" for t in INT_TYPES}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Schema:
+    columns: dict[str, str]                 # name -> dtype, in file order
+    path: Path | None = None                # default file (None: one file per year)
+    sep: str = ","
+    skiprows: int = 0                       # lines before the header
+    encoding: str = "utf-8"
+    na_values: tuple[str, ...] = ("",)      # the only tokens read as missing
+    header: tuple[str, ...] | None = None   # regex per column when the file names them differently
+
+    def expected_header(self) -> tuple[str, ...]:
+        return self.header or tuple(re.escape(c) for c in self.columns)
+
+
+RAW = {
+    # pobmun<year>.csv: a title line, then a header that changes with the year
+    # (POB08 / AMBOS SEXOS, VARONES / HOMBRES), so the columns go by position
+    "pobmun": Schema(
+        columns={
+            "CPRO": TEXT, "CPRO_NAME": TEXT, "MUN_NUMBER": TEXT, "MUN_NAME": TEXT,
+            "POBLATION": TEXT, "MALE": TEXT, "FEMALE": TEXT,
+        },
+        skiprows=1,
+        header=("CPRO", "PROVINCIA", "CMUN", "NOMBRE", r"POB\d{2}|AMBOS\s+SEXOS", "VARONES|HOMBRES", "MUJERES"),
+    ),
+    "codauto": Schema(
+        columns={"CODAUTO": TEXT, "CODAUTO_NAME": TEXT, "CPRO": TEXT, "CPRO_NAME": TEXT},
+        path=RAW_DIR / "codauto_cpro.csv",
+        sep=";",
+    ),
+    # INE tables: ".." is a secret / not available value
+    "economic": Schema(
+        columns={"Provincias": TEXT, "Sector económico": TEXT, "Periodo": TEXT, "Total": TEXT},
+        path=RAW_DIR / "economic_sector_province.csv",
+        na_values=("", ".."),
+    ),
+    "deaths": Schema(
+        columns={"Causa de muerte": TEXT, "Sexo": TEXT, "Provincias": TEXT, "Periodo": TEXT, "Total": TEXT},
+        path=RAW_DIR / "death_causes_province.csv",
+        na_values=("", ".."),
+    ),
+}
+
+POPULATION_AGG = {
+    "YEAR": INT, "POPULATION_TOTAL": INT, "MALE_TOTAL": INT, "FEMALE_TOTAL": INT,
+    "MUNICIPALITIES": INT, "SEX_RATIO": FLOAT, "POPULATION_YOY_PCT": FLOAT,
+}
+
+STAGED = {
+    "codauto": Schema(
+        columns={"CODAUTO": CODE, "CODAUTO_NAME": TEXT, "CPRO": CODE, "CPRO_NAME": TEXT},
+        path=STAGING_DIR / "codauto_cpro_transformed.csv",
+    ),
+    "deaths": Schema(
+        columns={
+            "SEX": TEXT, "YEAR": INT, "TOTAL": INT, "IMPUTED": FLAGS, "CPRO": CODE, "CPRO_NAME": TEXT,
+            "DEATH_CAUSE_CODE": TEXT, "DEATH_CAUSE_NAME": TEXT,
+        },
+        path=STAGING_DIR / "death_causes_province_transformed.csv",
+    ),
+    "sector": Schema(
+        columns={"CPRO": CODE, "CPRO_NAME": TEXT, "ECONOMIC_SECTOR": TEXT, "YEAR": INT, "TOTAL": FLOAT,
+                 "IMPUTED": FLAGS},
+        path=STAGING_DIR / "economic_sector_province_transformed.csv",
+    ),
+    "pobmun": Schema(
+        columns={
+            "CPRO": CODE, "CPRO_NAME": TEXT, "MUN_NUMBER": MUN_CODE, "MUN_NAME": TEXT,
+            "POBLATION": INT, "MALE": INT, "FEMALE": INT, "YEAR": INT,
+        },
+        path=STAGING_DIR / "pobmun_combined_transformed.csv",
+    ),
+    "agg_population_province_year": Schema(
+        columns={"CPRO": CODE, **POPULATION_AGG},
+        path=STAGING_DIR / "agg_population_province_year.csv",
+    ),
+    "agg_population_autonomy_year": Schema(
+        columns={"CODAUTO": CODE, **POPULATION_AGG},
+        path=STAGING_DIR / "agg_population_autonomy_year.csv",
+    ),
+    "agg_economic_sector_autonomy_year": Schema(
+        columns={"CODAUTO": CODE, "YEAR": INT, "ECONOMIC_SECTOR": TEXT, "AVG_VALUE": FLOAT, "PROVINCES": INT},
+        path=STAGING_DIR / "agg_economic_sector_autonomy_year.csv",
+    ),
+    "agg_deaths_autonomy_year": Schema(
+        columns={"CODAUTO": CODE, "YEAR": INT, "SEX": TEXT, "DEATH_CAUSE_CODE": TEXT, "TOTAL_DEATHS": INT},
+        path=STAGING_DIR / "agg_deaths_autonomy_year.csv",
+    ),
+}
+
+
+def read_header(path: Path, schema: Schema) -> list[str]:
+    with open(path, encoding=schema.encoding, newline="") as fh:
+        for _ in range(schema.skiprows):
+            fh.readline()
+        line = fh.readline()
+    return [c.strip() for c in next(csv.reader([line], delimiter=schema.sep), [])]
+
+
+def validate_header(path: Path, schema: Schema) -> None:
+    found = read_header(path, schema)
+    expected = schema.expected_header()
+    if len(found) != len(expected) or not all(re.fullmatch(p, c) for p, c in zip(expected, found)):
+        raise SchemaError(f"{path}: unexpected header {found}, the schema expects {list(expected)}")
+
+
+def to_int(values: pd.Series, dtype: str, path: Path) -> pd.Series:
+    # float64 column (NaN = missing) -> nullable int of the schema without a second pass through objects
+    v = values.to_numpy()
+    missing = np.isnan(v)
+    present = v[~missing]
+    info = np.iinfo(dtype.lower())
+    if (present % 1 != 0).any():
+        raise SchemaError(f"{path}: column {values.name} has non-integer values")
+    if len(present) and (present.min() < info.min or present.max() > info.max):
+        raise SchemaError(f"{path}: column {values.name} has values outside {dtype}")
+    return pd.Series(pd.arrays.IntegerArray(np.where(missing, 0, v).astype(dtype.lower()), missing),
+                     index=values.index, name=values.name)
+
+
+def read_csv(schema: Schema, path: Path | None = None, usecols: list[str] | None = None) -> pd.DataFrame:
+    # typed read: header checked first, then only usecols parsed with their declared dtypes
+    path = Path(path) if path is not None else schema.path
+    if path is None:
+        raise ValueError("This schema has no default file, pass the path")
+
+    names = list(schema.columns)
+    usecols = list(usecols) if usecols is not None else names
+    unknown = [c for c in usecols if c not in schema.columns]
+    if unknown:
+        raise SchemaError(f"{path}: columns {unknown} are not in the schema {names}")
+
+    validate_header(path, schema)
+    dtypes = {c: schema.columns[c] for c in usecols}
+    if ENGINE == "c":
+        dtypes = {c: C_PARSE_AS.get(t, t) for c, t in dtypes.items()}
+
+    df = pd.read_csv(
+        path,
+        sep=schema.sep,
+        encoding=schema.encoding,
+        skiprows=schema.skiprows + 1,  # the header was validated, the schema names the columns
+        header=None,
+        names=names,
+        usecols=usecols,
+        dtype=dtypes,
+        na_values=list(schema.na_values),
+        keep_default_na=False,
+        engine=ENGINE,
+    )
+    for c in usecols:
+        if schema.columns[c] in INT_TYPES and dtypes[c] != schema.columns[c]:
+            df[c] = to_int(df[c], schema.columns[c], path)
+    return df
+
+
+def read_csv_chunks(schema: Schema, path: Path | None = None, chunksize: int = 5000,
+                    usecols: list[str] | None = None):
+    # read_csv() in chunks of rows, for the text (RAW) schemas: the C parser,
+    # pyarrow does not stream
+    path = Path(path) if path is not None else schema.path
+    if any(schema.columns[c] != TEXT for c in (usecols or schema.columns)):
+        raise ValueError(f"{path}: read_csv_chunks reads text columns only")
+    validate_header(path, schema)
+    names = list(schema.columns)
+    yield from pd.read_csv(
+        path,
+        sep=schema.sep,
+        encoding=schema.encoding,
+        skiprows=schema.skiprows + 1,
+        header=None,
+        names=names,
+        usecols=list(usecols) if usecols is not None else names,
+        dtype=TEXT,
+        na_values=list(schema.na_values),
+        keep_default_na=False,
+        chunksize=chunksize,
+    )
@@ -0,0 +1,279 @@
+# SHARDED EXECUTION
+# pobmun (the table that grows with the data) is partitioned by province,
+# shard = CPRO % N, and every shard is transformed and loaded end to end by
+# its own worker process:
+#
+#   1. partition   a pool cleans each yearly raw file once (clean_pobmun_file)
+#                  and splits its rows into one piece per shard
+#   2. shards      N processes: combine their pieces (finish_pobmun), dedupe per
+#                  (CPRO, MUN_NUMBER, YEAR), then load dim_municipality and
+#                  fact_population_municipality for their provinces only
+#   3. coordinator meanwhile transforms codauto / economic / deaths (their
+#                  imputations use national means, they stay in one process),
+#                  loads the global dims once (dim_time needs the years of every
+#                  shard, so the shards wait for it before loading) and the
+#                  province-level facts, and at the end rebuilds the combined
+#                  staging file and the aggregates
+#
+# The warehouse ends up with the same rows as load_dw.py. Every shard load is
+# journaled under its own name (fact_population_municipality/shard1of4), so
+# shards resume independently and never delete each other's rows.
+#
+#   python src/sharded.py --shards 4
+
+from __future__ import annotations
+import argparse
+import logging
+import multiprocessing as mp
+import shutil
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from log_setup import configure_logging
+
+# logging (before the stage modules, so this process logs to sharded.log; the
+# forked partition and shard workers get their own listener, see log_setup.py)
+configure_logging("sharded", text_format="%(asctime)s - %(levelname)s - %(process)d - %(message)s")
+logger = logging.getLogger(__name__)
+
+import aggregates  # noqa: E402
+import integrity  # noqa: E402
+import load_dw  # noqa: E402
+import transformation as tr  # noqa: E402
+from dim_cache import DimCache  # noqa: E402
+from load_journal import LoadJournal, clear_journal, rows_key  # noqa: E402
+from profiling import profiled  # noqa: E402
+from sampling import data_dir  # noqa: E402
+from surrogate_keys import load_key_map  # noqa: E402
+
+
+SHARD_DIR = data_dir("state") / "shards"
+CSV_POB = load_dw.CSV_POB
+
+DEFAULT_SHARDS = 4
+PROVINCE_FACTS = ["fact_deaths", "fact_economic_sector"]
+
+
+def shard_key(cpro: pd.Series, shards: int) -> pd.Series:
+    # shard of every row from its final CPRO (same element-wise normalization as
+    # finish_pobmun); rows without CPRO go to shard 0, where they are dropped
+    return tr.normalize_cpro(cpro).fillna(0).astype("int64") % shards
+
+
+def piece_path(stem: str, shard: int) -> Path:
+    return SHARD_DIR / f"{stem}.{shard}.pkl"
+
+
+def shard_scope(shard: int, shards: int) -> tuple[str, tuple[str, list]]:
+    return f"shard{shard}of{shards}", ("CPRO % ? = ?", [shards, shard])
+
+
+# 1. partition (one task per raw file)
+def partition_file(args: tuple[str, int]) -> int:
+    path, shards = args
+    f = Path(path)
+    with profiled(f"sharded:partition:{f.stem}"):
+        df = tr.clean_pobmun_file(f)
+        key = shard_key(df["CPRO"], shards).to_numpy()
+        for k in range(shards):
+            df[key == k].to_pickle(piece_path(f.stem, k))
+    return len(df)
+
+
+# 2. shards
+def load_shard(cn, cur, shard: int, shards: int, mun: pd.DataFrame, fact: pd.DataFrame) -> None:
+    part, where = shard_scope(shard, shards)
+
+    # new municipalities for this shard: its facts are deleted first (FK)
+    mun_journal = LoadJournal(f"dim_municipality/{part}", rows_key(load_dw.INSERTS["dim_municipality"][1](mun)))
+    if mun_journal.committed(cur) < len(mun):
+        cur.execute(f"DELETE FROM dw.fact_population_municipality WHERE {where[0]};", where[1])
+        clear_journal(cur, f"fact_population_municipality/{part}")
+        cn.commit()
+
+    load_dw.insert_table_resumable(cur, "dim_municipality", mun, part, where)
+    load_dw.insert_table_resumable(cur, "fact_population_municipality", fact, part, where)
+    cn.commit()
+
+
+def run_shard(shard: int, shards: int, stems: list[str], years_q, dims_ready, abort, results_q) -> None:
+    start = time.time()
+    sent_years = False
+    try:
+        pieces = [pd.read_pickle(piece_path(stem, shard)) for stem in stems]
+        df = tr.finish_pobmun(pieces)
+        out = SHARD_DIR / f"pobmun_{shard}.csv"
+        df.to_csv(out, index=False)
+
+        # same read + normalization as the single-process load
+        data = load_dw.read_staging({"pobmun"}, paths={"pobmun": out})
+        years_q.put((shard, sorted(int(y) for y in data["pobmun"]["YEAR"].dropna().unique())))
+        sent_years = True
+        transformed = time.time()
+
+        # the global dims (dim_time, dim_province) must exist before the shard loads
+        dims_ready.wait()
+        if abort.is_set():
+            return
+
+        # checked against the dims the coordinator just loaded, before connecting
+        part = shard_scope(shard, shards)[0]
+        dims = DimCache.load().frames
+        mun = integrity.check("dim_municipality", load_dw.build_dim_municipality(data["pobmun"]), dims, part)
+        fact = integrity.check("fact_population_municipality",
+                               load_dw.build_fact("fact_population_municipality", data, None),
+                               {**dims, "dim_municipality": mun}, part)
+
+        cn = load_dw.BACKEND.connect()
+        try:
+            cur = cn.cursor()
+            load_dw.BACKEND.prepare_cursor(cur)
+            load_shard(cn, cur, shard, shards, mun, fact)
+        except Exception:
+            cn.rollback()
+            raise
+        finally:
+            cn.close()
+
+        results_q.put((shard, "ok", {
+            "rows": len(fact), "municipalities": len(mun),
+            "transform_s": round(transformed - start, 2), "load_s": round(time.time() - transformed, 2),
+        }))
+    except Exception as exc:
+        logger.exception("shard %d failed", shard)
+        if not sent_years:
+            years_q.put((shard, None))
+        results_q.put((shard, "error", str(exc)))
+
+
+def shard_process(shard: int, shards: int, *args) -> None:
+    # target of the shard processes
+    with profiled(f"sharded:{shard_scope(shard, shards)[0]}"):
+        run_shard(shard, shards, *args)
+
+
+def combine_staging(shards: int, target: Path = CSV_POB) -> int:
+    # the combined staging file (aggregates, query.py, pobmun_store.py read it):
+    # the shard CSVs one after the other, a single header
+    rows = 0
+    tmp = target.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8", newline="") as out:
+        for k in range(shards):
+            with (SHARD_DIR / f"pobmun_{k}.csv").open(encoding="utf-8", newline="") as fh:
+                header = fh.readline()
+                if k == 0:
+                    out.write(header)
+                for line in fh:
+                    out.write(line)
+                    rows += 1
+    tmp.replace(target)
+    return rows
+
+
+# 3. coordinator
+def main(shards: int = DEFAULT_SHARDS) -> int:
+    start_ts = time.time()
+    logger.info("==== sharded START (%d shards) ====", shards)
+
+    files = sorted(tr.RAW_DIR.glob("pobmun*.csv*"))
+    stems = [f.stem for f in files]
+    shutil.rmtree(SHARD_DIR, ignore_errors=True)
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    tr.STAGING_DIR.mkdir(parents=True, exist_ok=True)
+
+    with mp.Pool(processes=shards) as pool:
+        raw_rows = sum(pool.map(partition_file, [(str(f), shards) for f in files]))
+    partitioned = time.time()
+    logger.info("Partitioned %d rows of %d files into %d shards in %.2fs",
+                raw_rows, len(files), shards, partitioned - start_ts)
+
+    years_q, results_q = mp.Queue(), mp.Queue()
+    dims_ready, abort = mp.Event(), mp.Event()
+    procs = [
+        mp.Process(target=shard_process, args=(k, shards, stems, years_q, dims_ready, abort, results_q))
+        for k in range(shards)
+    ]
+    for p in procs:
+        p.start()
+
+    key_map = load_key_map()
+    layout = f"shards:{shards}"
+    cn = None
+    try:
+        # province-level datasets, while the shards transform
+        tr.transform_codauto()
+        tr.transform_economic()
+        tr.transform_deaths()
+        data = load_dw.read_staging({"codauto", "deaths", "sector"})
+
+        years: set[int] = set()
+        for _ in range(shards):
+            shard, shard_years = years_q.get()
+            if shard_years is None:
+                raise RuntimeError(f"shard {shard} failed during transformation")
+            years.update(shard_years)
+        data["pobmun"] = pd.DataFrame({"YEAR": pd.array(sorted(years), dtype="Int64")})
+
+        dims = load_dw.build_dims(data, key_map, municipality=False)
+        cache = load_dw.precheck_dims(dims, DimCache.load(layout))
+        facts = {name: load_dw.build_fact(name, data, cache) for name in PROVINCE_FACTS}
+        load_dw.precheck(facts, cache)
+
+        logger.info(f"Connecting to warehouse: {load_dw.BACKEND.describe()}")
+        cn = load_dw.BACKEND.connect()
+        cur = cn.cursor()
+        load_dw.BACKEND.prepare_cursor(cur)
+
+        load_dw.load_step(cn, cur, "dims", dims, layout=layout)
+        dims_ready.set()
+        for name, fact in facts.items():
+            load_dw.load_step(cn, cur, name, {name: fact})
+    except Exception:
+        abort.set()
+        dims_ready.set()
+        logger.exception("ERROR in the coordinator, shards aborted")
+        for p in procs:
+            p.join()
+        if cn is not None:
+            cn.close()
+        raise
+
+    results = [results_q.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    failed = [(k, msg) for k, status, msg in results if status != "ok"]
+    if failed:
+        cn.close()
+        logger.error("Shards failed (rerun to resume them): %s", failed)
+        return 4
+
+    for k, _, stats in sorted(results):
+        logger.info("shard %d -> %s", k, stats)
+    loaded = sum(stats["rows"] for _, _, stats in results)
+
+    # combined staging + aggregates, like the single-process pipeline
+    combined = combine_staging(shards)
+    aggregates.main()
+    cache = DimCache.load(layout)
+    aggs = load_dw.prepare_step("aggregates", key_map, cache)
+    load_dw.precheck(aggs, cache)
+    load_dw.load_step(cn, cur, "aggregates", aggs)
+    cn.close()
+
+    elapsed = time.time() - start_ts
+    logger.info("Combined staging: %d rows -> %s", combined, CSV_POB)
+    logger.info("==== sharded SUCCESS in %.2fs: %d population rows (%.0f rows/s) ====",
+                elapsed, loaded, loaded / max(elapsed, 1e-6))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transform + load pobmun in province shards")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    args = parser.parse_args()
+    with profiled("sharded"):
+        code = main(args.shards)
+    raise SystemExit(code)
@@ -0,0 +1,188 @@
+# STAGE MEMOIZATION
+# Every pipeline step gets a fingerprint (sha256) of what determines its result:
+#   - the source of the scripts it runs (ingestion.py, load_dw.py + helpers, schema, ...)
+#   - its command line and the config values it depends on (env vars)
+#   - the content of its input files
+#   - the result of its dependencies (content of their outputs, or the id of their
+#     last execution for steps that only write to the warehouse, so reloading dims
+#     also reloads the facts)
+# A successful run stores its output files by content hash in objects/ and a
+# manifest under the fingerprint. A step whose fingerprint has a manifest is
+# skipped, its outputs are restored from objects/ if they were changed or deleted.
+#
+# data/state/stage_cache/
+#   objects/ab/cdef...          output files by sha256
+#   runs/<step>/<fingerprint>.json   {"outputs": {path: sha256}, "run": id, "finished": ...}
+#   latest.json                 step -> fingerprint and id of its last execution
+#   file_hashes.json            path -> [size, mtime_ns, sha256] (no re-hashing of unchanged files)
+#
+# No pandas here: a no-op re-run must not pay the import.
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from sampling import data_dir
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CACHE_DIR = data_dir("state") / "stage_cache"
+
+# manifests kept per step (older ones and the objects only they use are pruned)
+KEEP_RUNS = 5
+CHUNK = 1 << 20
+
+
+def write_json(path: Path, data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def read_json(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class StageCache:
+    def __init__(self, cache_dir: Path = CACHE_DIR, root: Path = PROJECT_ROOT):
+        self.cache_dir = Path(cache_dir)
+        self.root = Path(root)
+        self._hashes = read_json(self.cache_dir / "file_hashes.json")
+        self._latest = read_json(self.cache_dir / "latest.json")
+
+    # file hashing (stat-keyed, so unchanged files are not read again)
+    def _rel(self, path: Path) -> str:
+        path = Path(path)
+        path = path if path.is_absolute() else self.root / path
+        return path.resolve().relative_to(self.root.resolve()).as_posix()
+
+    def file_hash(self, path: Path) -> str | None:
+        rel = self._rel(path)
+        full = self.root / rel
+        try:
+            st = full.stat()
+        except FileNotFoundError:
+            return None
+        cached = self._hashes.get(rel)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = sha256_file(full)
+        self._hashes[rel] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def outputs_hash(self, outputs: list[Path]) -> str | None:
+        # content of a step's outputs as one digest (None if any is missing)
+        h = hashlib.sha256()
+        for out in sorted(self._rel(p) for p in outputs):
+            digest = self.file_hash(out)
+            if digest is None:
+                return None
+            h.update(f"{out}={digest}\n".encode())
+        return h.hexdigest()
+
+    def latest(self, step: str) -> str | None:
+        # id of the last real execution (a skipped step keeps the id of the run it reused)
+        return self._latest.get(step, {}).get("run")
+
+    # fingerprint
+    def fingerprint(self, step: str, cmd: list[str], code: list[Path], inputs: list[Path],
+                    config: dict[str, str], deps: dict[str, str | None]) -> str:
+        h = hashlib.sha256()
+        h.update(f"step={step}\ncmd={json.dumps(cmd)}\n".encode())
+        for path in sorted(self._rel(p) for p in code):
+            h.update(f"code:{path}={self.file_hash(path)}\n".encode())
+        for path in sorted(self._rel(p) for p in inputs):
+            h.update(f"input:{path}={self.file_hash(path)}\n".encode())
+        for key in sorted(config):
+            h.update(f"config:{key}={config[key]}\n".encode())
+        for dep in sorted(deps):
+            h.update(f"dep:{dep}={deps[dep]}\n".encode())
+        return h.hexdigest()
+
+    # runs
+    def _manifest_path(self, step: str, fingerprint: str) -> Path:
+        return self.cache_dir / "runs" / step.replace(":", "_") / f"{fingerprint}.json"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.cache_dir / "objects" / digest[:2] / digest[2:]
+
+    def lookup(self, step: str, fingerprint: str) -> bool:
+        # True if the step already ran with this fingerprint and its outputs are in place
+        manifest = read_json(self._manifest_path(step, fingerprint))
+        if not manifest:
+            return False
+
+        for rel, digest in manifest["outputs"].items():
+            if self.file_hash(rel) == digest:
+                continue
+            obj = self._object_path(digest)
+            if not obj.exists():
+                return False
+            target = self.root / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(obj, target)
+            self.file_hash(rel)
+
+        if self._latest.get(step, {}).get("fingerprint") != fingerprint:
+            self._latest[step] = {"fingerprint": fingerprint, "run": manifest["run"]}
+        return True
+
+    def record(self, step: str, fingerprint: str, outputs: list[Path]) -> None:
+        stored = {}
+        for path in outputs:
+            rel = self._rel(path)
+            digest = self.file_hash(rel)
+            if digest is None:
+                continue
+            obj = self._object_path(digest)
+            if not obj.exists():
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                tmp = obj.with_suffix(".tmp")
+                shutil.copyfile(self.root / rel, tmp)
+                os.replace(tmp, obj)
+            stored[rel] = digest
+
+        run = uuid.uuid4().hex
+        write_json(self._manifest_path(step, fingerprint), {"outputs": stored, "run": run, "finished": time.time()})
+        self._latest[step] = {"fingerprint": fingerprint, "run": run}
+
+    def save(self) -> None:
+        write_json(self.cache_dir / "file_hashes.json", self._hashes)
+        write_json(self.cache_dir / "latest.json", self._latest)
+
+    def prune(self, keep: int = KEEP_RUNS) -> int:
+        # keep the newest manifests per step, then drop objects no manifest references
+        runs_dir = self.cache_dir / "runs"
+        if not runs_dir.exists():
+            return 0
+
+        referenced = set()
+        for step_dir in runs_dir.iterdir():
+            manifests = sorted(step_dir.glob("*.json"), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+            for old in manifests[keep:]:
+                old.unlink()
+            for m in manifests[:keep]:
+                referenced.update(read_json(m).get("outputs", {}).values())
+
+        removed = 0
+        for obj in (self.cache_dir / "objects").glob("*/*"):
+            if obj.parent.name + obj.name not in referenced:
+                obj.unlink()
+                removed += 1
+        return removed
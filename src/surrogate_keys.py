@@ -0,0 +1,59 @@
+# SURROGATE KEYS
+# dim_sex, dim_death_cause and dim_economic_sector are keyed by compact integers
+# instead of their NVARCHAR codes, so the facts carry 1-2 byte keys per row.
+# The code -> id map is persisted, a member keeps its id across runs and new
+# members get the next free id (never reused, never renumbered).
+
+from __future__ import annotations
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from sampling import data_dir
+
+
+STATE_DIR = data_dir("state")
+KEY_MAP_PATH = STATE_DIR / "key_map.json"
+
+# dimension -> natural key column
+SURROGATE_DIMS = {
+    "dim_sex": "SEX",
+    "dim_death_cause": "DEATH_CAUSE_CODE",
+    "dim_economic_sector": "ECONOMIC_SECTOR",
+}
+
+
+def load_key_map(path: Path = KEY_MAP_PATH) -> dict[str, dict[str, int]]:
+    if not path.exists():
+        return {dim: {} for dim in SURROGATE_DIMS}
+    key_map = json.loads(path.read_text(encoding="utf-8"))
+    for dim in SURROGATE_DIMS:
+        key_map.setdefault(dim, {})
+    return key_map
+
+
+def save_key_map(key_map: dict[str, dict[str, int]], path: Path = KEY_MAP_PATH) -> None:
+    # write + rename so a crash never leaves half a key map behind
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(key_map, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def assign_keys(key_map: dict[str, dict[str, int]], dim: str, members: pd.Series) -> pd.Series:
+    # add unseen members (in sorted order, so a fresh map is deterministic) and return their ids
+    mapping = key_map.setdefault(dim, {})
+    next_id = max(mapping.values(), default=0) + 1
+
+    for member in sorted(set(members.dropna().astype(str)) - set(mapping)):
+        mapping[member] = next_id
+        next_id += 1
+
+    return map_keys(key_map, dim, members)
+
+
+def map_keys(key_map: dict[str, dict[str, int]], dim: str, values: pd.Series) -> pd.Series:
+    # unknown values come back as <NA>
+    return values.astype("string").map(key_map[dim]).astype("Int32")
@@ -6,18 +6,20 @@ from datetime import datetime
 import re
 from pathlib import Path
 
+import economic_annual
+import quarantine
+from imputation import MASK, combine_masks, impute, spec_for
+from log_setup import configure_logging, lazy
+from pobmun_reader import read_pobmun
+from run_history import record_rows
+from sampling import data_dir, sample_rows
+from schemas import CODE, INT, RAW, STAGED, read_csv
+
 
 # logging
-logging.basicConfig(
-    filename="./logs/transformation.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+configure_logging("transformation")
 logger = logging.getLogger(__name__)
 
-logger.info(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-
-
 
 # helpers to avoid repetition
 def remove_punctuation_parentheses(s: pd.Series) -> pd.Series:
@@ -30,13 +32,13 @@ def remove_punctuation_parentheses(s: pd.Series) -> pd.Series:
     )
 
 
-def clean_int_like(series: pd.Series, *, zfill: int | None = None) -> pd.Series:
+def clean_int_like(series: pd.Series, dtype: str = INT) -> pd.Series:
     # Clean numeric-like strings:
     # - trims
     # - removes '.' as thousands separator
     # - removes spaces
-    # - optionally left-pads with zeros (zfill)
-    # - converts to nullable Int64
+    # - converts to a nullable int (Int64, or the compact CODE for codes:
+    #   "08" is just 8, the padding is display only)
 
     out = (
         series.astype("string")
@@ -44,15 +46,19 @@ def clean_int_like(series: pd.Series, *, zfill: int | None = None) -> pd.Series:
               .str.replace(r"\.", "", regex=True)      # 2.467 -> 2467
               .str.replace(r"\s+", "", regex=True)     # remove spaces
     )
-    if zfill is not None:
-        out = out.str.zfill(zfill)
 
     return (
         out.replace({"": pd.NA, "nan": pd.NA, "None": pd.NA})
            .astype("Int64")
+           .astype(dtype)
     )
 
 
+def missing_counts(df: pd.DataFrame, cols: list[str] | None = None) -> dict[str, int]:
+    # for the logs (wrapped in lazy(), only computed when INFO is enabled)
+    return {c: int(n) for c, n in df[cols or list(df.columns)].isnull().sum().items()}
+
+
 def extract_year_from_filename(path: Path) -> int:
     m = re.search(r"\d{4}", path.stem)
     return int(m.group()) if m else pd.NA
@@ -63,314 +69,300 @@ def parse_provincia_field(series: pd.Series) -> tuple[pd.Series, pd.Series]:
     # Extract CPRO and CPRO_NAME from strings like:
     # '28 - Madrid' / '28: Madrid' / '28–Madrid'
     ext = series.astype("string").str.extract(r"^\s*(\d{1,2})\s*[-–:]*\s*(.+?)\s*$")
-    cpro = ext[0].astype("string").str.zfill(2)
+    cpro = ext[0].astype("Int64").astype(CODE)
     name = ext[1].astype("string").str.strip()
     return cpro, name
 
 
-def normalize_total_with_imputation(df: pd.DataFrame, total_col: str, group_cols: list[str]) -> pd.Series:
-    # Normalize Total:
-    # - remove thousands separators
-    # - to numeric
-    # - fill NaN with group mean
-    # - fill remaining with global mean
-    # - round and Int64
-    tmp = (
-        df[total_col].astype(str)
-                    .str.strip()
-                    .str.replace(".", "", regex=False)
-                    .replace({"": pd.NA, "nan": pd.NA, "None": pd.NA})
-    )
-    tmp = pd.to_numeric(tmp, errors="coerce")
+def normalize_cpro(cpro: pd.Series) -> pd.Series:
+    # Province code as a compact integer (CODE), all integer operations:
+    # a code with 3+ digits (e.g. 280) is divided by 10
+    n = cpro.astype("Int16")
+    return n.mask((n >= 100).fillna(False), n // 10).astype(CODE)
 
-    tmp = tmp.fillna(df.groupby(group_cols)[total_col].transform("mean"))
-    tmp = tmp.fillna(tmp.mean())
 
-    return tmp.round().astype("Int64")
 
+# paths (relative to the project root, like the logs)
+RAW_DIR = Path("data/raw")
+STAGING_DIR = data_dir("staging")
 
-def cpro_div10_if_needed(cpro: pd.Series) -> pd.Series:
 
-    # Normalize CPRO by dividing by 10 when needed.
-    # Examples:
-    # - 280 -> 28
-    # - 10  -> 1
-    # - 20  -> 2
-    # - 28  -> 28 (unchanged)
+# Pobmun combined files
+# clean_pobmun_file works on one yearly file and finish_pobmun on the combined
+# rows; every step after the per-file cleaning is row by row, so sharded.py can
+# split the rows by province between both and get the same result
+def clean_pobmun_file(f: Path) -> pd.DataFrame:
+    #1
+    # memory-mapped reader for the INE layout (pobmun_reader.py): title line and header
+    # skipped, the number columns already cleaned ('.' thousands separators and spaces
+    # removed) and typed; CPRO is the raw code until normalize_cpro
+    df, bad_lines = read_pobmun(f)
+    for bad in bad_lines:
+        logger.warning("Bad line %d of %s (byte %d, %s), quarantined", bad.line, f.name, bad.offset, bad.reason)
+    quarantine.save(f.stem, "transform", f, bad_lines, header_lines=RAW["pobmun"].skiprows + 1)
+    logger.info(f"Read file {f.name} with shape {df.shape}")
 
-    c = pd.to_numeric(cpro, errors="coerce").astype("Int64")
+    #2
+    year = int(re.search(r"\d+", f.stem).group())
+    logger.info(f"Detected year {year} from filename {f.name}")
+    df = clean_pobmun_rows(df, year, f.name)
 
-    # divide by 10 when value ends with 0 and is >= 10
-    mask = (c >= 10) & (c % 10 == 0)
-    c.loc[mask] = (c.loc[mask] // 10).astype("Int64")
+    df = sample_rows(df, normalize_cpro(df["CPRO"]))  # --sample: only the sampled provinces
+    logger.info(
+        "After cleaning, %s has %d rows; unique CPRO_NAMEs: %s",
+        f.name, df.shape[0], lazy(df["CPRO_NAME"].nunique, dropna=True)
+    )
 
-    return c
+    return df
 
 
-def normalize_cpro_string(cpro: pd.Series) -> pd.Series:
-  
-    # Normalize CPRO as a 2-digit string.
-    # - trims
-    # - keeps only digits
-    # - if value has 3+ digits (e.g. 280), divide by 10
-    # - zero-pad to 2 digits
- 
-    s = (
-        cpro.astype("string")
-            .str.strip()
-            .str.replace(r"\D+", "", regex=True)  # keep digits only
-    )
+def clean_pobmun_rows(df: pd.DataFrame, year: int, name: str) -> pd.DataFrame:
+    # the per-row cleaning of a pobmun file (also used by reprocess_pobmun)
+    df["YEAR"] = pd.array([year] * len(df), dtype="Int64")
 
-    # numeric step for /10 when needed
-    n = pd.to_numeric(s, errors="coerce")
+    #3
+    # the schema already names the columns:
+    # "CPRO", "CPRO_NAME", "MUN_NUMBER", "MUN_NAME", "POBLATION", "MALE", "FEMALE" (+ "YEAR")
 
-    mask = n >= 100
-    n.loc[mask] = (n.loc[mask] // 10)
+    # int cols
+    int_cols = ["CPRO", "MUN_NUMBER", "POBLATION", "MALE", "FEMALE", "YEAR"]
 
-    return n.astype("Int64").astype("string").str.zfill(2)
+    # report missing counts after cleaning numeric-like columns for this file
+    logger.info("Missing counts in int cols after cleaning for %s: %s", name, lazy(missing_counts, df, int_cols))
 
+    #5 (string cols)
+    df["CPRO_NAME"] = remove_punctuation_parentheses(df["CPRO_NAME"])
+    df["MUN_NAME"] = remove_punctuation_parentheses(df["MUN_NAME"])
+    return df
 
 
-# Pobmun combined files
-ruta = Path("data/raw")
-archivos = sorted(ruta.glob("pobmun*.csv*"))
-logger.info(f"Found {len(archivos)} source files in {ruta}")
+def finish_pobmun(dfs: list[pd.DataFrame]) -> pd.DataFrame:
+    # one concat at the end instead of growing the frame file by file
+    df_total = pd.concat(dfs, ignore_index=True)
 
-dfs: list[pd.DataFrame] = []
-df_total = pd.DataFrame()
+    #4
+    logger.info(f"Total combined dataset shape: {df_total.shape}")
+    logger.info("Missing values by column: %s", lazy(missing_counts, df_total))
 
-for f in archivos:
-    #1
-    df = pd.read_csv(f, skiprows=1, sep=",")
-    df.reset_index(drop=True, inplace=True)
-    logger.info(f"Read file {f.name} with shape {df.shape}")
 
-    #2
-    year = int(re.search(r"\d+", f.stem).group())
-    df["year"] = year
-    logger.info(f"Detected year {year} from filename {f.name}")
+    #6
+    logger.info("Missing before drop: %s", lazy(missing_counts, df_total, ["MALE", "FEMALE"]))
+    df_total = df_total.dropna(subset=["MALE", "FEMALE"])
+    logger.info(f"Dropped rows with missing MALE/FEMALE. New shape: {df_total.shape}")
 
-    #3
-    df.columns = [
-        "CPRO", "CPRO_NAME", "MUN_NUMBER", "MUN_NAME",
-        "POBLATION", "MALE", "FEMALE", "YEAR"
-    ]
+    #7
+    logger.info("Missing before drop: %s", lazy(missing_counts, df_total, ["MUN_NAME", "MUN_NUMBER"]))
+    df_total = df_total.dropna(subset=["MUN_NAME", "MUN_NUMBER"])
+    logger.info(f"Dropped rows with missing MUN_NAME/MUN_NUMBER. New shape: {df_total.shape}")
 
-    # int cols
-    int_cols = ["CPRO", "MUN_NUMBER", "POBLATION", "MALE", "FEMALE", "YEAR"]
+    logger.info("Missing before final drop: %s", lazy(missing_counts, df_total, ["CPRO", "CPRO_NAME"]))
+    df_total = df_total.dropna(subset=["CPRO", "CPRO_NAME"])
+    logger.info(f"Total combined dataset shape: {df_total.shape}")
+    logger.info("Missing values by column: %s", lazy(missing_counts, df_total))
 
-    # clean int cols that have dots as thousands separator and spaces
-    # Note: zfill on ALL int columns is not always meaningful; keeping your behavior:
-    for c in int_cols:
-        # municipality codes often want zfill; keeping zfill(2) as you had
-        zfill = 2 if c in ["CPRO", "MUN_NUMBER"] else None
-        df[c] = clean_int_like(df[c], zfill=zfill)
+    #20
+    # normalize CPRO (integer key, like in the warehouse)
+    df_total["CPRO"] = normalize_cpro(df_total["CPRO"])
 
-        # (FIX) Only for 2009 and 2016: MUN_NUMBER comes inflated (e.g. 730 instead of 73)
-    if year in (2009, 2016):
-        df["MUN_NUMBER"] = (pd.to_numeric(df["MUN_NUMBER"], errors="coerce") // 10).astype("Int64")
-        logger.info(f"Applied MUN_NUMBER // 10 fix for year {year} in file {f.name}")
+    logger.info(f"Combined main dataset shape after transformation: {df_total.shape}")
+    logger.info("Missing values by column: %s", lazy(missing_counts, df_total))
 
-    # report missing counts after cleaning numeric-like columns for this file
-    try:
-        missing_int_after = df[int_cols].isnull().sum().to_dict()
-        logger.info(f"Missing counts in int cols after cleaning for {f.name}: {missing_int_after}")
-    except Exception as e:
-        logger.info(f"Could not compute post-cleaning missing counts for {f.name}: {e}")
+    return df_total
 
-    #5 (string cols)
-    df["CPRO_NAME"] = remove_punctuation_parentheses(df["CPRO_NAME"])
-    df["MUN_NAME"] = remove_punctuation_parentheses(df["MUN_NAME"])
 
-    # remove the file's header/metadata row and report counts
-    df = df.iloc[1:]  # remove first row
-    logger.info(
-        f"After cleaning, {f.name} has {df.shape[0]} rows; "
-        f"unique CPRO_NAMEs: {df['CPRO_NAME'].nunique(dropna=True)}"
-    )
+def transform_pobmun() -> pd.DataFrame:
+    ruta = RAW_DIR
+    archivos = sorted(ruta.glob("pobmun*.csv*"))
+    logger.info(f"Found {len(archivos)} source files in {ruta}")
 
-    dfs.append(df)
-    df_total = pd.concat([df_total, df], ignore_index=True)
-    logger.info(f"Appended {df.shape[0]} rows from {f.name}; combined dataset now {df_total.shape}")
+    dfs: list[pd.DataFrame] = []
+    for f in archivos:
+        df = clean_pobmun_file(f)
+        dfs.append(df)
+        logger.info(f"Appended {df.shape[0]} rows from {f.name}")
 
-#4
-logger.info(f"Total combined dataset shape: {df_total.shape}")
-logger.info("Missing values by column:")
-logger.info(df_total.isnull().sum())
+    df_total = finish_pobmun(dfs)
+    df_total.to_csv(STAGING_DIR / "pobmun_combined_transformed.csv", index=False)
+    return df_total
 
 
-#6
-logger.info(
-    f"Missing before drop - MALE: {df_total['MALE'].isnull().sum()}, "
-    f"FEMALE: {df_total['FEMALE'].isnull().sum()}"
-)
-df_total = df_total.dropna(subset=["MALE", "FEMALE"])
-logger.info(f"Dropped rows with missing MALE/FEMALE. New shape: {df_total.shape}")
+def reprocess_pobmun(lines_file: Path, source: str) -> tuple[int, list[quarantine.BadLine]]:
+    # quarantined lines of a pobmun file (quarantine.py) parsed again with the current
+    # reader and cleaning, merged into the rows of their year in the staging file.
+    # Returns the rows merged and the lines that still fail
+    df, bad_lines = read_pobmun(lines_file)
+    if df.empty:
+        return 0, bad_lines
+    year = int(re.search(r"\d+", source).group())
+    df = finish_pobmun([clean_pobmun_rows(df, year, lines_file.name)])
 
-#7
-logger.info(
-    f"Missing before drop - MUN_NAME: {df_total['MUN_NAME'].isnull().sum()}, "
-    f"MUN_NUMBER: {df_total['MUN_NUMBER'].isnull().sum()}"
-)
-df_total = df_total.dropna(subset=["MUN_NAME", "MUN_NUMBER"])
-logger.info(f"Dropped rows with missing MUN_NAME/MUN_NUMBER. New shape: {df_total.shape}")
+    path = STAGING_DIR / "pobmun_combined_transformed.csv"
+    staged = read_csv(STAGED["pobmun"], path)
+    # a municipality already staged for that year is replaced; the file stays ordered by year
+    key = ["YEAR", "CPRO", "MUN_NUMBER"]
+    replaced = pd.MultiIndex.from_frame(staged[key]).isin(pd.MultiIndex.from_frame(df[key]))
+    merged = pd.concat([staged[~replaced], df[staged.columns]], ignore_index=True)
+    merged = merged.sort_values("YEAR", kind="stable")
+    merged.to_csv(path, index=False)
+    logger.info(f"Merged {len(df)} reprocessed rows of {source} into {path.name} ({replaced.sum()} replaced)")
+    return len(df), bad_lines
 
-logger.info(
-    f"Missing before final drop - CPRO: {df_total['CPRO'].isnull().sum()}, "
-    f"CPRO_NAME: {df_total['CPRO_NAME'].isnull().sum()}"
-)
-df_total = df_total.dropna(subset=["CPRO", "CPRO_NAME"])
-logger.info(f"Total combined dataset shape: {df_total.shape}")
-logger.info("Missing values by column:")
-logger.info(df_total.isnull().sum())
 
+# Reference codauto
+def transform_codauto() -> pd.DataFrame:
+    #9
+    codauto = read_csv(RAW["codauto"], RAW_DIR / "codauto_cpro.csv")
+    logger.info("Loaded codauto reference with shape %s; unique CPRO: %s",
+                codauto.shape, lazy(codauto["CPRO"].nunique, dropna=True))
 
+    codauto["CPRO_NAME"] = remove_punctuation_parentheses(codauto["CPRO_NAME"])
+    codauto["CODAUTO_NAME"] = remove_punctuation_parentheses(codauto["CODAUTO_NAME"])
 
-# Reference codauto
-#9
-codauto = pd.read_csv("data/raw/codauto_cpro.csv", sep=";")
-logger.info(f"Loaded codauto reference with shape {codauto.shape}; unique CPRO: {codauto['CPRO'].nunique(dropna=True)}")
+    codauto["CPRO"] = clean_int_like(codauto["CPRO"], CODE)
+    codauto["CODAUTO"] = clean_int_like(codauto["CODAUTO"], CODE)
 
-codauto["CPRO_NAME"] = remove_punctuation_parentheses(codauto["CPRO_NAME"])
-codauto["CODAUTO_NAME"] = remove_punctuation_parentheses(codauto["CODAUTO_NAME"])
+    logger.info(f"Codauto reference dataset shape after transformation: {codauto.shape}")
+    logger.info("Missing values by column: %s", lazy(missing_counts, codauto))
 
-codauto["CPRO"] = clean_int_like(codauto["CPRO"], zfill=2)
-codauto["CODAUTO"] = clean_int_like(codauto["CODAUTO"])
+    #20
+    codauto["CPRO"] = normalize_cpro(codauto["CPRO"])
+
+    codauto.to_csv(STAGING_DIR / "codauto_cpro_transformed.csv", index=False)
+    return codauto
 
 
 # Economic sector (province)
-#10
-economic_df = pd.read_csv("data/raw/economic_sector_province.csv", sep=",").copy()
-logger.info(f"Loaded economic sector file with shape {economic_df.shape}")
+ECONOMIC_RAW = RAW_DIR / "economic_sector_province.csv"
+
+
+def economic_quarters() -> pd.DataFrame:
+    # every quarterly row in memory, for the imputation strategies that need the rows
+    # (median, ffill_year); the same columns as economic_annual.annual()
+    #10
+    economic_df = read_csv(RAW["economic"], ECONOMIC_RAW)
+    logger.info(f"Loaded economic sector file with shape {economic_df.shape}")
+
+    economic_df["Provincias"] = economic_df["Provincias"].str.strip()
+    economic_df = economic_df[~economic_df["Provincias"].str.lower().eq("total nacional")].copy()
+    logger.info(f"Filtered economic sector rows, new shape {economic_df.shape}")
 
-economic_df["Provincias"] = economic_df["Provincias"].astype("string").str.strip()
-economic_df = economic_df[~economic_df["Provincias"].str.lower().eq("total nacional")].copy()
-logger.info(f"Filtered economic sector rows, new shape {economic_df.shape}")
+    #11
+    # total to a number, missing values imputed and flagged in IMPUTED (imputation.py)
+    economic_df = impute(economic_df, "economic")
 
-#11
-# normalize total to numeric and replace
-economic_df["Total"] = pd.to_numeric(
-    economic_df["Total"].astype(str).str.strip().str.replace(".", "", regex=False),
-    errors="coerce"
-)
-economic_df["Total"] = economic_df["Total"].fillna(
-    economic_df.groupby("Provincias")["Total"].transform("mean")
-)
-economic_df["Total"] = economic_df["Total"].fillna(economic_df["Total"].mean())
-economic_df["Total"] = economic_df["Total"].round().astype("Int64")
+    #13
+    economic_df["YEAR"] = economic_df["Periodo"].str.strip().str.extract(r"^(\d{4})T([1-4])$")[0].astype("Int64")
+    economic_df["TOTAL_SUM"] = economic_df["Total"].astype("float64").fillna(0)
+    economic_df["TOTAL_COUNT"] = economic_df["Total"].notna().astype("int64")
+    return economic_df[["Provincias", "Sector económico", "YEAR", "TOTAL_SUM", "TOTAL_COUNT", MASK]]
 
-#12
-economic_df["CPRO"], economic_df["CPRO_NAME"] = parse_provincia_field(economic_df["Provincias"])
 
-#13
-tmp = economic_df["Periodo"].astype("string").str.strip().str.extract(r"^(\d{4})T([1-4])$")
-economic_df["YEAR"] = tmp[0].astype("Int64")
-economic_df["QUARTER"] = tmp[1].astype("Int64")
+def transform_economic() -> pd.DataFrame:
+    #10 #11 #13
+    # quarterly rows -> (sum, count) of the quarters per province, sector and year,
+    # streamed in chunks with the missing quarters imputed (economic_annual.py)
+    spec = spec_for("economic")
+    if economic_annual.streamable(spec):
+        economic_df = economic_annual.annual(ECONOMIC_RAW, spec)
+    else:
+        economic_df = economic_quarters()
 
-# trimester no longer needed
-economic_df.drop(columns=["Periodo", "QUARTER"], inplace=True)
+    #12
+    economic_df["CPRO"], economic_df["CPRO_NAME"] = parse_provincia_field(economic_df["Provincias"])
 
-# IMPORTANT: average total by CPRO, CPRO_NAME, SECTOR and YEAR
-economic_df = (
-    economic_df
-        .groupby(["CPRO", "CPRO_NAME", "Sector económico", "YEAR"], as_index=False)["Total"]
-        .mean()
-)
+    # IMPORTANT: average total by CPRO, CPRO_NAME, SECTOR and YEAR
+    # (a year is imputed when one of its quarters is)
+    grouped = economic_df.groupby(["CPRO", "CPRO_NAME", "Sector económico", "YEAR"])
+    annual = grouped[["TOTAL_SUM", "TOTAL_COUNT"]].sum()
+    annual["Total"] = annual["TOTAL_SUM"] / annual["TOTAL_COUNT"].where(annual["TOTAL_COUNT"] > 0)
+    annual = annual.drop(columns=["TOTAL_SUM", "TOTAL_COUNT"]).reset_index()
+    annual[MASK] = combine_masks(economic_df[MASK], grouped.ngroup().to_numpy(), len(annual))
+    economic_df = annual
 
-#14
-economic_df.columns = ["CPRO", "CPRO_NAME", "ECONOMIC_SECTOR", "YEAR", "TOTAL"]
-logger.info(f"Economic dataset aggregated to shape {economic_df.shape} and columns {list(economic_df.columns)}")
+    #14
+    economic_df.columns = ["CPRO", "CPRO_NAME", "ECONOMIC_SECTOR", "YEAR", "TOTAL", "IMPUTED"]
+    logger.info(f"Economic dataset aggregated to shape {economic_df.shape} and columns {list(economic_df.columns)}")
 
-logger.info(f"Transformation completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"Economic dataset shape after transformation: {economic_df.shape}")
+    logger.info("Missing values by column: %s", lazy(missing_counts, economic_df))
 
+    #20
+    economic_df["CPRO"] = normalize_cpro(economic_df["CPRO"])
+    economic_df = sample_rows(economic_df, economic_df["CPRO"])
+
+    economic_df.to_csv(STAGING_DIR / "economic_sector_province_transformed.csv", index=False)
+    return economic_df
 
 
 # Death causes (province)
-deathcauses_df = pd.read_csv("data/raw/death_causes_province.csv", sep=",")
-
-#15
-deathcauses_df["Total"] = (
-    deathcauses_df["Total"]
-        .astype(str)
-        .str.replace(".", "", regex=False)
-        .replace("nan", pd.NA)
-)
-deathcauses_df["Total"] = pd.to_numeric(deathcauses_df["Total"], errors="coerce").astype("Int64")
-
-#16
-deathcauses_df["Provincias"] = deathcauses_df["Provincias"].astype("string").str.strip()
-deathcauses_df = deathcauses_df[~deathcauses_df["Provincias"].str.lower().eq("nacional")].copy()
-deathcauses_df = deathcauses_df[~deathcauses_df["Provincias"].str.lower().eq("extranjero")].copy()
-deathcauses_df.reset_index(drop=True, inplace=True)
-
-#17
-# normalize and impute
-deathcauses_df["Total"] = (
-    deathcauses_df["Total"]
-    .astype(str)
-    .str.strip()
-    .str.replace(".", "", regex=False)
-    .replace({"": pd.NA, "nan": pd.NA, "None": pd.NA})
-)
-deathcauses_df["Total"] = pd.to_numeric(deathcauses_df["Total"], errors="coerce")
-deathcauses_df["Total"] = deathcauses_df["Total"].fillna(
-    deathcauses_df.groupby(["Provincias", "Causa de muerte"])["Total"].transform("mean")
-)
-deathcauses_df["Total"] = deathcauses_df["Total"].fillna(deathcauses_df["Total"].mean())
-deathcauses_df["Total"] = deathcauses_df["Total"].round().astype("Int64")
-
-#18
-deathcauses_df["CPRO"], deathcauses_df["CPRO_NAME"] = parse_provincia_field(deathcauses_df["Provincias"])
-deathcauses_df.drop(columns=["Provincias"], inplace=True)
-
-#19
-deathcauses_df.columns = ["DEATH_CAUSE", "SEX", "YEAR", "TOTAL", "CPRO", "CPRO_NAME"]
-
-
-logger.info("FINAL REPORT AFTER TRANSFORMATION")
-
-logger.info(f"Combined main dataset shape after transformation: {df_total.shape}")
-logger.info(df_total.isnull().sum())
-logger.info(df_total.columns)
-
-logger.info(f"Economic dataset shape after transformation: {economic_df.shape}")
-logger.info(economic_df.isnull().sum())
-logger.info(economic_df.columns)
-
-logger.info(f"Death Causes dataset shape after transformation: {deathcauses_df.shape}")
-logger.info(deathcauses_df.isnull().sum())
-logger.info(deathcauses_df.columns)
-
-logger.info(f"Codauto reference dataset shape after transformation: {codauto.shape}")
-logger.info(codauto.isnull().sum())
-logger.info(codauto.columns)
-
-
-#20
-# normalize CPRO as 2-digit STRING across all datasets (DW-safe key)
-df_total["CPRO"] = cpro_div10_if_needed(df_total["CPRO"])
-df_total["CPRO"] = normalize_cpro_string(df_total["CPRO"])
-economic_df["CPRO"] = normalize_cpro_string(economic_df["CPRO"])
-deathcauses_df["CPRO"] = normalize_cpro_string(deathcauses_df["CPRO"])
-codauto["CPRO"] = normalize_cpro_string(codauto["CPRO"])
-
-#21
-deathcauses_df[["DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME"]] = (
-    deathcauses_df["DEATH_CAUSE"]
-        .astype("string")
-        .str.strip()
-        .str.split(r"\s{2,}", n=1, expand=True)
-)
-deathcauses_df.drop(columns=["DEATH_CAUSE"], inplace=True)
-
-
-# saving
-logger.info("Saving transformed datasets to data/staging/")
-df_total.to_csv("data/staging/pobmun_combined_transformed.csv", index=False)
-economic_df.to_csv("data/staging/economic_sector_province_transformed.csv", index=False)
-deathcauses_df.to_csv("data/staging/death_causes_province_transformed.csv", index=False)
-codauto.to_csv("data/staging/codauto_cpro_transformed.csv", index=False)
-
-
-
-logger.info(f"Transformation process completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+def transform_deaths() -> pd.DataFrame:
+    deathcauses_df = read_csv(RAW["deaths"], RAW_DIR / "death_causes_province.csv")
+
+    #16
+    deathcauses_df["Provincias"] = deathcauses_df["Provincias"].str.strip()
+    deathcauses_df = deathcauses_df[~deathcauses_df["Provincias"].str.lower().eq("nacional")].copy()
+    deathcauses_df = deathcauses_df[~deathcauses_df["Provincias"].str.lower().eq("extranjero")].copy()
+    deathcauses_df.reset_index(drop=True, inplace=True)
+
+    #17
+    # Total is read as text ("4.059"): parsed, imputed and flagged in IMPUTED (imputation.py)
+    deathcauses_df = impute(deathcauses_df, "deaths")
+
+    #18
+    deathcauses_df["CPRO"], deathcauses_df["CPRO_NAME"] = parse_provincia_field(deathcauses_df["Provincias"])
+    deathcauses_df.drop(columns=["Provincias"], inplace=True)
+
+    #19
+    deathcauses_df.columns = ["DEATH_CAUSE", "SEX", "YEAR", "TOTAL", "IMPUTED", "CPRO", "CPRO_NAME"]
+
+    logger.info(f"Death Causes dataset shape after transformation: {deathcauses_df.shape}")
+    logger.info("Missing values by column: %s", lazy(missing_counts, deathcauses_df))
+
+    #20
+    deathcauses_df["CPRO"] = normalize_cpro(deathcauses_df["CPRO"])
+
+    #21
+    deathcauses_df[["DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME"]] = (
+        deathcauses_df["DEATH_CAUSE"]
+            .str.strip()
+            .str.split(r"\s{2,}", n=1, expand=True)
+    )
+    deathcauses_df.drop(columns=["DEATH_CAUSE"], inplace=True)
+    # after the imputation, so the sampled provinces get the same means as in a full run
+    deathcauses_df = sample_rows(deathcauses_df, deathcauses_df["CPRO"])
+
+    deathcauses_df.to_csv(STAGING_DIR / "death_causes_province_transformed.csv", index=False)
+    return deathcauses_df
+
+
+# every dataset is independent until the dims are built, so each one can run on its own
+DATASETS = {
+    "pobmun": transform_pobmun,
+    "codauto": transform_codauto,
+    "economic": transform_economic,
+    "deaths": transform_deaths,
+}
+
+
+def main(names: list[str] | None = None) -> int:
+    names = names or list(DATASETS)
+    unknown = set(names) - set(DATASETS)
+    if unknown:
+        raise ValueError(f"Unknown datasets: {sorted(unknown)} (expected {list(DATASETS)})")
+
+    logger.info(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+
+    for name in names:
+        logger.info(f"Transforming dataset: {name}")
+        record_rows(name, len(DATASETS[name]()))
+        logger.info(f"Saved transformed dataset {name} to {STAGING_DIR}/")
+
+    logger.info(f"Transformation process completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    # python src/transformation.py [pobmun] [codauto] [economic] [deaths] (default: all)
+    import sys
+    raise SystemExit(main(sys.argv[1:] or None))
@@ -0,0 +1,257 @@
+# WAREHOUSE BACKENDS
+# The loader talks to the warehouse through a backend object, so the same
+# dim/fact load flow works against Azure SQL (pyodbc) or a local SQLite file.
+#
+# DW_BACKEND=sqlite -> embedded SQLite file (DW_SQLITE_PATH), no network needed (default)
+# DW_BACKEND=azure  -> Azure SQL through ODBC Driver 18, needs AZURE_SQL_PASSWORD
+# A --sample run always loads warehouse/dw_sample.sqlite (see sampling.py).
+#
+# WARM CONNECTIONS
+# The first connect to a serverless / paused Azure SQL tier can block for tens
+# of seconds while the database resumes. WarmConnection opens the connection
+# and checks it (SELECT 1 + the dw schema exists) in a background thread:
+#   - the orchestrator warms the warehouse while the transformations run, so
+#     it is awake when the load steps start
+#   - load_dw takes its connection from one started before it reads and
+#     reshapes the staging files
+# DW_PREWARM=0 connects in place instead (the old behaviour).
+# DW_STANDIN_RESUME_SECONDS=20 wraps the backend in a local stand-in of a
+# paused tier: the first connect waits 20 s for the "resume", connects during
+# the resume wait for its end, and it pauses again after
+# DW_STANDIN_PAUSE_AFTER (3600) s without connects. The state is a file next
+# to the warehouse, shared by every process of a run.
+
+from __future__ import annotations
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import sampling
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+WAREHOUSE_DIR = PROJECT_ROOT / "warehouse"
+SQLITE_SCHEMA = WAREHOUSE_DIR / "schema_sqlite.sql"
+SQLITE_DEFAULT_PATH = WAREHOUSE_DIR / "dw_local.sqlite"
+PREWARM = os.getenv("DW_PREWARM", "1") != "0"
+
+logger = logging.getLogger(__name__)
+
+
+# CONFIG: connection (Azure SQL)
+SERVER   = os.getenv("AZURE_SQL_SERVER",   "srv-dw-liliarte-01.database.windows.net")
+DATABASE = os.getenv("AZURE_SQL_DATABASE", "dw_final_project")
+USERNAME = os.getenv("AZURE_SQL_USERNAME", "dwadmin")
+PASSWORD = os.getenv("AZURE_SQL_PASSWORD")
+DRIVER = ("ODBC Driver 18 for SQL Server")
+
+
+class AzureSqlBackend:
+    name = "azure"
+
+    def __init__(self, server: str = SERVER, database: str = DATABASE,
+                 username: str = USERNAME, password: str | None = PASSWORD,
+                 driver: str = DRIVER, timeout: int = 30):
+        if not password:
+            raise RuntimeError("DW_BACKEND=azure needs the password of the warehouse in AZURE_SQL_PASSWORD")
+        self.server = server
+        self.database = database
+        self.username = username
+        self.password = password
+        self.driver = driver
+        self.timeout = timeout
+
+    @property
+    def connection_string(self) -> str:
+        return (
+            f"DRIVER={{{self.driver}}};"
+            f"SERVER={self.server};"
+            f"DATABASE={self.database};"
+            f"UID={self.username};"
+            f"PWD={self.password};"
+            "Encrypt=yes;"
+            "TrustServerCertificate=no;"
+        )
+
+    def describe(self) -> str:
+        return f"azure ({self.driver}) {self.server}/{self.database}"
+
+    def connect(self):
+        # pyodbc is only needed when the Azure backend is really used
+        import pyodbc
+
+        cn = pyodbc.connect(self.connection_string, timeout=self.timeout)
+        cn.autocommit = False
+        return cn
+
+    def prepare_cursor(self, cursor) -> None:
+        cursor.fast_executemany = True
+
+    def health_check(self, cn) -> bool:
+        cur = cn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        # the dw schema is created by warehouse/schema.sql
+        cur.execute("SELECT SCHEMA_ID('dw')")
+        return cur.fetchone()[0] is not None
+
+
+class SqliteBackend:
+    name = "sqlite"
+
+    def __init__(self, path: Path | str = SQLITE_DEFAULT_PATH, schema_file: Path = SQLITE_SCHEMA):
+        self.path = Path(path)
+        self.schema_file = schema_file
+
+    def describe(self) -> str:
+        return f"sqlite {self.path}"
+
+    def connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # the warehouse file is attached as "dw" so the loader SQL (dw.dim_x, [YEAR])
+        # is the same for both backends, while analysts can open the file directly
+        # not bound to the thread that opens it: WarmConnection connects in the background
+        cn = sqlite3.connect(":memory:", check_same_thread=False)
+        cn.execute("ATTACH DATABASE ? AS dw", (str(self.path),))
+
+        # bulk insert pragmas: WAL keeps readers unblocked during loads,
+        # NORMAL sync is durable enough under WAL and avoids one fsync per commit
+        cn.execute("PRAGMA dw.journal_mode = WAL")
+        cn.execute("PRAGMA dw.synchronous = NORMAL")
+        cn.execute("PRAGMA dw.cache_size = -65536")  # 64 MB
+        cn.execute("PRAGMA temp_store = MEMORY")
+        cn.execute("PRAGMA busy_timeout = 30000")
+        cn.execute("PRAGMA foreign_keys = ON")
+
+        self.ensure_schema(cn)
+        return cn
+
+    def ensure_schema(self, cn) -> None:
+        cn.executescript(self.schema_file.read_text(encoding="utf-8"))
+
+    def prepare_cursor(self, cursor) -> None:
+        # sqlite3 executemany is already a single prepared statement
+        pass
+
+    def health_check(self, cn) -> bool:
+        cur = cn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.execute("SELECT COUNT(*) FROM dw.sqlite_master WHERE type = 'table'")
+        return cur.fetchone()[0] > 0
+
+
+class PausedStandIn:
+    # a backend whose connects behave like a paused serverless tier (see the top of the file)
+    def __init__(self, backend, resume_seconds: float, pause_after: float = 3600,
+                 state_path: Path = WAREHOUSE_DIR / "standin_state.json"):
+        self.backend = backend
+        self.name = backend.name
+        self.resume_seconds = resume_seconds
+        self.pause_after = pause_after
+        self.state_path = state_path
+
+    def __getattr__(self, attr):
+        return getattr(self.backend, attr)
+
+    def describe(self) -> str:
+        return f"{self.backend.describe()} (stand-in: {self.resume_seconds:g}s resume when paused)"
+
+    def connect(self):
+        now = time.time()
+        state = json.loads(self.state_path.read_text()) if self.state_path.exists() else None
+        if state is None or (now >= state["ready_at"] and now - state["last_used"] > self.pause_after):
+            # paused: this connect resumes it, the ones that come meanwhile wait for the same end
+            state = {"ready_at": now + self.resume_seconds, "last_used": now}
+            self._write_state(state)
+        time.sleep(max(0.0, state["ready_at"] - now))
+        self._write_state({**state, "last_used": time.time()})
+        return self.backend.connect()
+
+    def _write_state(self, state: dict) -> None:
+        # replaced in one go: the load steps connect from several processes at once
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(f"{self.state_path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.state_path)
+
+
+def open_checked(backend):
+    # connect + health check; a warehouse without the dw schema fails here, not at the first insert
+    cn = backend.connect()
+    try:
+        if not backend.health_check(cn):
+            raise RuntimeError(f"{backend.describe()}: connected, but the dw schema is missing (warehouse/schema.sql)")
+    except Exception:
+        cn.close()
+        raise
+    return cn
+
+
+class WarmConnection:
+    # a connection opened and checked in a background thread (in place with background=False)
+    def __init__(self, backend, background: bool = PREWARM):
+        self.backend = backend
+        self.seconds: float | None = None
+        self._cn = None
+        self._error: Exception | None = None
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._open, name="warehouse-prewarm", daemon=True)
+            self._thread.start()
+
+    def _open(self) -> None:
+        start = time.perf_counter()
+        try:
+            self._cn = open_checked(self.backend)
+        except Exception as exc:
+            self._error = exc
+        self.seconds = time.perf_counter() - start
+        if self._error is None:
+            logger.info(f"Warehouse connection ready in {self.seconds:.2f}s: {self.backend.describe()}")
+        else:
+            logger.warning(f"Warehouse connection failed after {self.seconds:.2f}s: {self._error}")
+
+    def get(self):
+        # the connection (waits for the background connect, raises its error)
+        if self._thread is None:
+            if self._cn is None and self._error is None:
+                self._open()
+        else:
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._cn
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._thread.join()
+        if self._cn is not None:
+            self._cn.close()
+            self._cn = None
+
+
+def get_backend(name: str | None = None):
+    backend = base_backend(name)
+    resume = float(os.getenv("DW_STANDIN_RESUME_SECONDS", "0"))
+    if resume > 0:
+        return PausedStandIn(backend, resume, float(os.getenv("DW_STANDIN_PAUSE_AFTER", "3600")))
+    return backend
+
+
+def base_backend(name: str | None = None):
+    if sampling.enabled():
+        return SqliteBackend(sampling.SAMPLE_WAREHOUSE)
+    name = (name or os.getenv("DW_BACKEND", "sqlite")).strip().lower()
+
+    if name == "azure":
+        return AzureSqlBackend()
+    if name == "sqlite":
+        return SqliteBackend(os.getenv("DW_SQLITE_PATH", SQLITE_DEFAULT_PATH))
+
+    raise ValueError(f"Unknown warehouse backend: {name!r} (expected 'azure' or 'sqlite')")
@@ -1,28 +1,16 @@
-import pyodbc
+# quick connection check against the configured warehouse backend
+# DW_BACKEND=sqlite (default) for the local copy, or DW_BACKEND=azure (with AZURE_SQL_PASSWORD)
+from warehouse_backend import get_backend
 
-server = "srv-dw-liliarte-01.database.windows.net"
-database = "dw_final_project"
-username = "dwadmin"
-password = "usj2526."
-
-conn_str = (
-    "DRIVER={ODBC Driver 18 for SQL Server};"
-    f"SERVER={server};"
-    f"DATABASE={database};"
-    f"UID={username};"
-    f"PWD={password};"
-    "Encrypt=yes;"
-    "TrustServerCertificate=no;"
-)
+backend = get_backend()
 
 try:
-    conn = pyodbc.connect(conn_str, timeout=10)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1")
-    print("Conexión OK con Azure SQL")
+    conn = backend.connect()
+    if backend.health_check(conn):
+        print(f"Conexión OK con {backend.describe()}")
+    else:
+        print(f"Conexión OK con {backend.describe()}, pero falta el schema dw")
     conn.close()
 except Exception as e:
     print("Error de conexión")
     print(e)
-
-
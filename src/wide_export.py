@@ -0,0 +1,244 @@
+# WIDE FACT EXPORT (optional, for import-mode BI)
+# The star schema makes every Power BI visual join a fact through
+# dim_municipality -> dim_province -> dim_autonomy and the label dims. This
+# stage writes one denormalized table per fact instead, with the geographic
+# hierarchy and the labels already resolved, so an import-mode model reads one
+# table and never joins:
+#
+# wide_deaths                   YEAR, CODAUTO, CODAUTO_NAME, CPRO, CPRO_NAME, SEX,
+#                               DEATH_CAUSE_CODE, DEATH_CAUSE_NAME, TOTAL_DEATHS
+# wide_economic_sector          YEAR, CODAUTO, CODAUTO_NAME, CPRO, CPRO_NAME,
+#                               ECONOMIC_SECTOR, TOTAL_VALUE
+# wide_population_municipality  YEAR, CODAUTO, CODAUTO_NAME, CPRO, CPRO_NAME,
+#                               MUN_NUMBER, MUN_NAME, POPULATION_TOTAL, MALE_TOTAL, FEMALE_TOTAL
+#
+# Built from the staging files with vectorized merges, with the same rules as
+# the dims and facts of load_dw (first name per municipality / cause, MAX per
+# municipality and year, rows without keys dropped). A fact row whose code has
+# no label keeps its measures with an empty label.
+#
+# Written to data/export/wide/<table>/<YEAR>.parquet (.csv when pyarrow is not
+# installed, or with WIDE_FORMAT=csv): one file per year, so a BI incremental
+# refresh reads only the years that changed. Each table has a _manifest.json
+# with the fingerprint, rows and bytes of every year; only the years whose rows
+# changed are rewritten, the years no longer in staging are removed.
+#
+# Off by default: python main.py --wide-export (or WIDE_EXPORT=1) adds the
+# export:wide step after the transformations.
+#   python src/wide_export.py [--full]
+
+from __future__ import annotations
+import importlib.util
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from aggregates import year_hashes
+from run_history import record_rows
+from sampling import data_dir
+from schemas import STAGED, read_csv
+
+# logging (configured in __main__)
+logger = logging.getLogger(__name__)
+
+
+EXPORT_ENV = "WIDE_EXPORT"
+WIDE_DIR = data_dir("export") / "wide"
+FORMAT = os.getenv("WIDE_FORMAT") or ("parquet" if importlib.util.find_spec("pyarrow") else "csv")
+
+GEO = ["CODAUTO", "CODAUTO_NAME", "CPRO", "CPRO_NAME"]
+WIDE_TABLES = {
+    "wide_deaths": ["YEAR", *GEO, "SEX", "DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME", "TOTAL_DEATHS"],
+    "wide_economic_sector": ["YEAR", *GEO, "ECONOMIC_SECTOR", "TOTAL_VALUE"],
+    "wide_population_municipality": ["YEAR", *GEO, "MUN_NUMBER", "MUN_NAME",
+                                     "POPULATION_TOTAL", "MALE_TOTAL", "FEMALE_TOTAL"],
+}
+# labels repeat on every row: categoricals in memory, dictionary-encoded in parquet
+LABELS = ["CODAUTO_NAME", "CPRO_NAME", "SEX", "DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME", "ECONOMIC_SECTOR", "MUN_NAME"]
+
+
+def enabled() -> bool:
+    return os.getenv(EXPORT_ENV, "").lower() in ("1", "true", "yes", "on")
+
+
+def table_dir(table: str) -> Path:
+    return WIDE_DIR / table
+
+
+def manifest_path(table: str) -> Path:
+    return table_dir(table) / "_manifest.json"
+
+
+def load_manifest(table: str) -> dict:
+    path = manifest_path(table)
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def save_manifest(table: str, manifest: dict) -> None:
+    path = manifest_path(table)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# reading
+def read_inputs() -> dict[str, pd.DataFrame]:
+    # typed reads (schemas.py), string columns stripped like load_dw does
+    data = {
+        "codauto": read_csv(STAGED["codauto"], usecols=["CODAUTO", "CODAUTO_NAME", "CPRO", "CPRO_NAME"]),
+        "deaths": read_csv(STAGED["deaths"], usecols=["CPRO", "YEAR", "TOTAL", "SEX",
+                                                      "DEATH_CAUSE_CODE", "DEATH_CAUSE_NAME"]),
+        "sector": read_csv(STAGED["sector"], usecols=["CPRO", "YEAR", "TOTAL", "ECONOMIC_SECTOR"]),
+        "pobmun": read_csv(STAGED["pobmun"], usecols=["CPRO", "MUN_NUMBER", "MUN_NAME", "YEAR",
+                                                      "POBLATION", "MALE", "FEMALE"]),
+    }
+    for name, df in data.items():
+        for c in df.columns:
+            if STAGED[name].columns[c] == "string":
+                df[c] = df[c].str.strip().fillna("")
+    return data
+
+
+def geography(cod: pd.DataFrame) -> pd.DataFrame:
+    # CPRO -> province and autonomy (dim_province joined with dim_autonomy)
+    autonomy = cod[["CODAUTO", "CODAUTO_NAME"]].dropna(subset=["CODAUTO"]).drop_duplicates(subset=["CODAUTO"])
+    province = cod[["CPRO", "CODAUTO", "CPRO_NAME"]].dropna(subset=["CPRO", "CODAUTO"]).drop_duplicates(subset=["CPRO"])
+    return province.merge(autonomy, on="CODAUTO", how="left")[GEO]
+
+
+# builders (one merge per fact, every label comes with the geography)
+def build_deaths(data: dict[str, pd.DataFrame], geo: pd.DataFrame) -> pd.DataFrame:
+    dea = data["deaths"].dropna(subset=["CPRO", "YEAR", "SEX", "DEATH_CAUSE_CODE", "TOTAL"])
+    # one name per cause, the first one (dim_death_cause)
+    first_name = dea.drop_duplicates(subset=["DEATH_CAUSE_CODE"]).set_index("DEATH_CAUSE_CODE")["DEATH_CAUSE_NAME"]
+    dea = dea.assign(DEATH_CAUSE_NAME=dea["DEATH_CAUSE_CODE"].map(first_name))
+    return dea.rename(columns={"TOTAL": "TOTAL_DEATHS"}).merge(geo, on="CPRO", how="left")
+
+
+def build_economic_sector(data: dict[str, pd.DataFrame], geo: pd.DataFrame) -> pd.DataFrame:
+    sec = data["sector"].dropna(subset=["CPRO", "YEAR", "ECONOMIC_SECTOR", "TOTAL"])
+    return sec.rename(columns={"TOTAL": "TOTAL_VALUE"}).merge(geo, on="CPRO", how="left")
+
+
+def build_population_municipality(data: dict[str, pd.DataFrame], geo: pd.DataFrame) -> pd.DataFrame:
+    pob = data["pobmun"]
+    # one name per municipality, the first one (dim_municipality)
+    names = (
+        pob[["CPRO", "MUN_NUMBER", "MUN_NAME"]]
+        .dropna(subset=["CPRO", "MUN_NUMBER"])
+        .drop_duplicates(subset=["CPRO", "MUN_NUMBER"])
+    )
+    # same dedupe rule as load_dw: MAX per (CPRO, MUN_NUMBER, YEAR)
+    facts = (
+        pob.dropna(subset=["CPRO", "MUN_NUMBER", "YEAR", "POBLATION", "MALE", "FEMALE"])
+           .groupby(["CPRO", "MUN_NUMBER", "YEAR"], as_index=False)[["POBLATION", "MALE", "FEMALE"]]
+           .max()
+           .rename(columns={"POBLATION": "POPULATION_TOTAL", "MALE": "MALE_TOTAL", "FEMALE": "FEMALE_TOTAL"})
+    )
+    return (
+        facts.merge(names, on=["CPRO", "MUN_NUMBER"], how="left")
+             .merge(geo, on="CPRO", how="left")
+    )
+
+
+BUILDERS = {
+    "wide_deaths": build_deaths,
+    "wide_economic_sector": build_economic_sector,
+    "wide_population_municipality": build_population_municipality,
+}
+
+
+def build(table: str, data: dict[str, pd.DataFrame], geo: pd.DataFrame) -> pd.DataFrame:
+    df = BUILDERS[table](data, geo)[WIDE_TABLES[table]]
+    df = df.sort_values(WIDE_TABLES[table][:-1]).reset_index(drop=True)
+    for c in df.columns.intersection(LABELS):
+        df[c] = df[c].fillna("").astype("category")
+    return df
+
+
+# writing
+def partition_path(table: str, year: int, fmt: str = FORMAT) -> Path:
+    return table_dir(table) / f"{year}.{fmt}"
+
+
+def write_partition(df: pd.DataFrame, path: Path, fmt: str = FORMAT) -> int:
+    # one year of a table, written next to its final name first; returns the bytes
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path.stat().st_size
+
+
+def export(table: str, df: pd.DataFrame, full: bool = False) -> tuple[list[int], int]:
+    # rewrite the years whose rows changed; returns (years written, years removed)
+    old = load_manifest(table)
+    same_layout = old.get("format") == FORMAT and old.get("columns") == list(df.columns)
+    old_parts = old.get("partitions", {}) if same_layout and not full else {}
+    hashes = year_hashes(df)
+
+    table_dir(table).mkdir(parents=True, exist_ok=True)
+    parts, written = {}, []
+    for year, part in df.groupby("YEAR", sort=True, observed=True):
+        key = str(int(year))
+        path = partition_path(table, int(year))
+        prev = old_parts.get(key)
+        if prev and prev["hash"] == hashes[key] and path.exists() and path.stat().st_size == prev["bytes"]:
+            parts[key] = prev
+            continue
+        parts[key] = {"hash": hashes[key], "rows": len(part), "bytes": write_partition(part, path),
+                      "file": path.name}
+        written.append(int(year))
+
+    # years gone from staging, and every file of another format / layout
+    removed = 0
+    for path in table_dir(table).glob("*.*"):
+        if path.name == manifest_path(table).name or (path.stem in parts and path.suffix == f".{FORMAT}"):
+            continue
+        path.unlink()
+        removed += path.suffix != ".tmp"
+    save_manifest(table, {"format": FORMAT, "columns": list(df.columns), "partitions": parts})
+    return written, removed
+
+
+def read_wide(table: str) -> pd.DataFrame:
+    # every year of an exported table (what a BI folder import reads)
+    manifest = load_manifest(table)
+    files = [table_dir(table) / p["file"] for _, p in sorted(manifest.get("partitions", {}).items())]
+    if not files:
+        return pd.DataFrame(columns=WIDE_TABLES[table])
+    if manifest["format"] == "parquet":
+        return pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+    return pd.concat([pd.read_csv(f, keep_default_na=False, na_values=[""]) for f in files], ignore_index=True)
+
+
+# MAIN
+def main(full: bool = False) -> int:
+    start_ts = time.time()
+    logger.info("==== wide export START (%s) ====", FORMAT)
+
+    data = read_inputs()
+    geo = geography(data["codauto"])
+    for table in WIDE_TABLES:
+        df = build(table, data, geo)
+        written, removed = export(table, df, full=full)
+        record_rows(table, len(df))
+        logger.info("[%s] %d rows, %d years: rewrote %s%s", table, len(df), df["YEAR"].nunique(),
+                    written or "none", f", removed {removed} files" if removed else "")
+
+    logger.info("==== wide export SUCCESS in %.2fs -> %s ====", time.time() - start_ts, WIDE_DIR)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    from log_setup import configure_logging
+    configure_logging("wide_export")
+    raise SystemExit(main(full="--full" in sys.argv[1:]))
@@ -0,0 +1,77 @@
+# TEST SETUP
+# Every test runs on a throw-away copy of the project (the `project` fixture):
+# src/, the warehouse schemas, config and main.py are copied to tmp_path with
+# the small raw files of tests/fixtures/raw as data/raw, and the working
+# directory is the copy. The pipeline modules are imported from the copy, so
+# every path they build (data/staging, data/state, data/rejects, the SQLite
+# warehouse, logs/) stays inside tmp_path, and nothing of the real data/ is read
+# or written. Subprocesses (python main.py ...) run in the copy as well.
+#
+#   python -m pytest -q
+
+from __future__ import annotations
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+MODULES = {p.stem for p in (ROOT / "src").glob("*.py")}
+
+# settings of the developer's shell that would change what the pipeline does
+CLEARED_ENV = ("PIPELINE_SAMPLE", "PIPELINE_RUN_ID", "PIPELINE_STEP", "PIPELINE_PROFILE", "WIDE_EXPORT",
+               "IMPUTE_ECONOMIC", "IMPUTE_DEATHS", "ECONOMIC_CHUNK_ROWS", "DW_RI_POLICY",
+               "DW_STANDIN_RESUME_SECONDS", "DW_STANDIN_PAUSE_AFTER")
+
+# configure_logging() keeps the first setup of a process: with a handler on the
+# root logger the imported stages do not open log files (pytest shows the records)
+logging.getLogger().addHandler(logging.NullHandler())
+
+
+def forget_modules() -> None:
+    for name in MODULES & set(sys.modules):
+        del sys.modules[name]
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    work = tmp_path / "project"
+    shutil.copytree(ROOT / "src", work / "src", ignore=shutil.ignore_patterns("__pycache__"))
+    shutil.copytree(ROOT / "config", work / "config")
+    (work / "warehouse").mkdir()
+    for schema in (ROOT / "warehouse").glob("*.sql"):
+        shutil.copyfile(schema, work / "warehouse" / schema.name)
+    shutil.copyfile(ROOT / "main.py", work / "main.py")
+    shutil.copytree(FIXTURES / "raw", work / "data" / "raw")
+    (work / "data" / "staging").mkdir()
+    (work / "logs").mkdir()
+
+    for name in CLEARED_ENV:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("DW_BACKEND", "sqlite")
+    monkeypatch.setenv("DW_SQLITE_PATH", str(work / "warehouse" / "dw_local.sqlite"))
+    monkeypatch.setenv("DW_PREWARM", "0")
+    monkeypatch.chdir(work)
+    monkeypatch.syspath_prepend(str(work / "src"))
+
+    forget_modules()
+    yield work
+    forget_modules()
+
+
+def run_main(work: Path, *args: str, env: dict[str, str] | None = None) -> subprocess.CompletedProcess:
+    # python main.py <args> in the copy; the output is kept for the failure message
+    result = subprocess.run([sys.executable, "main.py", *args], cwd=work, env={**os.environ, **(env or {})},
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result
+
+
+def warehouse(work: Path) -> sqlite3.Connection:
+    return sqlite3.connect(work / "warehouse" / "dw_local.sqlite")
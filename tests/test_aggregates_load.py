@@ -0,0 +1,50 @@
+# load:aggregates replaces only the years aggregates.py refreshed, everything
+# when the warehouse has no aggregate load on record
+from conftest import run_main, warehouse
+
+DEATHS = "data/raw/death_causes_province.csv"
+
+
+def agg_deaths(work) -> dict[int, list[float]]:
+    with warehouse(work) as cn:
+        rows = cn.execute("SELECT [YEAR], TOTAL_DEATHS FROM agg_deaths_autonomy_year ORDER BY 1, 2").fetchall()
+    by_year: dict[int, list[float]] = {}
+    for year, total in rows:
+        by_year.setdefault(year, []).append(total)
+    return by_year
+
+
+def test_changed_year_is_the_only_one_replaced(project):
+    run_main(project, "--only", "transform", "aggregates", "load")
+    before = agg_deaths(project)
+    assert sorted(before) == [2008, 2009, 2010, 2016]
+
+    # rows the next load must not touch (it would rewrite them with a full reload)
+    with warehouse(project) as cn:
+        cn.execute("UPDATE agg_deaths_autonomy_year SET TOTAL_DEATHS = -1")
+        cn.execute("UPDATE agg_population_province_year SET POPULATION_TOTAL = -1")
+
+    raw = project / DEATHS
+    text = raw.read_text(encoding="utf-8")
+    line = "009-041  II.Tumores,Hombres,02 Albacete,2010,4.801"
+    raw.write_text(text.replace(line, line.replace("4.801", "4.901")), encoding="utf-8")
+    run_main(project, "--only", "transform", "aggregates", "load")
+
+    after = agg_deaths(project)
+    assert after[2010] != before[2010] and -1 not in after[2010]
+    assert sum(after[2010]) == sum(before[2010]) + 100
+    for year in (2008, 2009, 2016):
+        assert set(after[year]) == {-1}
+    with warehouse(project) as cn:
+        assert cn.execute("SELECT DISTINCT POPULATION_TOTAL FROM agg_population_province_year").fetchall() == [(-1,)]
+
+
+def test_warehouse_without_aggregate_load_is_loaded_in_full(project):
+    run_main(project, "--only", "transform", "aggregates", "load")
+    before = agg_deaths(project)
+    with warehouse(project) as cn:
+        cn.execute("DELETE FROM agg_deaths_autonomy_year")
+        cn.execute("DELETE FROM etl_load_journal WHERE TABLE_NAME = 'agg_deaths_autonomy_year'")
+
+    run_main(project, "--force", "--only", "load:aggregates")
+    assert agg_deaths(project) == before
@@ -0,0 +1,122 @@
+# AdaptiveBatcher: bad rows isolated and rejected, reject files of every pass kept,
+# rejected dimension members not recorded in the dim cache
+import csv
+import sqlite3
+
+import pandas as pd
+
+from conftest import run_main, warehouse
+
+
+def reject_rows(path) -> list[dict]:
+    with path.open(newline="", encoding="utf-8") as fh:
+        return list(csv.DictReader(fh))
+
+
+def test_bisect_rejects_only_the_bad_row(project):
+    from batch_loader import AdaptiveBatcher
+
+    cn = sqlite3.connect(":memory:")
+    cn.execute("CREATE TABLE t (ID INTEGER PRIMARY KEY, V TEXT NOT NULL)")
+    rows = [(i, f"v{i}") for i in range(1000)]
+    rows[637] = (637, None)
+
+    batcher = AdaptiveBatcher(cn.cursor(), "INSERT INTO t (ID, V) VALUES (?, ?)", batch_size=256)
+    assert batcher.run(rows) == 999
+    assert batcher.rejected == 1 and batcher.rejected_at == [637]
+    assert cn.execute("SELECT COUNT(*), SUM(ID) FROM t").fetchone() == (999, sum(range(1000)) - 637)
+
+    rejects = reject_rows(project / "data" / "rejects" / "t.csv")
+    assert [r["ROW"] for r in rejects] == ["(637, None)"]
+
+
+def test_second_pass_keeps_the_rejects_of_the_first(project):
+    from batch_loader import AdaptiveBatcher
+
+    cn = sqlite3.connect(":memory:")
+    cn.execute("CREATE TABLE t (ID INTEGER PRIMARY KEY, V TEXT NOT NULL)")
+    sql = "INSERT INTO t (ID, V) VALUES (?, ?)"
+    AdaptiveBatcher(cn.cursor(), sql).run([(1, "a"), (2, None)])
+    AdaptiveBatcher(cn.cursor(), sql).run([(3, "c"), (1, "dup")])
+
+    rejects = reject_rows(project / "data" / "rejects" / "t.csv")
+    assert [r["ROW"] for r in rejects] == ["(2, None)", "(1, 'dup')"]
+
+
+
+def test_clean_load_removes_the_rejects_of_the_previous_run(project):
+    import batch_loader
+    from batch_loader import AdaptiveBatcher
+
+    cn = sqlite3.connect(":memory:")
+    cn.execute("CREATE TABLE t (ID INTEGER PRIMARY KEY, V TEXT NOT NULL)")
+    sql = "INSERT INTO t (ID, V) VALUES (?, ?)"
+    path = project / "data" / "rejects" / "t.csv"
+    AdaptiveBatcher(cn.cursor(), sql).run([(1, "a"), (2, None)])
+    assert path.exists()
+
+    # the next run (a new process): a resumed load keeps the file, a full load starts it over
+    batch_loader._rejects_opened.clear()
+    AdaptiveBatcher(cn.cursor(), sql).run([(1, "a"), (2, "b"), (3, "c")], start=1)
+    assert [r["ROW"] for r in reject_rows(path)] == ["(2, None)"]
+
+    batch_loader._rejects_opened.clear()
+    cn.execute("DELETE FROM t")
+    AdaptiveBatcher(cn.cursor(), sql).run([(1, "a"), (2, "b")])
+    assert not path.exists()
+
+def load_dims(extra: pd.DataFrame | None = None, renamed: dict[int, str] | None = None) -> None:
+    # the dims step of load_dw, with extra / recoded death causes
+    import load_dw
+    from dim_cache import DimCache
+
+    tables = load_dw.prepare_step("dims", load_dw.load_key_map(), DimCache.load("single"))
+    causes = tables["dim_death_cause"]
+    for cause_id, code in (renamed or {}).items():
+        causes.loc[causes["DEATH_CAUSE_ID"] == cause_id, "DEATH_CAUSE_CODE"] = code
+    if extra is not None:
+        tables["dim_death_cause"] = pd.concat([causes, extra.astype(causes.dtypes)], ignore_index=True)
+
+    cn = load_dw.BACKEND.connect()
+    try:
+        cur = cn.cursor()
+        load_dw.BACKEND.prepare_cursor(cur)
+        load_dw.load_step(cn, cur, "dims", tables)
+    finally:
+        cn.close()
+
+
+def cached_causes() -> dict[int, str]:
+    from dim_cache import DimCache
+
+    df = DimCache.load("single").frames["dim_death_cause"]
+    return dict(zip(df["DEATH_CAUSE_ID"].astype(int), df["DEATH_CAUSE_CODE"]))
+
+
+def test_rejected_dim_members_are_not_cached_and_sent_again(project):
+    run_main(project, "--only", "transform")
+    load_dims()
+    assert cached_causes() == {1: "001-102", 2: "009-041"}
+
+    # a member the warehouse already has under another id: the insert of the new
+    # member and the update recoding member 2 both violate UQ_dim_death_cause
+    with warehouse(project) as cn:
+        cn.execute("INSERT INTO dim_death_cause VALUES (90, '053-061', 'Circulatorio')")
+    new = pd.DataFrame({"DEATH_CAUSE_CODE": ["053-061"], "DEATH_CAUSE_NAME": ["IX.Circulatorio"],
+                        "DEATH_CAUSE_ID": [3]})
+    load_dims(new, renamed={2: "053-061"})
+
+    assert cached_causes() == {1: "001-102", 2: "009-041"}
+    rejects = project / "data" / "rejects"
+    assert len(reject_rows(rejects / "dw.dim_death_cause.csv")) == 1
+    assert len(reject_rows(rejects / "dw.dim_death_cause.update.csv")) == 1
+
+    # once the conflict is gone, the next load sends both again
+    with warehouse(project) as cn:
+        cn.execute("DELETE FROM dim_death_cause WHERE DEATH_CAUSE_ID = 90")
+    load_dims(new.assign(DEATH_CAUSE_CODE="062-067"), renamed={2: "053-061"})
+
+    assert cached_causes() == {1: "001-102", 2: "053-061", 3: "062-067"}
+    with warehouse(project) as cn:
+        loaded = dict(cn.execute("SELECT DEATH_CAUSE_ID, DEATH_CAUSE_CODE FROM dim_death_cause"))
+    assert loaded == {1: "001-102", 2: "053-061", 3: "062-067"}
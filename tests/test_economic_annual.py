@@ -0,0 +1,51 @@
+# the streamed per-year accumulators (economic_annual.py) against the quarters
+# imputed in memory (transformation.economic_quarters), with closed years kept
+# between runs and one of them revised
+import pandas as pd
+
+RAW = "data/raw/economic_sector_province.csv"
+KEYS = ["Provincias", "Sector económico", "YEAR"]
+
+
+def in_memory() -> pd.DataFrame:
+    from transformation import economic_quarters
+
+    df = economic_quarters()
+    grouped = df.groupby(KEYS)
+    out = grouped[["TOTAL_SUM", "TOTAL_COUNT"]].sum()
+    out["IMPUTED"] = grouped["IMPUTED"].max()
+    return out.reset_index()
+
+
+def streamed(project) -> pd.DataFrame:
+    from economic_annual import annual
+    from imputation import spec_for
+
+    out = annual(project / RAW, spec_for("economic"), chunksize=7,
+                 state_path=project / "data" / "state" / "economic_annual.json")
+    return out.sort_values(KEYS).reset_index(drop=True)
+
+
+def assert_same(project) -> None:
+    expected = in_memory()
+    pd.testing.assert_frame_equal(streamed(project), expected, check_dtype=False)
+
+
+def test_streamed_years_equal_in_memory(project):
+    from economic_annual import load_state
+
+    assert_same(project)
+    closed = load_state(project / "data" / "state" / "economic_annual.json")
+    assert sorted(closed) == ["2022", "2023", "2024"]
+    before = streamed(project)  # the closed years come from the state
+    pd.testing.assert_frame_equal(before, in_memory(), check_dtype=False)
+
+    # an INE revision of a closed year
+    raw = project / RAW
+    text = raw.read_text(encoding="utf-8")
+    line = "02 Albacete,Agricultura,2023T2,\"7,5\""
+    assert line in text
+    raw.write_text(text.replace(line, "02 Albacete,Agricultura,2023T2,12"), encoding="utf-8")
+    assert_same(project)
+    assert not streamed(project).equals(before)
+    assert load_state(project / "data" / "state" / "economic_annual.json")["2023"]["hash"] != closed["2023"]["hash"]
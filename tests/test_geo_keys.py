@@ -0,0 +1,60 @@
+# The geographic keys of the pobmun and codauto staging files: compact
+# integers (CPRO / CODAUTO Int8, MUN_NUMBER Int16) with the published values.
+# The fixture raw files have the cases the old per-year fixes were for:
+# - pobmun2009 (blank-CPRO "Total" rows) and pobmun2016 (a blank-CPRO national
+#   total at the end), which an inferred read parses as floats ("73" -> 73.0)
+# - a 3-digit province code (280) in pobmun2008
+# - provinces ending in 0 (10 Cáceres, 20 Gipuzkoa), which the old division
+#   by 10 folded into 1 / 2
+import pandas as pd
+
+from conftest import FIXTURES
+
+# (CPRO, MUN_NUMBER) of the municipalities of every year
+MUNICIPALITIES = {(1, 1), (1, 2), (1, 49), (2, 1), (2, 2), (2, 3), (10, 1), (10, 2), (10, 3),
+                  (20, 1), (20, 2), (20, 16), (28, 1), (28, 2), (28, 3)}
+EXTRA = {2008: {(28, 5)}}  # "280,Madrid,5,..."
+CODAUTO = {1: 16, 2: 8, 10: 11, 20: 16, 28: 13}
+
+
+def expected_keys(year: int) -> set[tuple[int, int]]:
+    return MUNICIPALITIES | EXTRA.get(year, set())
+
+
+def test_the_fixture_has_the_float_years():
+    # what made the old MUN_NUMBER // 10 and CPRO / 10 fixes necessary
+    for year in (2009, 2016):
+        inferred = pd.read_csv(FIXTURES / "raw" / f"pobmun{year}.csv", skiprows=1)
+        assert inferred["CPRO"].dtype == "float64" and inferred["CMUN"].dtype == "float64"
+        assert inferred["CPRO"].dropna().astype(str).str.endswith(".0").all()
+    inferred = pd.read_csv(FIXTURES / "raw" / "pobmun2008.csv", skiprows=1)
+    assert inferred["CPRO"].dtype == "int64"
+
+
+def test_pobmun_keys(project):
+    from transformation import transform_pobmun
+
+    df = transform_pobmun()
+    assert df["CPRO"].dtype == "Int8" and df["MUN_NUMBER"].dtype == "Int16"
+
+    for year in (2008, 2009, 2010, 2016):
+        rows = df[df["YEAR"] == year]
+        keys = set(zip(rows["CPRO"].astype(int), rows["MUN_NUMBER"].astype(int)))
+        assert keys == expected_keys(year), year
+        assert len(rows) == len(keys)
+
+    # the staging file reads back with the same types and values
+    from schemas import STAGED, read_csv
+
+    staged = read_csv(STAGED["pobmun"])
+    assert staged["CPRO"].dtype == "Int8" and staged["MUN_NUMBER"].dtype == "Int16"
+    pd.testing.assert_frame_equal(staged[["CPRO", "MUN_NUMBER", "YEAR"]],
+                                  df[["CPRO", "MUN_NUMBER", "YEAR"]].reset_index(drop=True), check_dtype=False)
+
+
+def test_codauto_keys(project):
+    from transformation import transform_codauto
+
+    df = transform_codauto()
+    assert df["CPRO"].dtype == "Int8" and df["CODAUTO"].dtype == "Int8"
+    assert dict(zip(df["CPRO"].astype(int), df["CODAUTO"].astype(int))) == CODAUTO
@@ -0,0 +1,60 @@
+# impute() with the group statistics cached per period gives the values of the
+# in-memory chain it replaced (group mean, then global mean), also after a
+# period of the cached history is revised
+import pandas as pd
+import pytest
+
+from conftest import FIXTURES
+
+RAW_FILES = {"economic": "economic_sector_province.csv", "deaths": "death_causes_province.csv"}
+
+
+def raw(dataset: str) -> pd.DataFrame:
+    from schemas import RAW, read_csv
+
+    df = read_csv(RAW[dataset], FIXTURES / "raw" / RAW_FILES[dataset])
+    if dataset == "deaths":
+        # the fixture reports every total
+        df.loc[df.index[::7], "Total"] = ".."
+    return df
+
+
+def in_memory(df: pd.DataFrame, dataset: str) -> pd.DataFrame:
+    # the imputation before imputation.py: one groupby over every row
+    from imputation import parse_number, spec_for
+
+    spec = spec_for(dataset)
+    total = parse_number(df["Total"])
+    filled = total.fillna(df.assign(_v=total).groupby(list(spec.groups))["_v"].transform("mean"))
+    filled = filled.fillna(filled.mean())
+    return pd.DataFrame({"Total": filled.round().astype("Int64"),
+                         "IMPUTED": pd.array(total.isna().astype("uint8"), dtype="UInt8")})
+
+
+def revise(df: pd.DataFrame, dataset: str) -> pd.DataFrame:
+    # a new reported value in one period of the history
+    df = df.copy()
+    reported = df.index[df["Total"].str.fullmatch(r"\d+").fillna(False)]
+    df.loc[reported[1], "Total"] = str(int(df.loc[reported[1], "Total"]) + 37)
+    return df
+
+
+@pytest.mark.parametrize("dataset", ["economic", "deaths"])
+def test_cached_group_stats_equal_in_memory(project, dataset):
+    from imputation import GroupStats, impute, parse_number, spec_for
+
+    path = project / "data" / "state" / "imputation" / f"{dataset}.json"
+    df = raw(dataset)
+    out = impute(df, dataset, stats_path=path)
+    assert out["IMPUTED"].sum() > 0
+    pd.testing.assert_frame_equal(out[["Total", "IMPUTED"]], in_memory(df, dataset))
+
+    # only the revised period is aggregated again, the rest comes from the cache
+    spec = spec_for(dataset)
+    revised = revise(df, dataset)
+    stats = GroupStats(dataset, spec, path)
+    stats.compute(revised.assign(Total=parse_number(revised["Total"])))
+    assert stats.computed == 1 and stats.reused == revised[spec.period].nunique() - 1
+
+    out = impute(revised, dataset, stats_path=path)
+    pd.testing.assert_frame_equal(out[["Total", "IMPUTED"]], in_memory(revised, dataset))
@@ -0,0 +1,83 @@
+# The staged values of the typed reads (schemas.py) against the ones of the
+# inferred reads before the schema registry: only the values the float reads
+# got wrong changed. tests/fixtures/legacy/ holds what transformation.py of the
+# commit before the registry (e2e95e7) staged:
+#   pobmun_by_province.csv     per YEAR and CPRO, the rows and the sums of the
+#                              pobmun staging file of the committed data/raw
+#   death_causes_province.csv  the deaths staging file of the fixture raw file
+import shutil
+
+import pandas as pd
+
+from conftest import ROOT, FIXTURES, run_main
+
+LEGACY = FIXTURES / "legacy"
+DEATH_KEY = ["YEAR", "SEX", "CPRO", "DEATH_CAUSE_CODE"]
+# the years whose codes were read as floats, where cpro_div10_if_needed undid the extra digit
+FLOAT_YEARS = (2009, 2016)
+
+
+def staged(work, name: str) -> pd.DataFrame:
+    from schemas import STAGED, read_csv
+
+    return read_csv(STAGED[name], work / "data" / "staging" / STAGED[name].path.name)
+
+
+def pobmun_by_province(df: pd.DataFrame) -> pd.DataFrame:
+    return (df.groupby(["YEAR", "CPRO"])
+              .agg(ROWS=("MUN_NUMBER", "size"), MUN_NUMBER=("MUN_NUMBER", "sum"), POBLATION=("POBLATION", "sum"),
+                   MALE=("MALE", "sum"), FEMALE=("FEMALE", "sum"))
+              .reset_index())
+
+
+def test_pobmun_only_the_folded_provinces_changed(project):
+    for raw in (ROOT / "data" / "raw").glob("pobmun*.csv"):
+        shutil.copyfile(raw, project / "data" / "raw" / raw.name)
+    run_main(project, "--only", "transform:pobmun")
+    df = staged(project, "pobmun").astype(
+        {c: "int64" for c in ("YEAR", "CPRO", "MUN_NUMBER", "POBLATION", "MALE", "FEMALE")})
+
+    # the legacy staging also dropped the first row after the header of every year
+    # (a municipality, except the "Total" row of 2009, which is dropped anyway)
+    first = ~df["YEAR"].duplicated() & (df["YEAR"] != 2009)
+    assert first.sum() == 16 and df.loc[first, "POBLATION"].sum() == 20283
+    df = df[~first]
+
+    # the inferred reads staged the provinces 10/20/30/40/50 as 1-5 outside the float years
+    folded = df["CPRO"].isin([10, 20, 30, 40, 50]) & ~df["YEAR"].isin(FLOAT_YEARS)
+    assert folded.sum() == 12856
+    assert not df.duplicated(["YEAR", "CPRO", "MUN_NUMBER"]).any()
+
+    legacy = df.assign(CPRO=df["CPRO"].mask(folded, df["CPRO"] // 10))
+    expected = pd.read_csv(LEGACY / "pobmun_by_province.csv")
+    pd.testing.assert_frame_equal(pobmun_by_province(legacy), expected)
+
+
+def raw_deaths(work) -> pd.DataFrame:
+    # the fixture raw file keyed like the staging file, Total as published
+    raw = pd.read_csv(work / "data" / "raw" / "death_causes_province.csv", dtype=str)
+    raw = raw[~raw["Provincias"].isin(["Nacional", "Extranjero"])]
+    return pd.DataFrame({
+        "YEAR": raw["Periodo"].astype("int64"),
+        "SEX": raw["Sexo"],
+        "CPRO": raw["Provincias"].str.split(" ", n=1).str[0].astype("int64"),
+        "DEATH_CAUSE_CODE": raw["Causa de muerte"].str.split(r"\s{2,}", n=1).str[0],
+        "TEXT": raw["Total"],
+    })
+
+
+def test_deaths_are_the_published_numbers(project):
+    run_main(project, "--only", "transform:deaths")
+    df = staged(project, "deaths")[DEATH_KEY + ["TOTAL"]]
+    df = df.astype({"YEAR": "int64", "CPRO": "int64", "TOTAL": "int64"})
+    legacy = pd.read_csv(LEGACY / "death_causes_province.csv")
+
+    merged = raw_deaths(project).merge(df, on=DEATH_KEY, validate="1:1")
+    merged = merged.merge(legacy, on=DEATH_KEY, suffixes=("", "_LEGACY"), validate="1:1")
+    assert len(merged) == len(df) == len(legacy)
+
+    # "4.059" -> 4059 and "177" -> 177; the float reads had parsed "177.0" and "1.72"
+    assert (merged["TOTAL"] == merged["TEXT"].str.replace(".", "", regex=False).astype("int64")).all()
+    as_float = merged["TEXT"].astype("float64").astype(str)
+    assert (merged["TOTAL_LEGACY"] == as_float.str.replace(".", "", regex=False).astype("int64")).all()
+    assert (merged["TOTAL"] != merged["TOTAL_LEGACY"]).sum() == 27
@@ -0,0 +1,57 @@
+# a load stopped partway continues after its last committed batch
+import pandas as pd
+import pytest
+
+
+class StopAfter:
+    # a cursor whose k-th executemany stops the process (here: raises KeyboardInterrupt)
+    def __init__(self, cursor, k: int):
+        self.cursor = cursor
+        self.k = k
+        self.calls = 0
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def executemany(self, sql, rows):
+        self.calls += 1
+        if self.calls == self.k:
+            self.cursor.executemany(sql, rows)  # sent, never committed
+            raise KeyboardInterrupt
+        return self.cursor.executemany(sql, rows)
+
+
+def years(cn) -> list[int]:
+    return [y for (y,) in cn.execute("SELECT [YEAR] FROM dw.dim_time ORDER BY 1").fetchall()]
+
+
+def test_stopped_load_resumes_after_the_last_committed_batch(project):
+    import load_dw
+    from load_journal import LoadJournal, rows_key
+
+    df = pd.DataFrame({"YEAR": range(1, 12001)})
+    rows = load_dw.INSERTS["dim_time"][1](df)
+    journal = LoadJournal("dim_time", rows_key(rows))
+
+    cn = load_dw.BACKEND.connect()
+    cur = StopAfter(cn.cursor(), k=2)
+    with pytest.raises(KeyboardInterrupt):
+        load_dw.insert_table_resumable(cur, "dim_time", df)
+    cn.rollback()  # the process died: the second batch is lost
+    cn.close()
+
+    cn = load_dw.BACKEND.connect()
+    try:
+        committed = journal.committed(cn.cursor())
+        assert 0 < committed < len(rows)
+        assert years(cn) == list(range(1, committed + 1))
+
+        assert load_dw.insert_table_resumable(cn.cursor(), "dim_time", df) == len(rows) - committed
+        assert years(cn) == list(range(1, 12001))
+        # no row of the committed batches was sent again (it would be rejected by the primary key)
+        assert journal.summary(cn.cursor())[1:] == (len(rows), 0)
+
+        # the same rows again: nothing to do
+        assert load_dw.insert_table_resumable(cn.cursor(), "dim_time", df) == 0
+    finally:
+        cn.close()
@@ -0,0 +1,66 @@
+# pre-warming against the local stand-in of a paused serverless tier
+import time
+
+import pytest
+
+
+def standin(project, resume: float = 0.5, pause_after: float = 3600):
+    from warehouse_backend import PausedStandIn, SqliteBackend
+
+    backend = SqliteBackend(project / "warehouse" / "dw_local.sqlite")
+    return PausedStandIn(backend, resume, pause_after, state_path=project / "warehouse" / "standin_state.json")
+
+
+def timed_connect(backend) -> float:
+    start = time.perf_counter()
+    backend.connect().close()
+    return time.perf_counter() - start
+
+
+def test_prewarm_hides_the_resume(project):
+    from warehouse_backend import WarmConnection
+
+    warm = WarmConnection(standin(project), background=True)
+    time.sleep(0.7)  # the transformations run meanwhile
+    start = time.perf_counter()
+    cn = warm.get()
+    assert time.perf_counter() - start < 0.2
+    assert cn.execute("SELECT 1").fetchone() == (1,)
+    assert warm.seconds >= 0.5
+    warm.close()
+
+
+def test_connect_while_awake_does_not_wait(project):
+    backend = standin(project)
+    assert timed_connect(backend) >= 0.5
+    assert timed_connect(backend) < 0.2
+    # another process of the run sees the same state file
+    assert timed_connect(standin(project)) < 0.2
+
+
+def test_pauses_after_idle_time(project):
+    backend = standin(project, resume=0.3, pause_after=0.2)
+    assert timed_connect(backend) >= 0.3
+    assert timed_connect(backend) < 0.2
+    time.sleep(0.3)
+    assert timed_connect(backend) >= 0.3
+
+
+def test_failed_preparation_closes_the_prewarmed_connection(project, monkeypatch):
+    import load_dw
+    from warehouse_backend import WarmConnection
+
+    started = []
+
+    class Recorded(WarmConnection):
+        def __init__(self, backend, background=True):
+            super().__init__(backend, background=True)
+            started.append(self)
+
+    monkeypatch.setattr(load_dw, "WarmConnection", Recorded)
+    # no staging files: the dims step fails before the connection is used
+    with pytest.raises(FileNotFoundError):
+        load_dw.main(["dims"])
+    warm, = started
+    warm._thread.join()
+    assert warm._cn is None
@@ -0,0 +1,70 @@
+# the quarantines of a source at ingestion and at transformation are kept apart:
+# a clean read at one stage does not clear the other, and reprocess handles both
+import json
+
+from conftest import run_main
+
+POBMUN_2016 = "data/raw/pobmun2016.csv"
+BAD_ROW = "28,Madrid,5,Alcalá de Henares,19x649,94348,101301"
+DOWNLOAD = (b"CPRO;PROVINCIA;CMUN;NOMBRE;POB16;HOMBRES;MUJERES\n"
+            b"28;Madrid;2;Ajalvir;4440;2318;2122\n"
+            b"28;Madrid;6;Alcobendas;113340;55115;58225;x\n")
+URL = "https://example.org/pobmun2016.csv"
+
+
+def ingest(bad) -> None:
+    # what ingestion.fetch does with the lines split_bad_lines found
+    import quarantine
+
+    quarantine.save("pobmun2016", "ingestion", URL, bad, header_lines=1, data=DOWNLOAD, sep=";", encoding="utf-8")
+
+
+def quarantined(work) -> dict[str, list[int]]:
+    # <stage>-<source> -> quarantined line numbers
+    return {p.stem: [e["line"] for e in json.loads(p.read_text(encoding="utf-8"))["lines"]]
+            for p in sorted((work / "data" / "quarantine").glob("*.json"))}
+
+
+def staged_2016(work) -> set[int]:
+    from schemas import STAGED, read_csv
+
+    df = read_csv(STAGED["pobmun"], work / "data" / "staging" / "pobmun_combined_transformed.csv")
+    return set(df.loc[(df["YEAR"] == 2016) & (df["CPRO"] == 28), "MUN_NUMBER"].astype(int))
+
+
+def test_ingest_transform_reprocess(project):
+    import quarantine
+
+    # ingestion: the download of pobmun2016 had a line with a field too many
+    _, bad = quarantine.split_bad_lines(DOWNLOAD, sep=";", encoding="utf-8")
+    ingest(bad)
+    assert quarantined(project) == {"ingestion-pobmun2016": [3]}
+
+    # a clean transform keeps it
+    run_main(project, "--only", "transform")
+    assert quarantined(project) == {"ingestion-pobmun2016": [3]}
+
+    # a line the pobmun reader rejects: quarantined next to it
+    raw = project / POBMUN_2016
+    raw.write_text(raw.read_text(encoding="utf-8").replace(
+        "28,Madrid,3,", BAD_ROW + "\n28,Madrid,3,"), encoding="utf-8")
+    run_main(project, "--only", "transform")
+    entries = quarantined(project)
+    assert entries["ingestion-pobmun2016"] == [3] and len(entries["transform-pobmun2016"]) == 1
+    assert 5 not in staged_2016(project)
+
+    # a new download replaces only the ingestion quarantine
+    ingest(bad)
+    assert quarantined(project) == entries
+
+    # the bad number corrected by hand: reprocess merges the transform line, the
+    # download line still has a field too many and stays
+    lines = project / "data" / "quarantine" / "transform-pobmun2016.lines"
+    lines.write_text(lines.read_text(encoding="utf-8").replace("19x649", "195649"), encoding="utf-8")
+    run_main(project, "--reprocess", "pobmun2016", "--only", "transform")
+    assert quarantined(project) == {"ingestion-pobmun2016": [3]}
+    assert 5 in staged_2016(project)
+
+    # a clean download clears it
+    ingest([])
+    assert quarantined(project) == {}
@@ -0,0 +1,27 @@
+# sharded.py loads the same warehouse as the single-process path (transformation,
+# aggregates, load_dw), compared table by table as in benchmarks/sharded.py
+import importlib.util
+
+import pytest
+
+from conftest import ROOT
+
+spec = importlib.util.spec_from_file_location("bench_sharded", ROOT / "benchmarks" / "sharded.py")
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+
+
+@pytest.mark.parametrize("shards", [2, 3])
+def test_sharded_equals_single_process(project, shards):
+    single = project / "single.sqlite"
+    bench.run(project, bench.SINGLE, single)
+    expected = bench.table_rows(single)
+    staging = bench.staging_lines(project)
+    assert expected["fact_population_municipality"]
+
+    sharded = project / f"shards{shards}.sqlite"
+    bench.run(project, [["src/sharded.py", "--shards", str(shards)]], sharded)
+    rows = bench.table_rows(sharded)
+    for table in bench.TABLES:
+        assert rows[table] == expected[table], table
+    assert bench.staging_lines(project) == staging
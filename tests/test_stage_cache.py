@@ -0,0 +1,62 @@
+# memoized steps: a load step is only up to date while the warehouse still
+# holds what it loaded
+import os
+import re
+import subprocess
+import sys
+
+from conftest import run_main, warehouse
+
+STEPS = ("--only", "transform", "aggregates", "load")
+
+
+def run_counts(result) -> tuple[int, int]:
+    # (steps run, steps up to date) of the run summary
+    m = re.search(r"(\d+) steps run, (\d+) up to date", result.stdout)
+    return int(m[1]), int(m[2])
+
+
+def fact_rows(work) -> int:
+    with warehouse(work) as cn:
+        return cn.execute("SELECT COUNT(*) FROM fact_population_municipality").fetchone()[0]
+
+
+def test_unchanged_rerun_skips_every_step(project):
+    run_main(project, *STEPS)
+    assert run_counts(run_main(project, *STEPS)) == (0, 10)
+
+
+def test_wiped_warehouse_is_loaded_again(project):
+    run_main(project, *STEPS)
+    loaded = fact_rows(project)
+    assert loaded > 0
+
+    (project / "warehouse" / "dw_local.sqlite").unlink()
+    for wal in (project / "warehouse").glob("dw_local.sqlite-*"):
+        wal.unlink()
+    assert run_counts(run_main(project, *STEPS)) == (5, 5)
+    assert fact_rows(project) == loaded
+
+
+def test_load_reruns_when_its_journal_changed(project):
+    run_main(project, *STEPS)
+    with warehouse(project) as cn:
+        cn.execute("DELETE FROM fact_deaths")
+        cn.execute("DELETE FROM etl_load_journal WHERE TABLE_NAME = 'fact_deaths'")
+
+    assert run_counts(run_main(project, *STEPS)) == (1, 9)
+    with warehouse(project) as cn:
+        assert cn.execute("SELECT COUNT(*) FROM fact_deaths").fetchone()[0] > 0
+
+
+def test_load_reruns_when_its_code_or_policy_changed(project):
+    run_main(project, *STEPS)
+    # a module load_dw only imports through another one
+    journal = project / "src" / "load_journal.py"
+    journal.write_text(journal.read_text(encoding="utf-8") + "\n# changed\n", encoding="utf-8")
+    assert run_counts(run_main(project, *STEPS)) == (5, 5)
+
+    # the fixture has Ceuta economic rows without a province: the stricter policy is applied
+    result = subprocess.run([sys.executable, "main.py", *STEPS], cwd=project, capture_output=True, text=True,
+                            env={**os.environ, "DW_RI_POLICY": "fail"})
+    assert result.returncode == 4 and "IntegrityError" in result.stderr
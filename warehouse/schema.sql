@@ -30,22 +30,29 @@ CREATE TABLE dw.dim_time (
 );
 GO
 
+-- string-keyed dims use integer surrogate keys (assigned by load_dw, see surrogate_keys.py)
 CREATE TABLE dw.dim_sex (
-    SEX NVARCHAR(50) NOT NULL,
-    CONSTRAINT PK_dim_sex PRIMARY KEY (SEX)
+    SEX_ID TINYINT      NOT NULL,
+    SEX    NVARCHAR(50) NOT NULL,
+    CONSTRAINT PK_dim_sex PRIMARY KEY (SEX_ID),
+    CONSTRAINT UQ_dim_sex UNIQUE (SEX)
 );
 GO
 
 CREATE TABLE dw.dim_death_cause (
+    DEATH_CAUSE_ID   SMALLINT      NOT NULL,
     DEATH_CAUSE_CODE NVARCHAR(200) NOT NULL,
     DEATH_CAUSE_NAME NVARCHAR(300) NOT NULL,
-    CONSTRAINT PK_dim_death_cause PRIMARY KEY (DEATH_CAUSE_CODE)
+    CONSTRAINT PK_dim_death_cause PRIMARY KEY (DEATH_CAUSE_ID),
+    CONSTRAINT UQ_dim_death_cause UNIQUE (DEATH_CAUSE_CODE)
 );
 GO
 
 CREATE TABLE dw.dim_economic_sector (
-    ECONOMIC_SECTOR NVARCHAR(200) NOT NULL,
-    CONSTRAINT PK_dim_economic_sector PRIMARY KEY (ECONOMIC_SECTOR)
+    ECONOMIC_SECTOR_ID SMALLINT      NOT NULL,
+    ECONOMIC_SECTOR    NVARCHAR(200) NOT NULL,
+    CONSTRAINT PK_dim_economic_sector PRIMARY KEY (ECONOMIC_SECTOR_ID),
+    CONSTRAINT UQ_dim_economic_sector UNIQUE (ECONOMIC_SECTOR)
 );
 GO
 
@@ -68,33 +75,33 @@ facts
 CREATE TABLE dw.fact_deaths (
     CPRO             INT          NOT NULL,
     [YEAR]           INT          NOT NULL,
-    SEX              NVARCHAR(50) NOT NULL,
-    DEATH_CAUSE_CODE NVARCHAR(200) NOT NULL,
+    SEX_ID           TINYINT      NOT NULL,
+    DEATH_CAUSE_ID   SMALLINT     NOT NULL,
     TOTAL_DEATHS     INT          NOT NULL,
-    CONSTRAINT PK_fact_deaths PRIMARY KEY (CPRO, [YEAR], SEX, DEATH_CAUSE_CODE),
+    CONSTRAINT PK_fact_deaths PRIMARY KEY (CPRO, [YEAR], SEX_ID, DEATH_CAUSE_ID),
     CONSTRAINT FK_fact_deaths_province
         FOREIGN KEY (CPRO) REFERENCES dw.dim_province (CPRO),
     CONSTRAINT FK_fact_deaths_time
         FOREIGN KEY ([YEAR]) REFERENCES dw.dim_time ([YEAR]),
     CONSTRAINT FK_fact_deaths_sex
-        FOREIGN KEY (SEX) REFERENCES dw.dim_sex (SEX),
+        FOREIGN KEY (SEX_ID) REFERENCES dw.dim_sex (SEX_ID),
     CONSTRAINT FK_fact_deaths_cause
-        FOREIGN KEY (DEATH_CAUSE_CODE) REFERENCES dw.dim_death_cause (DEATH_CAUSE_CODE)
+        FOREIGN KEY (DEATH_CAUSE_ID) REFERENCES dw.dim_death_cause (DEATH_CAUSE_ID)
 );
 GO
 
 CREATE TABLE dw.fact_economic_sector (
     CPRO            INT           NOT NULL,
     [YEAR]          INT           NOT NULL,
-    ECONOMIC_SECTOR NVARCHAR(200) NOT NULL,
+    ECONOMIC_SECTOR_ID SMALLINT   NOT NULL,
     TOTAL_VALUE     FLOAT         NOT NULL,  
-    CONSTRAINT PK_fact_economic_sector PRIMARY KEY (CPRO, [YEAR], ECONOMIC_SECTOR),
+    CONSTRAINT PK_fact_economic_sector PRIMARY KEY (CPRO, [YEAR], ECONOMIC_SECTOR_ID),
     CONSTRAINT FK_fact_economic_sector_province
         FOREIGN KEY (CPRO) REFERENCES dw.dim_province (CPRO),
     CONSTRAINT FK_fact_economic_sector_time
         FOREIGN KEY ([YEAR]) REFERENCES dw.dim_time ([YEAR]),
     CONSTRAINT FK_fact_economic_sector_sector
-        FOREIGN KEY (ECONOMIC_SECTOR) REFERENCES dw.dim_economic_sector (ECONOMIC_SECTOR)
+        FOREIGN KEY (ECONOMIC_SECTOR_ID) REFERENCES dw.dim_economic_sector (ECONOMIC_SECTOR_ID)
 );
 GO
 
@@ -114,3 +121,92 @@ CREATE TABLE dw.fact_population_municipality (
         FOREIGN KEY ([YEAR]) REFERENCES dw.dim_time ([YEAR])
 );
 GO
+
+/*
+aggregates (built by src/aggregates.py, read by the Power BI reports)
+*/
+
+CREATE TABLE dw.agg_population_province_year (
+    CPRO               INT      NOT NULL,
+    [YEAR]             INT      NOT NULL,
+    POPULATION_TOTAL   INT      NOT NULL,
+    MALE_TOTAL         INT      NOT NULL,
+    FEMALE_TOTAL       INT      NOT NULL,
+    MUNICIPALITIES     INT      NOT NULL,
+    SEX_RATIO          FLOAT    NULL,
+    POPULATION_YOY_PCT FLOAT    NULL,
+    CONSTRAINT PK_agg_population_province_year PRIMARY KEY (CPRO, [YEAR]),
+    CONSTRAINT FK_agg_population_province_year_geo
+        FOREIGN KEY (CPRO) REFERENCES dw.dim_province (CPRO),
+    CONSTRAINT FK_agg_population_province_year_time
+        FOREIGN KEY ([YEAR]) REFERENCES dw.dim_time ([YEAR])
+);
+GO
+
+CREATE TABLE dw.agg_population_autonomy_year (
+    CODAUTO            INT      NOT NULL,
+    [YEAR]             INT      NOT NULL,
+    POPULATION_TOTAL   INT      NOT NULL,
+    MALE_TOTAL         INT      NOT NULL,
+    FEMALE_TOTAL       INT      NOT NULL,
+    MUNICIPALITIES     INT      NOT NULL,
+    SEX_RATIO          FLOAT    NULL,
+    POPULATION_YOY_PCT FLOAT    NULL,
+    CONSTRAINT PK_agg_population_autonomy_year PRIMARY KEY (CODAUTO, [YEAR]),
+    CONSTRAINT FK_agg_population_autonomy_year_geo
+        FOREIGN KEY (CODAUTO) REFERENCES dw.dim_autonomy (CODAUTO),
+    CONSTRAINT FK_agg_population_autonomy_year_time
+        FOREIGN KEY ([YEAR]) REFERENCES dw.dim_time ([YEAR])
+);
+GO
+
+CREATE TABLE dw.agg_economic_sector_autonomy_year (
+    CODAUTO            INT      NOT NULL,
+    [YEAR]             INT      NOT NULL,
+    ECONOMIC_SECTOR_ID SMALLINT NOT NULL,
+    AVG_VALUE          FLOAT    NOT NULL,
+    PROVINCES          INT      NOT NULL,
+    CONSTRAINT PK_agg_economic_sector_autonomy_year PRIMARY KEY (CODAUTO, [YEAR], ECONOMIC_SECTOR_ID),
+    CONSTRAINT FK_agg_economic_sector_autonomy_year_autonomy
+        FOREIGN KEY (CODAUTO) REFERENCES dw.dim_autonomy (CODAUTO),
+    CONSTRAINT FK_agg_economic_sector_autonomy_year_time
+        FOREIGN KEY ([YEAR]) REFERENCES dw.dim_time ([YEAR]),
+    CONSTRAINT FK_agg_economic_sector_autonomy_year_sector
+        FOREIGN KEY (ECONOMIC_SECTOR_ID) REFERENCES dw.dim_economic_sector (ECONOMIC_SECTOR_ID)
+);
+GO
+
+CREATE TABLE dw.agg_deaths_autonomy_year (
+    CODAUTO            INT      NOT NULL,
+    [YEAR]             INT      NOT NULL,
+    SEX_ID             TINYINT  NOT NULL,
+    DEATH_CAUSE_ID     SMALLINT NOT NULL,
+    TOTAL_DEATHS       INT      NOT NULL,
+    CONSTRAINT PK_agg_deaths_autonomy_year PRIMARY KEY (CODAUTO, [YEAR], SEX_ID, DEATH_CAUSE_ID),
+    CONSTRAINT FK_agg_deaths_autonomy_year_autonomy
+        FOREIGN KEY (CODAUTO) REFERENCES dw.dim_autonomy (CODAUTO),
+    CONSTRAINT FK_agg_deaths_autonomy_year_time
+        FOREIGN KEY ([YEAR]) REFERENCES dw.dim_time ([YEAR]),
+    CONSTRAINT FK_agg_deaths_autonomy_year_sex
+        FOREIGN KEY (SEX_ID) REFERENCES dw.dim_sex (SEX_ID),
+    CONSTRAINT FK_agg_deaths_autonomy_year_cause
+        FOREIGN KEY (DEATH_CAUSE_ID) REFERENCES dw.dim_death_cause (DEATH_CAUSE_ID)
+);
+GO
+
+/*
+load journal (src/load_journal.py): committed row ranges of each load, written
+in the same transaction as the batch so a failed load resumes after it
+*/
+
+CREATE TABLE dw.etl_load_journal (
+    TABLE_NAME     NVARCHAR(128) NOT NULL,
+    LOAD_KEY       CHAR(64)      NOT NULL,
+    BATCH_START    INT           NOT NULL,
+    BATCH_END      INT           NOT NULL,
+    ROWS_LOADED    INT           NOT NULL,
+    ROWS_REJECTED  INT           NOT NULL,
+    LOADED_AT      DATETIME2(0)  NOT NULL CONSTRAINT DF_etl_load_journal_loaded_at DEFAULT SYSUTCDATETIME(),
+    CONSTRAINT PK_etl_load_journal PRIMARY KEY (TABLE_NAME, LOAD_KEY, BATCH_START)
+);
+GO
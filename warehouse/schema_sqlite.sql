@@ -0,0 +1,194 @@
+-- SQLite version of schema.sql (local warehouse, DW_BACKEND=sqlite)
+-- The file is attached as schema "dw" by src/warehouse_backend.py.
+-- Composite-key facts are WITHOUT ROWID so they are clustered by PK like in SQL Server.
+
+/*
+dims
+*/
+
+CREATE TABLE IF NOT EXISTS dw.dim_autonomy (
+    CODAUTO       INTEGER NOT NULL,
+    CODAUTO_NAME  TEXT    NOT NULL,
+    CONSTRAINT PK_dim_autonomy PRIMARY KEY (CODAUTO)
+);
+
+CREATE TABLE IF NOT EXISTS dw.dim_province (
+    CPRO      INTEGER NOT NULL,
+    CODAUTO   INTEGER NOT NULL,
+    CPRO_NAME TEXT    NOT NULL,
+    CONSTRAINT PK_dim_province PRIMARY KEY (CPRO),
+    CONSTRAINT FK_dim_province_autonomy
+        FOREIGN KEY (CODAUTO) REFERENCES dim_autonomy (CODAUTO)
+);
+
+CREATE TABLE IF NOT EXISTS dw.dim_time (
+    [YEAR] INTEGER NOT NULL,
+    CONSTRAINT PK_dim_time PRIMARY KEY ([YEAR])
+);
+
+-- string-keyed dims use integer surrogate keys (assigned by load_dw, see surrogate_keys.py)
+CREATE TABLE IF NOT EXISTS dw.dim_sex (
+    SEX_ID INTEGER NOT NULL,
+    SEX    TEXT    NOT NULL,
+    CONSTRAINT PK_dim_sex PRIMARY KEY (SEX_ID),
+    CONSTRAINT UQ_dim_sex UNIQUE (SEX)
+);
+
+CREATE TABLE IF NOT EXISTS dw.dim_death_cause (
+    DEATH_CAUSE_ID   INTEGER NOT NULL,
+    DEATH_CAUSE_CODE TEXT    NOT NULL,
+    DEATH_CAUSE_NAME TEXT    NOT NULL,
+    CONSTRAINT PK_dim_death_cause PRIMARY KEY (DEATH_CAUSE_ID),
+    CONSTRAINT UQ_dim_death_cause UNIQUE (DEATH_CAUSE_CODE)
+);
+
+CREATE TABLE IF NOT EXISTS dw.dim_economic_sector (
+    ECONOMIC_SECTOR_ID INTEGER NOT NULL,
+    ECONOMIC_SECTOR    TEXT    NOT NULL,
+    CONSTRAINT PK_dim_economic_sector PRIMARY KEY (ECONOMIC_SECTOR_ID),
+    CONSTRAINT UQ_dim_economic_sector UNIQUE (ECONOMIC_SECTOR)
+);
+
+-- PK composed: (CPRO, MUN_NUMBER)
+CREATE TABLE IF NOT EXISTS dw.dim_municipality (
+    CPRO       INTEGER NOT NULL,
+    MUN_NUMBER INTEGER NOT NULL,
+    MUN_NAME   TEXT    NOT NULL,
+    CONSTRAINT PK_dim_municipality PRIMARY KEY (CPRO, MUN_NUMBER),
+    CONSTRAINT FK_dim_municipality_province
+        FOREIGN KEY (CPRO) REFERENCES dim_province (CPRO)
+) WITHOUT ROWID;
+
+/*
+facts
+*/
+
+CREATE TABLE IF NOT EXISTS dw.fact_deaths (
+    CPRO             INTEGER NOT NULL,
+    [YEAR]           INTEGER NOT NULL,
+    SEX_ID           INTEGER NOT NULL,
+    DEATH_CAUSE_ID   INTEGER NOT NULL,
+    TOTAL_DEATHS     INTEGER NOT NULL,
+    CONSTRAINT PK_fact_deaths PRIMARY KEY (CPRO, [YEAR], SEX_ID, DEATH_CAUSE_ID),
+    CONSTRAINT FK_fact_deaths_province
+        FOREIGN KEY (CPRO) REFERENCES dim_province (CPRO),
+    CONSTRAINT FK_fact_deaths_time
+        FOREIGN KEY ([YEAR]) REFERENCES dim_time ([YEAR]),
+    CONSTRAINT FK_fact_deaths_sex
+        FOREIGN KEY (SEX_ID) REFERENCES dim_sex (SEX_ID),
+    CONSTRAINT FK_fact_deaths_cause
+        FOREIGN KEY (DEATH_CAUSE_ID) REFERENCES dim_death_cause (DEATH_CAUSE_ID)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS dw.fact_economic_sector (
+    CPRO            INTEGER NOT NULL,
+    [YEAR]          INTEGER NOT NULL,
+    ECONOMIC_SECTOR_ID INTEGER NOT NULL,
+    TOTAL_VALUE     REAL    NOT NULL,
+    CONSTRAINT PK_fact_economic_sector PRIMARY KEY (CPRO, [YEAR], ECONOMIC_SECTOR_ID),
+    CONSTRAINT FK_fact_economic_sector_province
+        FOREIGN KEY (CPRO) REFERENCES dim_province (CPRO),
+    CONSTRAINT FK_fact_economic_sector_time
+        FOREIGN KEY ([YEAR]) REFERENCES dim_time ([YEAR]),
+    CONSTRAINT FK_fact_economic_sector_sector
+        FOREIGN KEY (ECONOMIC_SECTOR_ID) REFERENCES dim_economic_sector (ECONOMIC_SECTOR_ID)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS dw.fact_population_municipality (
+    CPRO             INTEGER NOT NULL,
+    MUN_NUMBER       INTEGER NOT NULL,
+    [YEAR]           INTEGER NOT NULL,
+    POPULATION_TOTAL INTEGER NOT NULL,
+    MALE_TOTAL       INTEGER NOT NULL,
+    FEMALE_TOTAL     INTEGER NOT NULL,
+    CONSTRAINT PK_fact_population_municipality PRIMARY KEY (CPRO, MUN_NUMBER, [YEAR]),
+    -- FK to municipality (KEY)
+    CONSTRAINT FK_fact_population_municipality_mun
+        FOREIGN KEY (CPRO, MUN_NUMBER) REFERENCES dim_municipality (CPRO, MUN_NUMBER),
+    CONSTRAINT FK_fact_population_municipality_time
+        FOREIGN KEY ([YEAR]) REFERENCES dim_time ([YEAR])
+) WITHOUT ROWID;
+
+/*
+aggregates (built by src/aggregates.py, read by the Power BI reports)
+*/
+
+CREATE TABLE IF NOT EXISTS dw.agg_population_province_year (
+    CPRO               INTEGER  NOT NULL,
+    [YEAR]             INTEGER  NOT NULL,
+    POPULATION_TOTAL   INTEGER  NOT NULL,
+    MALE_TOTAL         INTEGER  NOT NULL,
+    FEMALE_TOTAL       INTEGER  NOT NULL,
+    MUNICIPALITIES     INTEGER  NOT NULL,
+    SEX_RATIO          REAL     NULL,
+    POPULATION_YOY_PCT REAL     NULL,
+    CONSTRAINT PK_agg_population_province_year PRIMARY KEY (CPRO, [YEAR]),
+    CONSTRAINT FK_agg_population_province_year_geo
+        FOREIGN KEY (CPRO) REFERENCES dim_province (CPRO),
+    CONSTRAINT FK_agg_population_province_year_time
+        FOREIGN KEY ([YEAR]) REFERENCES dim_time ([YEAR])
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS dw.agg_population_autonomy_year (
+    CODAUTO            INTEGER  NOT NULL,
+    [YEAR]             INTEGER  NOT NULL,
+    POPULATION_TOTAL   INTEGER  NOT NULL,
+    MALE_TOTAL         INTEGER  NOT NULL,
+    FEMALE_TOTAL       INTEGER  NOT NULL,
+    MUNICIPALITIES     INTEGER  NOT NULL,
+    SEX_RATIO          REAL     NULL,
+    POPULATION_YOY_PCT REAL     NULL,
+    CONSTRAINT PK_agg_population_autonomy_year PRIMARY KEY (CODAUTO, [YEAR]),
+    CONSTRAINT FK_agg_population_autonomy_year_geo
+        FOREIGN KEY (CODAUTO) REFERENCES dim_autonomy (CODAUTO),
+    CONSTRAINT FK_agg_population_autonomy_year_time
+        FOREIGN KEY ([YEAR]) REFERENCES dim_time ([YEAR])
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS dw.agg_economic_sector_autonomy_year (
+    CODAUTO            INTEGER  NOT NULL,
+    [YEAR]             INTEGER  NOT NULL,
+    ECONOMIC_SECTOR_ID INTEGER  NOT NULL,
+    AVG_VALUE          REAL     NOT NULL,
+    PROVINCES          INTEGER  NOT NULL,
+    CONSTRAINT PK_agg_economic_sector_autonomy_year PRIMARY KEY (CODAUTO, [YEAR], ECONOMIC_SECTOR_ID),
+    CONSTRAINT FK_agg_economic_sector_autonomy_year_autonomy
+        FOREIGN KEY (CODAUTO) REFERENCES dim_autonomy (CODAUTO),
+    CONSTRAINT FK_agg_economic_sector_autonomy_year_time
+        FOREIGN KEY ([YEAR]) REFERENCES dim_time ([YEAR]),
+    CONSTRAINT FK_agg_economic_sector_autonomy_year_sector
+        FOREIGN KEY (ECONOMIC_SECTOR_ID) REFERENCES dim_economic_sector (ECONOMIC_SECTOR_ID)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS dw.agg_deaths_autonomy_year (
+    CODAUTO            INTEGER  NOT NULL,
+    [YEAR]             INTEGER  NOT NULL,
+    SEX_ID             INTEGER  NOT NULL,
+    DEATH_CAUSE_ID     INTEGER  NOT NULL,
+    TOTAL_DEATHS       INTEGER  NOT NULL,
+    CONSTRAINT PK_agg_deaths_autonomy_year PRIMARY KEY (CODAUTO, [YEAR], SEX_ID, DEATH_CAUSE_ID),
+    CONSTRAINT FK_agg_deaths_autonomy_year_autonomy
+        FOREIGN KEY (CODAUTO) REFERENCES dim_autonomy (CODAUTO),
+    CONSTRAINT FK_agg_deaths_autonomy_year_time
+        FOREIGN KEY ([YEAR]) REFERENCES dim_time ([YEAR]),
+    CONSTRAINT FK_agg_deaths_autonomy_year_sex
+        FOREIGN KEY (SEX_ID) REFERENCES dim_sex (SEX_ID),
+    CONSTRAINT FK_agg_deaths_autonomy_year_cause
+        FOREIGN KEY (DEATH_CAUSE_ID) REFERENCES dim_death_cause (DEATH_CAUSE_ID)
+) WITHOUT ROWID;
+
+/*
+load journal (src/load_journal.py): committed row ranges of each load, written
+in the same transaction as the batch so a failed load resumes after it
+*/
+
+CREATE TABLE IF NOT EXISTS dw.etl_load_journal (
+    TABLE_NAME     TEXT    NOT NULL,
+    LOAD_KEY       TEXT    NOT NULL,
+    BATCH_START    INTEGER NOT NULL,
+    BATCH_END      INTEGER NOT NULL,
+    ROWS_LOADED    INTEGER NOT NULL,
+    ROWS_REJECTED  INTEGER NOT NULL,
+    LOADED_AT      TEXT    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT PK_etl_load_journal PRIMARY KEY (TABLE_NAME, LOAD_KEY, BATCH_START)
+) WITHOUT ROWID;